@@ -10,6 +10,7 @@
 
 import os
 import pprint
+import threading
 import traceback
 
 import sgtk
@@ -18,6 +19,10 @@ from tank.errors import TankError
 
 HookBaseClass = sgtk.get_hook_baseclass()
 
+# the conflicting publishes looked up by validate_batch for the items being
+# validated by the current thread.
+_prefetched_conflicting_publishes = threading.local()
+
 
 class BasicFilePublishPlugin(HookBaseClass):
     """
@@ -271,6 +276,60 @@ class BasicFilePublishPlugin(HookBaseClass):
         # return the accepted info
         return {"accepted": True}
 
+    def validate_batch(self, settings, items):
+        """
+        Validates the given items to check that they are ok to publish.
+
+        The conflicting publishes for all the items are looked up at once with
+        ``util.get_conflicting_publishes_bulk`` before validating each item.
+
+        :param settings: Dictionary of Settings. The keys are strings, matching
+            the keys returned in the settings property. The values are `Setting`
+            instances.
+        :param items: List of items to process
+
+        :returns: A list of booleans or exceptions, one per item.
+        """
+
+        requests = []
+        for item in items:
+            try:
+                requests.append(
+                    (
+                        item.context,
+                        self.get_publish_path(settings, item),
+                        self.get_publish_name(settings, item),
+                    )
+                )
+            except Exception:
+                # the error will be reported when validating the item
+                requests.append(None)
+
+        conflicting_publishes = iter(
+            self.parent.util.get_conflicting_publishes_bulk(
+                [request for request in requests if request],
+                filters=["sg_status_list", "is_not", None],
+            )
+        )
+
+        # the results are handed over to validate without being stored on the
+        # items, so that they are never serialized with the tree. validate is
+        # called from this thread by the base class.
+        prefetched = {}
+        for item, request in zip(items, requests):
+            if request:
+                prefetched[item] = (
+                    request[1],
+                    request[2],
+                    next(conflicting_publishes),
+                )
+
+        _prefetched_conflicting_publishes.items = prefetched
+        try:
+            return super().validate_batch(settings, items)
+        finally:
+            _prefetched_conflicting_publishes.items = {}
+
     def validate(self, settings, item):
         """
         Validates the given item to check that it is ok to publish.
@@ -302,12 +361,17 @@ class BasicFilePublishPlugin(HookBaseClass):
         # Note the name, context, and path *must* match the values supplied to
         # register_publish in the publish phase in order for this to return an
         # accurate list of previous publishes of this file.
-        publishes = publisher.util.get_conflicting_publishes(
-            item.context,
-            publish_path,
-            publish_name,
-            filters=["sg_status_list", "is_not", None],
-        )
+        prefetched = getattr(_prefetched_conflicting_publishes, "items", {}).get(item)
+        if prefetched and prefetched[:2] == (publish_path, publish_name):
+            # looked up along with the other items validated by validate_batch
+            publishes = prefetched[2]
+        else:
+            publishes = publisher.util.get_conflicting_publishes(
+                item.context,
+                publish_path,
+                publish_name,
+                filters=["sg_status_list", "is_not", None],
+            )
 
         if publishes:
 
@@ -426,6 +490,16 @@ class BasicFilePublishPlugin(HookBaseClass):
             },
         )
 
+        # during a batched publish, the publish is created along with the others
+        # once all the items have been published.
+        publish_batch = publisher.util.get_publish_batch(item)
+        if publish_batch:
+            publish_batch.queue_publish(
+                item, publish_data, dependency_items=[item.parent]
+            )
+            self.logger.info("Publish queued for registration!")
+            return
+
         # create the publish and stash it in the item properties for other
         # plugins to use.
         item.properties.sg_publish_data = sgtk.util.register_publish(**publish_data)
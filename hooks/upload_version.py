@@ -96,6 +96,16 @@ class UploadVersionPlugin(HookBaseClass):
                 "default": True,
                 "description": "Upload content to Flow Production Tracking?",
             },
+            "Upload URL": {
+                "type": "str",
+                "default": "",
+                "description": (
+                    "URL of an HTTP endpoint accepting chunked, resumable "
+                    "uploads. If set, content is uploaded there rather than "
+                    "to Flow Production Tracking, and the Version's uploaded "
+                    "movie links to the url returned by the endpoint."
+                ),
+            },
             "Link Local File": {
                 "type": "bool",
                 "default": True,
@@ -277,6 +287,11 @@ class UploadVersionPlugin(HookBaseClass):
         if settings["Link Local File"].value:
             version_data["sg_path_to_movie"] = path
 
+        if sgtk.util.is_windows():
+            upload_path = str(path)
+        else:
+            upload_path = path
+
         # log the version data for debugging
         self.logger.debug(
             "Populated Version data...",
@@ -289,6 +304,52 @@ class UploadVersionPlugin(HookBaseClass):
             },
         )
 
+        thumb = item.get_thumbnail_as_path()
+
+        upload = settings["Upload"].value
+        if upload and settings["Upload URL"].value:
+            # large files are uploaded in chunks, so an interrupted upload can
+            # resume where it stopped.
+            self.logger.info("Uploading content...")
+            upload_data = publisher.util.upload_file_resumable(
+                upload_path, settings["Upload URL"].value, publish_logger=self.logger
+            )
+            item.properties["review_upload_data"] = upload_data
+
+            # link the version to the uploaded content
+            media_url = (upload_data or {}).get("url")
+            if not media_url:
+                raise sgtk.TankError(
+                    "The upload endpoint %s didn't return the url of %s."
+                    % (settings["Upload URL"].value, upload_path)
+                )
+            version_data["sg_uploaded_movie"] = {
+                "url": media_url,
+                "name": os.path.basename(upload_path),
+                "link_type": "web",
+            }
+
+            # the thumbnail won't be extracted from content uploaded elsewhere,
+            # so the item's thumbnail is uploaded instead
+            upload = False
+
+        # during a batched publish, the version is created along with the
+        # others once all the items have been published, and the content is
+        # uploaded concurrently. The item's publish, if any, is linked then.
+        publish_batch = publisher.util.get_publish_batch(item)
+        if publish_batch:
+            publish_batch.queue_version(
+                item,
+                version_data,
+                published_file_items=(
+                    [] if "sg_publish_data" in item.properties else [item]
+                ),
+                upload_path=upload_path if upload else None,
+                thumbnail_path=thumb,
+            )
+            self.logger.info("Version queued for creation!")
+            return
+
         # Create the version
         version = publisher.shotgun.create("Version", version_data)
         self.logger.info("Version created!")
@@ -296,16 +357,9 @@ class UploadVersionPlugin(HookBaseClass):
         # stash the version info in the item just in case
         item.properties["sg_version_data"] = version
 
-        thumb = item.get_thumbnail_as_path()
-
-        if settings["Upload"].value:
+        if upload:
             self.logger.info("Uploading content...")
 
-            if sgtk.util.is_windows():
-                upload_path = str(path)
-            else:
-                upload_path = path
-
             self.parent.shotgun.upload(
                 "Version", version["id"], upload_path, "sg_uploaded_movie"
             )
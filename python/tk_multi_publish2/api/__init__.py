@@ -8,9 +8,11 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
+from .batch import PublishBatch  # noqa
 from .data import PublishData  # noqa
 from .manager import PublishManager  # noqa
 from .item import PublishItem  # noqa
 from .task import PublishTask  # noqa
 from .tree import PublishTree  # noqa
+from .upload import HttpChunkTransport, ResumableUpload  # noqa
 from .plugins import PluginSetting  # noqa
@@ -0,0 +1,434 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import pprint
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import sgtk
+
+logger = sgtk.platform.get_logger(__name__)
+
+
+class PublishBatch(object):
+    """
+    Queues the publishes and versions registered during a batched publish (see
+    :meth:`~.PublishManager.publish`) so they can be created in Flow Production
+    Tracking with a handful of ``batch()`` calls once all the tasks have been
+    published.
+
+    During a batched publish, the batch is available to publish plugins via
+    ``util.get_publish_batch()``:
+
+    .. code-block:: python
+
+        publish_batch = self.parent.util.get_publish_batch(item)
+        if publish_batch:
+            publish_batch.queue_publish(item, publish_data)
+        else:
+            item.properties.sg_publish_data = sgtk.util.register_publish(
+                **publish_data
+            )
+
+    The created publishes are stored in the ``sg_publish_data`` property of
+    their item before the ``post_publish`` method of the
+    :class:`~.base_hooks.PostPhaseHook` is called. The created versions are
+    stored in the ``sg_version_data`` property of their item, and their media
+    is uploaded on a pool of worker threads, each with its own connection to
+    Flow Production Tracking.
+    """
+
+    __slots__ = ["_lock", "_logger", "_max_upload_workers", "_publishes", "_versions"]
+
+    # the default number of media uploads to run at once
+    DEFAULT_MAX_UPLOAD_WORKERS = 4
+
+    def __init__(self, publish_logger=None, max_upload_workers=None):
+        """
+        Initialize the batch.
+
+        :param publish_logger: The logger to report the upload progress to.
+        :param int max_upload_workers: The maximum number of media uploads to
+            run at once.
+        """
+
+        self._logger = publish_logger or logger
+        self._max_upload_workers = max_upload_workers or self.DEFAULT_MAX_UPLOAD_WORKERS
+
+        # queued publishes are stored as (item, kwargs, dependency items)
+        # tuples, in the order they were queued.
+        self._publishes = []
+
+        # queued versions are stored as (item, version data, published file
+        # items, upload path, thumbnail path) tuples.
+        self._versions = []
+
+        # publish plugins can be run on worker threads
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Returns the number of publishes and versions queued on the batch."""
+        return len(self._publishes) + len(self._versions)
+
+    def queue_publish(self, item, publish_data, dependency_items=None):
+        """
+        Queues a publish registration for the supplied item.
+
+        :param item: The :ref:`publish-api-item` the publish is registered
+            for. The created publish is stored in its ``sg_publish_data``
+            property.
+        :param dict publish_data: The keyword arguments that would be passed to
+            ``sgtk.util.register_publish``.
+        :param list dependency_items: A list of :ref:`publish-api-item`
+            instances. The publishes stored in their ``sg_publish_data``
+            property once the batch is flushed, if any, are added to the
+            dependencies of the publish. This allows depending on publishes
+            queued on the same batch.
+        """
+        with self._lock:
+            self._publishes.append((item, publish_data, dependency_items or []))
+
+    def queue_version(
+        self,
+        item,
+        version_data,
+        published_file_items=None,
+        upload_path=None,
+        thumbnail_path=None,
+    ):
+        """
+        Queues the creation of a ``Version`` for the supplied item.
+
+        Versions are created after the queued publishes, so they can be linked
+        to them.
+
+        :param item: The :ref:`publish-api-item` the version is created for.
+            The created version is stored in its ``sg_version_data`` property.
+        :param dict version_data: The fields of the version to create.
+        :param list published_file_items: A list of :ref:`publish-api-item`
+            instances. The publishes stored in their ``sg_publish_data``
+            property once the batch is flushed, if any, are added to the
+            ``published_files`` of the version.
+        :param str upload_path: The path to the media to upload to the
+            version's ``sg_uploaded_movie`` field, if any.
+        :param str thumbnail_path: The path to the thumbnail to upload for
+            the version, if any.
+        """
+        with self._lock:
+            self._versions.append(
+                (
+                    item,
+                    version_data,
+                    published_file_items or [],
+                    upload_path,
+                    thumbnail_path,
+                )
+            )
+
+    def flush(self):
+        """
+        Creates all the queued publishes, along with their dependencies and
+        thumbnails, and stores them in their item's ``sg_publish_data``
+        property. The queued versions are then created and stored in their
+        item's ``sg_version_data`` property, and their media is uploaded.
+
+        :raises: :class:`sgtk.TankError` if some media failed to upload.
+        """
+
+        with self._lock:
+            publishes = self._publishes
+            self._publishes = []
+            versions = self._versions
+            self._versions = []
+
+        self._flush_publishes(publishes)
+        self._flush_versions(versions)
+
+    ############################################################################
+    # protected methods
+
+    def _flush_publishes(self, publishes):
+        """
+        Creates the supplied queued publishes.
+
+        :param publishes: A list of (item, kwargs, dependency items) tuples.
+        """
+
+        if not publishes:
+            return
+
+        logger.debug("Registering %s queued publishes..." % (len(publishes),))
+
+        tk = publishes[0][1]["tk"]
+
+        batch_publishes = []
+        for item, publish_data, dependency_items in publishes:
+            if publish_data.get("update_entity_thumbnail"):
+                # the entity thumbnail logic lives in core, so let it handle
+                # these publishes.
+                item.properties.sg_publish_data = sgtk.util.register_publish(
+                    **publish_data
+                )
+            else:
+                batch_publishes.append((item, publish_data, dependency_items))
+
+        if not batch_publishes:
+            return
+
+        # ask core for the data it would use to create each publish. Even on a
+        # dry run, core finds (or creates) the PublishedFileType of each
+        # publish, so the types are left out and resolved for all the
+        # publishes at once instead.
+        resolve_types = sgtk.util.get_published_file_entity_type(tk) == "PublishedFile"
+        requests = []
+        for _, publish_data, _ in batch_publishes:
+            type_name = publish_data.get("published_file_type")
+            if resolve_types and type_name:
+                publish_data = dict(publish_data, published_file_type=None)
+            sg_data = sgtk.util.register_publish(dry_run=True, **publish_data)
+            entity_type = sg_data.pop("type")
+            sg_data.pop("id", None)
+            if resolve_types and type_name:
+                sg_data["published_file_type"] = type_name
+            requests.append(
+                {"request_type": "create", "entity_type": entity_type, "data": sg_data}
+            )
+
+        self._resolve_published_file_types(tk, requests)
+
+        logger.debug("Batch creating publishes: %s" % (pprint.pformat(requests),))
+        created = tk.shotgun.batch(requests)
+
+        for (item, publish_data, _), sg_publish_data in zip(batch_publishes, created):
+            item.properties.sg_publish_data = sg_publish_data
+
+            thumbnail_path = publish_data.get("thumbnail_path")
+            if thumbnail_path:
+                tk.shotgun.upload_thumbnail(
+                    sg_publish_data["type"], sg_publish_data["id"], thumbnail_path
+                )
+
+        self._create_dependencies(tk, batch_publishes)
+
+    def _flush_versions(self, versions):
+        """
+        Creates the supplied queued versions and uploads their media.
+
+        :param versions: A list of (item, version data, published file items,
+            upload path, thumbnail path) tuples.
+        """
+
+        if not versions:
+            return
+
+        shotgun = sgtk.platform.current_bundle().shotgun
+
+        requests = []
+        for _, version_data, published_file_items, _, _ in versions:
+            version_data = dict(version_data)
+            published_files = list(version_data.get("published_files") or [])
+            for published_file_item in published_file_items:
+                if "sg_publish_data" in published_file_item.properties:
+                    published_files.append(
+                        published_file_item.properties.sg_publish_data
+                    )
+            if published_files:
+                version_data["published_files"] = published_files
+            requests.append(
+                {
+                    "request_type": "create",
+                    "entity_type": "Version",
+                    "data": version_data,
+                }
+            )
+
+        logger.debug("Batch creating versions: %s" % (pprint.pformat(requests),))
+        created = shotgun.batch(requests)
+
+        uploads = []
+        for (item, _, _, upload_path, thumbnail_path), version in zip(
+            versions, created
+        ):
+            # stash the version info in the item
+            item.properties.sg_version_data = version
+            if upload_path:
+                uploads.append((version, upload_path, "sg_uploaded_movie"))
+            elif thumbnail_path:
+                uploads.append((version, thumbnail_path, None))
+
+        self._logger.info("Created %s versions." % (len(created),))
+
+        if uploads:
+            self._upload_media(uploads)
+
+    def _upload_media(self, uploads):
+        """
+        Uploads the supplied media on a pool of worker threads.
+
+        :param uploads: A list of (entity, path, field name) tuples. If the
+            field name is ``None``, the path is uploaded as the entity's
+            thumbnail.
+
+        :raises: :class:`sgtk.TankError` if some media failed to upload.
+        """
+
+        # the API connections aren't thread safe, so each worker thread uses
+        # its own.
+        connections = threading.local()
+
+        def upload(index, entity, path, field_name):
+            if not hasattr(connections, "shotgun"):
+                connections.shotgun = sgtk.util.shotgun.create_sg_connection()
+
+            self._logger.info(
+                "Uploading %s (%s of %s)..." % (path, index + 1, len(uploads))
+            )
+            start = time.time()
+            if field_name:
+                connections.shotgun.upload(
+                    entity["type"], entity["id"], path, field_name
+                )
+            else:
+                connections.shotgun.upload_thumbnail(entity["type"], entity["id"], path)
+            self._logger.info(
+                "Uploaded %s in %.1f seconds." % (path, time.time() - start)
+            )
+
+        with ThreadPoolExecutor(max_workers=self._max_upload_workers) as executor:
+            futures = [
+                (path, executor.submit(upload, index, entity, path, field_name))
+                for (index, (entity, path, field_name)) in enumerate(uploads)
+            ]
+
+        failed = []
+        for path, future in futures:
+            error = future.exception()
+            if error:
+                self._logger.error("Failed to upload %s: %s" % (path, error))
+                failed.append(path)
+
+        if failed:
+            raise sgtk.TankError(
+                "Failed to upload %s of %s files: %s"
+                % (len(failed), len(uploads), ", ".join(failed))
+            )
+
+    def _create_dependencies(self, tk, publishes):
+        """
+        Creates the dependencies of the supplied, already created, publishes
+        with a single ``batch()`` call.
+
+        :param tk: The :class:`sgtk.Sgtk` instance to use.
+        :param publishes: A list of (item, kwargs, dependency items) tuples.
+        """
+
+        # resolve all the dependency paths at once
+        dependency_paths = set()
+        for _, publish_data, _ in publishes:
+            dependency_paths.update(publish_data.get("dependency_paths") or [])
+
+        publishes_by_path = {}
+        if dependency_paths:
+            publishes_by_path = sgtk.util.find_publish(tk, list(dependency_paths))
+
+        requests = []
+        for item, publish_data, dependency_items in publishes:
+            sg_publish_data = item.properties.sg_publish_data
+
+            dependencies = []
+            for path in publish_data.get("dependency_paths") or []:
+                if path in publishes_by_path:
+                    dependencies.append(publishes_by_path[path])
+
+            for dependency_id in publish_data.get("dependency_ids") or []:
+                dependencies.append(
+                    {"type": sg_publish_data["type"], "id": dependency_id}
+                )
+
+            for dependency_item in dependency_items:
+                if "sg_publish_data" in dependency_item.properties:
+                    dependencies.append(dependency_item.properties.sg_publish_data)
+
+            dependency_ids = set()
+            for dependency in dependencies:
+                if dependency["id"] in dependency_ids:
+                    continue
+                dependency_ids.add(dependency["id"])
+                requests.append(
+                    {
+                        "request_type": "create",
+                        "entity_type": "PublishedFileDependency",
+                        "data": {
+                            "published_file": {
+                                "type": sg_publish_data["type"],
+                                "id": sg_publish_data["id"],
+                            },
+                            "dependent_published_file": {
+                                "type": dependency["type"],
+                                "id": dependency["id"],
+                            },
+                        },
+                    }
+                )
+
+        if requests:
+            logger.debug("Batch creating %s publish dependencies" % (len(requests),))
+            tk.shotgun.batch(requests)
+
+    def _resolve_published_file_types(self, tk, requests):
+        """
+        Replaces the published file type names in the supplied publish create
+        requests by the matching ``PublishedFileType`` entities, creating the
+        missing ones.
+
+        :param tk: The :class:`sgtk.Sgtk` instance to use.
+        :param requests: A list of ``batch()`` create requests.
+        """
+
+        type_names = set()
+        for request in requests:
+            published_file_type = request["data"].get("published_file_type")
+            if isinstance(published_file_type, str):
+                type_names.add(published_file_type)
+
+        if not type_names:
+            return
+
+        published_file_types = dict(
+            (sg_type["code"], sg_type)
+            for sg_type in tk.shotgun.find(
+                "PublishedFileType", [["code", "in", sorted(type_names)]], ["code"]
+            )
+        )
+
+        missing_type_names = sorted(type_names - set(published_file_types))
+        if missing_type_names:
+            created = tk.shotgun.batch(
+                [
+                    {
+                        "request_type": "create",
+                        "entity_type": "PublishedFileType",
+                        "data": {"code": type_name},
+                    }
+                    for type_name in missing_type_names
+                ]
+            )
+            for type_name, sg_type in zip(missing_type_names, created):
+                published_file_types[type_name] = sg_type
+
+        for request in requests:
+            published_file_type = request["data"].get("published_file_type")
+            if isinstance(published_file_type, str):
+                sg_type = published_file_types[published_file_type]
+                request["data"]["published_file_type"] = {
+                    "type": sg_type["type"],
+                    "id": sg_type["id"],
+                }
@@ -11,18 +11,30 @@
 from collections import defaultdict
 
 import inspect
+import json
 import os
 import tempfile
+import threading
+import uuid
 
 import sgtk
 
 from .data import PublishData
+from .plugins.publish_plugin_instance import executing_plugin_id
 from .task import PublishTask
 
 logger = sgtk.platform.get_logger(__name__)
 
 _qt_pixmap_is_usable = None
 
+# guards the deferred loading of the attributes of lazily deserialized items.
+# see PublishItem._load_deferred_attribute.
+_lazy_load_lock = threading.RLock()
+
+# the value of the attributes of lazily deserialized items which have not been
+# loaded yet. see PublishItem._defer_loading.
+_DEFERRED = object()
+
 
 def _is_qt_pixmap_usable():
     """
@@ -77,8 +89,9 @@ class PublishItem(object):
     __slots__ = [
         "_active",
         "_allows_context_change",
-        "_children",
-        "_context",
+        "_children_value",
+        "_context_source",
+        "_context_value",
         "_created_temp_files",
         "_current_temp_file_path",
         "_description",
@@ -87,21 +100,32 @@ class PublishItem(object):
         "_global_properties",
         "_icon_path",
         "_icon_pixmap",
+        "_id",
+        "_lazy_loaders",
         "_local_properties",
         "_name",
         "_parent",
         "_persistent",
-        "_tasks",
+        "_tasks_value",
         "_thumbnail_enabled",
         "_thumbnail_explicit",
         "_thumbnail_path",
         "_thumbnail_pixmap",
+        "_tree",
         "_type_display",
         "_type_spec",
     ]
 
     @classmethod
-    def from_dict(cls, item_dict, serialization_version, parent=None):
+    def from_dict(
+        cls,
+        item_dict,
+        serialization_version,
+        parent=None,
+        plugin_registry=None,
+        context_cache=None,
+        lazy=False,
+    ):
         """
         Create a publish item instance given the supplied dictionary. The
         supplied dictionary is typically the result of calling ``to_dict`` on
@@ -112,6 +136,15 @@ class PublishItem(object):
         :param int serialization_version: The version of publish item
             serialization used for this item.
         :param parent: An optional parent to assign to this deserialized item.
+        :param dict plugin_registry: An optional registry of the plugin
+            instances shared by the deserialized tasks. See
+            :meth:`PublishTask.from_dict`.
+        :param dict context_cache: An optional cache of the contexts created
+            for the deserialized items, keyed by their serialized form. Items
+            deserialized with the same cache share a single context instance
+            for equal contexts.
+        :param bool lazy: If ``True``, the children, context and tasks of the
+            item are only created when first accessed. Default is ``False``.
         """
 
         # create the instance
@@ -126,17 +159,51 @@ class PublishItem(object):
         new_item._enabled = item_dict["enabled"]
         new_item._expanded = item_dict["expanded"]
         new_item._icon_path = item_dict["icon_path"]
+        new_item._id = item_dict.get("id")
         new_item._thumbnail_enabled = item_dict["thumbnail_enabled"]
         new_item._thumbnail_explicit = item_dict["thumbnail_explicit"]
         new_item._thumbnail_path = item_dict["thumbnail_path"]
 
-        # create the children of this item
-        for child_dict in item_dict["children"]:
-            new_item._children.append(
+        def load_children():
+            # create the children of this item
+            return [
                 PublishItem.from_dict(
-                    child_dict, serialization_version, parent=new_item
+                    child_dict,
+                    serialization_version,
+                    parent=new_item,
+                    plugin_registry=plugin_registry,
+                    context_cache=context_cache,
+                    lazy=lazy,
+                )
+                for child_dict in item_dict["children"]
+            ]
+
+        def load_context():
+            if context_cache is None:
+                return sgtk.Context.from_dict(
+                    sgtk.platform.current_bundle().sgtk, item_dict["context"]
                 )
-            )
+
+            context_key = json.dumps(item_dict["context"], sort_keys=True, default=str)
+            context = context_cache.get(context_key)
+            if context is None:
+                context = sgtk.Context.from_dict(
+                    sgtk.platform.current_bundle().sgtk, item_dict["context"]
+                )
+                context_cache[context_key] = context
+            return context
+
+        def load_tasks():
+            # create any tasks for this item
+            return [
+                PublishTask.from_dict(
+                    task_dict,
+                    serialization_version,
+                    item=new_item,
+                    plugin_registry=plugin_registry,
+                )
+                for task_dict in item_dict["tasks"]
+            ]
 
         # ---- handle the properties
 
@@ -152,17 +219,20 @@ class PublishItem(object):
         new_item._parent = parent
         new_item._persistent = item_dict["persistent"]
 
-        # set the context
+        # only the attributes with something to load are deferred
+        loaders = {}
+        if item_dict["children"]:
+            loaders["_children"] = load_children
         if item_dict["context"]:
-            new_item._context = sgtk.Context.from_dict(
-                sgtk.platform.current_bundle().sgtk, item_dict["context"]
-            )
+            loaders["_context"] = load_context
+        if item_dict["tasks"]:
+            loaders["_tasks"] = load_tasks
 
-        # finally, create any tasks for this item
-        for task_dict in item_dict["tasks"]:
-            new_item._tasks.append(
-                PublishTask.from_dict(task_dict, serialization_version, item=new_item)
-            )
+        if lazy:
+            new_item._defer_loading(**loaders)
+        else:
+            for name, loader in loaders.items():
+                setattr(new_item, name, loader())
 
         return new_item
 
@@ -184,8 +254,9 @@ class PublishItem(object):
 
         self._active = True
         self._allows_context_change = True
-        self._children = []
-        self._context = None
+        self._children_value = []  # see _children
+        self._context_value = None  # see _context
+        self._context_source = None  # see _get_context_source
         self._created_temp_files = []
         self._current_temp_file_path = None
         self._description = None
@@ -194,15 +265,18 @@ class PublishItem(object):
         self._global_properties = PublishData()
         self._icon_path = None
         self._icon_pixmap = None
+        self._id = None  # see id
+        self._lazy_loaders = None  # see _defer_loading
         self._local_properties = defaultdict(PublishData)
         self._name = name
         self._parent = parent
         self._persistent = False
-        self._tasks = []
+        self._tasks_value = []  # see _tasks
         self._thumbnail_enabled = True
         self._thumbnail_explicit = True
         self._thumbnail_path = None
         self._thumbnail_pixmap = None
+        self._tree = None  # the tree this item belongs to, if any
         self._type_display = type_display
         self._type_spec = type_spec
 
@@ -223,15 +297,16 @@ class PublishItem(object):
                 else:
                     logger.debug("Removed temp file '%s'" % temp_file)
 
-    def to_dict(self):
+    def to_dict(self, include_children=True):
         """
         Returns a dictionary representation of the publish item. Typically used
         during serialization.
+
+        :param bool include_children: If ``False``, the children of the item
+            are not included in the returned dictionary. Default is ``True``.
         """
 
-        converted_local_properties = {}
-        for k, prop in self._local_properties.items():
-            converted_local_properties[k] = prop.to_dict()
+        global_properties, local_properties = self._properties_to_dict()
 
         context_value = None
 
@@ -245,14 +320,17 @@ class PublishItem(object):
         return {
             "active": self.active,
             "allows_context_change": self._allows_context_change,
-            "children": [c.to_dict() for c in self._children],
+            "children": (
+                [c.to_dict() for c in self._children] if include_children else []
+            ),
             "context": context_value,
             "description": self.description,
             "enabled": self.enabled,
             "expanded": self.expanded,
-            "global_properties": self._global_properties.to_dict(),
+            "global_properties": global_properties,
             "icon_path": self._icon_path,
-            "local_properties": converted_local_properties,
+            "id": self.id,
+            "local_properties": local_properties,
             "name": self.name,
             "persistent": self.persistent,
             "tasks": [t.to_dict() for t in self._tasks],
@@ -350,6 +428,11 @@ class PublishItem(object):
         child_item = PublishItem(name, type_spec, type_display, parent=self)
         self._children.append(child_item)
 
+        # let the tree know about the new item
+        if self._tree is not None:
+            child_item._tree = self._tree
+            self._tree._item_created(child_item)
+
         return child_item
 
     def get_property(self, name, default_value=None):
@@ -445,6 +528,10 @@ class PublishItem(object):
 
         self._children.remove(child_item)
 
+        # let the tree know the item, and its children, are no longer part of it
+        if self._tree is not None:
+            self._tree._item_removed(child_item)
+
     def set_icon_from_path(self, path):
         """
         Sets the icon for the item given a path to an image on disk. This path
@@ -580,17 +667,24 @@ class PublishItem(object):
         A generator that yields all the :ref:`publish-api-item` children and their children
         of this item.
         """
-        for item in self._visit_recursive():
-            yield item
+        return self._visit_items()
 
-    def _visit_recursive(self):
+    def _visit_items(self):
         """
-        Yields all the children from an item and their descendants.
+        Yields all the children from an item and their descendants, depth-first.
+
+        The traversal uses an explicit stack of iterators over the children
+        lists rather than recursing, so that yielding an item doesn't go through
+        a generator frame per level of the hierarchy.
         """
-        for c in self.children:
-            yield c
-            for sub_c in c.descendants:
-                yield sub_c
+        stack = [iter(self._children)]
+        while stack:
+            for item in stack[-1]:
+                yield item
+                stack.append(iter(item._children))
+                break
+            else:
+                stack.pop()
 
     @property
     def context(self):
@@ -603,12 +697,13 @@ class PublishItem(object):
         returned.
         """
 
-        if self._context:
-            return self._context
-        elif self.parent:
-            return self.parent.context
-        else:
+        context_source = self._context_source
+        if context_source is None:
+            context_source = self._get_context_source()
+
+        if context_source is False:
             return sgtk.platform.current_bundle().context
+        return context_source._context
 
     @context.setter
     def context(self, item_context):
@@ -618,8 +713,17 @@ class PublishItem(object):
         :param item_context:
         :return:
         """
+        old_context = self._context
         self._context = item_context
 
+        # keep the tree's lookup of items by context up to date
+        if self._tree is not None:
+            self._tree._item_context_changed(self, old_context)
+
+        # this item and its descendants may now resolve their context from a
+        # different item
+        self._invalidate_context_source()
+
     @property
     def context_change_allowed(self):
         """
@@ -760,6 +864,20 @@ class PublishItem(object):
         """Sets the icon."""
         self._icon_pixmap = pixmap
 
+    @property
+    def id(self):
+        """
+        A unique identifier of the item, preserved when the tree is serialized.
+
+        This allows matching the items of a deserialized tree with the items
+        they were saved from.
+        """
+        if self._id is None:
+            with _lazy_load_lock:
+                if self._id is None:
+                    self._id = uuid.uuid4().hex
+        return self._id
+
     @property
     def is_root(self):
         """
@@ -959,6 +1077,14 @@ class PublishItem(object):
         """Setter for _thumbnail_explicit."""
         self._thumbnail_explicit = enabled
 
+    @property
+    def tree(self):
+        """
+        The :ref:`publish-api-tree` this item belongs to, or ``None`` if the
+        item isn't part of a tree.
+        """
+        return self._tree
+
     @property
     def type_spec(self):
         """
@@ -976,8 +1102,13 @@ class PublishItem(object):
     @type_spec.setter
     def type_spec(self, new_type_spec):
         """Sets the type spec for this object."""
+        old_type_spec = self._type_spec
         self._type_spec = new_type_spec
 
+        # keep the tree's lookup of items by type up to date
+        if self._tree is not None:
+            self._tree._item_type_changed(self, old_type_spec)
+
     # leaving this as a property() definition because it is called 'type'.
     # don't want to risk bad mojo with Python trying to define `def type`.
     def _get_type(self):
@@ -1019,23 +1150,174 @@ class PublishItem(object):
     ############################################################################
     # internal methods
 
+    def _get_context_source(self):
+        """
+        Resolves and caches the item the context of this item is inherited
+        from: the closest item, starting with this one, with an explicitly set
+        context, or ``False`` if the context is the publisher's launch context.
+
+        The cache is cleared by :meth:`_invalidate_context_source`.
+        """
+
+        item = self
+        while item and not item._context:
+            item = item._parent
+
+        self._context_source = item or False
+        return self._context_source
+
+    def _invalidate_context_source(self):
+        """
+        Clears the cached context source of this item and its descendants.
+
+        This must be called when the context of this item is set or when the
+        item is re-parented.
+        """
+        items = [self]
+        while items:
+            item = items.pop()
+            item._context_source = None
+            items.extend(item._children)
+
+    @property
+    def _children(self):
+        """The list of child items, loaded first if deferred."""
+        if self._children_value is _DEFERRED:
+            self._load_deferred_attribute("_children")
+        return self._children_value
+
+    @_children.setter
+    def _children(self, children):
+        self._children_value = children
+
+    @property
+    def _context(self):
+        """The explicitly set context, loaded first if deferred."""
+        if self._context_value is _DEFERRED:
+            self._load_deferred_attribute("_context")
+        return self._context_value
+
+    @_context.setter
+    def _context(self, context):
+        self._context_value = context
+
+    @property
+    def _tasks(self):
+        """The list of tasks, loaded first if deferred."""
+        if self._tasks_value is _DEFERRED:
+            self._load_deferred_attribute("_tasks")
+        return self._tasks_value
+
+    @_tasks.setter
+    def _tasks(self, tasks):
+        self._tasks_value = tasks
+
+    def _defer_loading(self, **loaders):
+        """
+        Defers the loading of some attributes of the item until they are first
+        accessed.
+
+        The deferred attributes are set to a sentinel value, which makes their
+        property load them on first access.
+
+        :param loaders: Callables returning the value of the attribute they are
+            named after. Only ``_children``, ``_context`` and ``_tasks`` can be
+            deferred.
+        """
+        if self._lazy_loaders is None:
+            self._lazy_loaders = {}
+        self._lazy_loaders.update(loaders)
+
+        for name in loaders:
+            setattr(self, name + "_value", _DEFERRED)
+
+    def _load_deferred_attribute(self, name):
+        """
+        Loads a deferred attribute of the item and notifies the tree.
+
+        :param str name: The name of the attribute.
+        """
+        with _lazy_load_lock:
+            # another thread may have loaded the attribute in the meantime
+            loader = (self._lazy_loaders or {}).pop(name, None)
+            if loader is None:
+                return
+
+            value = loader()
+            setattr(self, name + "_value", value)
+            if self._tree is not None:
+                self._tree._item_loaded(self, name, value)
+
+    def _load_deferred_attributes(self, *names):
+        """
+        Loads the deferred attributes of the item, if any.
+
+        :param names: The names of the attributes to load. All the deferred
+            attributes are loaded if no names are supplied.
+        """
+        for name in names or list(self._lazy_loaders or []):
+            getattr(self, name)
+
+    def _get_loaded_attribute(self, name, default=None):
+        """
+        Returns the value of an attribute of the item without loading it if it
+        is deferred.
+
+        :param str name: The name of the attribute.
+        :param default: The value returned if the attribute is deferred.
+        """
+        value = getattr(self, name + "_value")
+        if value is _DEFERRED:
+            return default
+        return value
+
+    def _visit_loaded_items(self):
+        """
+        Yields the children from an item and their descendants, depth-first,
+        without loading the deferred children of lazily deserialized items.
+        """
+        stack = [iter(self._get_loaded_attribute("_children", []))]
+        while stack:
+            for item in stack[-1]:
+                yield item
+                stack.append(iter(item._get_loaded_attribute("_children", [])))
+                break
+            else:
+                stack.pop()
+
     def _get_local_properties(self):
         """
         Return properties local to the currently executing publish plugin.
 
-        This is done by walking up the call stack to find a caller that is a
-        Hook. This method will raise if no caller in the stack is a hook.
+        The executing plugin is the one whose hook method is being run by the
+        publish API. When called from elsewhere, this is determined by walking
+        up the call stack to find a caller that is a Hook. This method will
+        raise if no caller in the stack is a hook.
+        """
+
+        plugin_id = executing_plugin_id.get()
+        if plugin_id is None:
+            plugin_id = self._get_calling_plugin_id()
+
+        return self._local_properties[plugin_id]
+
+    def _get_calling_plugin_id(self):
+        """
+        Returns the id of the publish plugin hook calling this item, by walking
+        up the call stack.
         """
 
         hook_object = None
 
-        for frame_record in inspect.stack():
-            frame_object = frame_record[0]
-            if frame_object:
-                calling_object = frame_object.f_locals.get("self")
-                if calling_object and isinstance(calling_object, sgtk.hook.Hook):
-                    hook_object = calling_object
-                    break
+        # only the frames are needed, so avoid inspect.stack() which also
+        # reads the source code of each frame.
+        frame_object = inspect.currentframe()
+        while frame_object:
+            calling_object = frame_object.f_locals.get("self")
+            if calling_object and isinstance(calling_object, sgtk.hook.Hook):
+                hook_object = calling_object
+                break
+            frame_object = frame_object.f_back
 
         if not hook_object:
             raise AttributeError(
@@ -1049,22 +1331,39 @@ class PublishItem(object):
                 "required for storing local properties. Plugin: %s" % (hook_object,)
             )
 
-        plugin_id = hook_object.id
+        return hook_object.id
 
-        return self._local_properties[plugin_id]
+    def _merge_properties(self, properties, local_properties):
+        """
+        Updates the item's properties with the supplied, serialized, values.
 
-    def _traverse_item(self, item):
+        This is used to bring back the properties of a copy of this item that
+        was processed elsewhere, for example in another process.
+
+        :param dict properties: Global properties to update, as returned by
+            ``item.properties.to_dict()``.
+        :param dict local_properties: A dictionary of plugin id to local
+            properties to update.
         """
-        A recursive method for generating all items in the tree, depth-first.
+        self._global_properties.update(properties)
+        for plugin_id, plugin_properties in local_properties.items():
+            self._local_properties[plugin_id].update(plugin_properties)
+
+    def _properties_to_dict(self):
         """
+        Returns the item's properties, serialized as in :meth:`to_dict`. This
+        is the counterpart of :meth:`_merge_properties`.
 
-        # yield each child item
-        for child_item in item.children:
-            yield child_item
+        :returns: A tuple of the global properties and of a dictionary of
+            plugin id to local properties.
+        """
+        local_properties = {}
+        for plugin_id, plugin_properties in self._local_properties.items():
+            local_properties[plugin_id] = plugin_properties.to_dict()
+        return (self._global_properties.to_dict(), local_properties)
 
-            # now recurse over the each child's children. the recursion will
-            # yield  the grand children back to this method. we need to yield
-            # these back to the calling method. in later versions of Python, the
-            # `yield from` could be used to make this cleaner/clearer
-            for grandchild_item in self._traverse_item(child_item):
-                yield grandchild_item
+    def _traverse_item(self, item):
+        """
+        Generates all the items under the supplied item, depth-first.
+        """
+        return item._visit_items()
@@ -0,0 +1,201 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import sgtk
+
+from .tree import _PublishTreeEncoder, _json_to_objects
+
+logger = sgtk.platform.get_logger(__name__)
+
+
+class PublishJournal(object):
+    """
+    An append-only, on-disk record of the publish tasks completed in each
+    phase, allowing an interrupted publish to be resumed.
+
+    The journal is a file of json lines. The first line is a header holding
+    the name of the file the publish tree was saved to when the journal was
+    started. Each following line records a completed task by phase, item id
+    and task id, along with the properties of the task's item once the task
+    completed. Each line is written out before the task is reported as
+    completed, so a crash loses at most the task that was running. While the
+    tasks of a phase are recorded, see :meth:`recording`, the journal is kept
+    open and is only synced to disk once the phase ends.
+
+    See :meth:`PublishManager.start_journal` and
+    :meth:`PublishManager.resume`.
+    """
+
+    __slots__ = ["_completed", "_file", "_lock", "_path"]
+
+    # bump this if the format of the journal changes
+    JOURNAL_VERSION = 1
+
+    # the suffix of the file the tree is saved to, next to the journal
+    TREE_SUFFIX = ".tree"
+
+    @classmethod
+    def create(cls, path, tree):
+        """
+        Starts a new journal, saving the supplied tree next to it.
+
+        :param str path: The path to the journal.
+        :param tree: The :class:`~.PublishTree` being published.
+        :returns: A :class:`PublishJournal` instance.
+        """
+        tree_path = path + cls.TREE_SUFFIX
+        tree.save_file(tree_path, compact=True)
+
+        # the header is written last, so an existing journal is never
+        # replaced by a journal without its tree.
+        tmp_path = "%s.%s.tmp" % (path, os.getpid())
+        with open(tmp_path, "w") as journal_file:
+            json.dump(
+                {
+                    "journal_version": cls.JOURNAL_VERSION,
+                    "tree": os.path.basename(tree_path),
+                },
+                journal_file,
+            )
+            journal_file.write("\n")
+        os.replace(tmp_path, path)
+
+        return cls(path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Opens an existing journal to resume the publish it records.
+
+        :param str path: The path to the journal.
+        :returns: A tuple of the :class:`PublishJournal` instance, the path to
+            the tree saved when the journal was started and the list of
+            records of the completed tasks, in completion order.
+        :raises: :class:`sgtk.TankError` if the journal can't be read.
+        """
+        if not os.path.exists(path):
+            raise sgtk.TankError("Publish journal not found: %s" % (path,))
+
+        records = []
+        with open(path, "r") as journal_file:
+            try:
+                header = json.loads(journal_file.readline())
+            except ValueError:
+                header = None
+            if (
+                not isinstance(header, dict)
+                or header.get("journal_version") != cls.JOURNAL_VERSION
+            ):
+                raise sgtk.TankError("Unrecognized publish journal: %s" % (path,))
+
+            for line in journal_file:
+                try:
+                    records.append(json.loads(line, object_hook=_json_to_objects))
+                except ValueError:
+                    # the last line may have been interrupted while written.
+                    logger.debug("Ignoring incomplete journal record: %s" % (line,))
+
+        tree_path = os.path.join(os.path.dirname(path), header["tree"])
+        journal = cls(
+            path, completed=[(record["phase"], record["task"]) for record in records]
+        )
+        return (journal, tree_path, records)
+
+    def __init__(self, path, completed=None):
+        """
+        Initialize the journal.
+
+        :param str path: The path to the journal.
+        :param list completed: The (phase, task id) pairs already recorded in
+            the journal.
+        """
+        self._path = path
+        self._lock = threading.Lock()
+        self._completed = set(completed or [])
+
+        # the journal file, while it is kept open. see recording.
+        self._file = None
+
+    @property
+    def path(self):
+        """The path to the journal."""
+        return self._path
+
+    def is_complete(self, phase, task):
+        """
+        Returns ``True`` if the supplied task is recorded as completed for the
+        supplied phase, ``False`` otherwise.
+
+        :param str phase: The name of the phase.
+        :param task: A :class:`~.PublishTask`.
+        """
+        return (phase, task.id) in self._completed
+
+    @contextmanager
+    def recording(self):
+        """
+        A context manager keeping the journal open while the tasks of a phase
+        are recorded. The journal is synced to disk when the context exits.
+        """
+        with self._lock:
+            self._file = open(self._path, "a")
+        try:
+            yield
+        finally:
+            with self._lock:
+                journal_file = self._file
+                self._file = None
+                try:
+                    journal_file.flush()
+                    os.fsync(journal_file.fileno())
+                finally:
+                    journal_file.close()
+
+    def record(self, phase, task):
+        """
+        Records that the supplied task completed the supplied phase.
+
+        :param str phase: The name of the phase.
+        :param task: The completed :class:`~.PublishTask`.
+        """
+        # only the properties of the item are needed to resume the publish
+        global_properties, local_properties = task.item._properties_to_dict()
+        line = json.dumps(
+            {
+                "phase": phase,
+                "item": task.item.id,
+                "task": task.id,
+                "global_properties": global_properties,
+                "local_properties": local_properties,
+            },
+            cls=_PublishTreeEncoder,
+        )
+
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line + "\n")
+                self._file.flush()
+            else:
+                with open(self._path, "a") as journal_file:
+                    journal_file.write(line + "\n")
+                    journal_file.flush()
+                    os.fsync(journal_file.fileno())
+            self._completed.add((phase, task.id))
+
+    def remove(self):
+        """Removes the journal and the tree saved with it from disk."""
+        for path in (self._path, self._path + self.TREE_SUFFIX):
+            if os.path.exists(path):
+                os.remove(path)
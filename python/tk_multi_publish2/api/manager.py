@@ -8,12 +8,27 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
-import fnmatch
+import asyncio
+import json
+import multiprocessing
+import os
+from contextlib import contextmanager
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
 
 import sgtk
 
-from .tree import PublishTree
+from .batch import PublishBatch
+from .item import PublishItem
+from .journal import PublishJournal
+from .plugin_settings_cache import PluginSettingsCache
+from .tree import PublishTree, _PublishTreeEncoder, _json_to_objects
 from .plugins import CollectorPluginInstance, PublishPluginInstance
+from .timing import TimingRecorder
 
 logger = sgtk.platform.get_logger(__name__)
 
@@ -29,7 +44,11 @@ class PublishManager(object):
         "_tree",
         "_collector_instance",
         "_processed_contexts",
+        "_plugin_settings_cache",
         "_post_phase_hook",
+        "_journal",
+        "_deferred_journal_tasks",
+        "_timings",
     ]
 
     ############################################################################
@@ -47,7 +66,7 @@ class PublishManager(object):
     # are collected via a file path. we can use this later on to determine which
     # items were added to the tree via path collection and what that original
     # path was (client code could add multiple items for a single path).
-    PROPERTY_KEY_COLLECTED_FILE_PATH = "__collected_file_path__"
+    PROPERTY_KEY_COLLECTED_FILE_PATH = PublishTree.PROPERTY_KEY_COLLECTED_FILE_PATH
 
     ############################################################################
     # instance methods
@@ -77,6 +96,21 @@ class PublishManager(object):
         # a lookup of context to publish plugins.
         self._processed_contexts = {}
 
+        # an on-disk cache of the plugin definitions of other contexts, shared
+        # across sessions.
+        self._plugin_settings_cache = PluginSettingsCache(self._bundle)
+
+        # the journal of the completed tasks, if any. see start_journal.
+        self._journal = None
+
+        # while publishing in batches, the tasks to record in the journal once
+        # the batch has been flushed.
+        self._deferred_journal_tasks = None
+
+        # the time spent in the collector and publish plugins by each phase.
+        # see get_timing_report.
+        self._timings = TimingRecorder()
+
         # initialize the collector plugin
         logger.debug("Loading collector plugin...")
         self._load_collector()
@@ -94,6 +128,20 @@ class PublishManager(object):
             post_phase_hook_path, base_class=self._bundle.base_hooks.PostPhaseHook
         )
 
+    def clear_plugin_settings_cache(self):
+        """
+        Clears the publish plugin definitions cached for other contexts than
+        the current one.
+
+        The publish plugin definitions of each context are cached on disk and
+        shared across sessions. The cache is automatically invalidated when the
+        environment files of the pipeline configuration are modified, but it
+        can be explicitly cleared, for example when the definitions depend on
+        external data which changed.
+        """
+        self._processed_contexts = {}
+        self._plugin_settings_cache.clear()
+
     def collect_files(self, file_paths):
         """
         Run the collection logic to populate the publish tree with items for
@@ -111,46 +159,45 @@ class PublishManager(object):
 
         new_items = []
 
-        for file_path in file_paths:
+        with self._timings.phase("collect"):
+            for file_path in file_paths:
 
-            # get a list of all items in the tree prior to collection
-            items_before = list(self.tree)
+                if self._path_already_collected(file_path):
+                    logger.debug(
+                        "Skipping previously collected file path: '%s'" % (file_path,)
+                    )
+                    continue
 
-            if self._path_already_collected(file_path):
-                logger.debug(
-                    "Skipping previously collected file path: '%s'" % (file_path,)
-                )
-            else:
                 logger.debug("Collecting file path: %s" % (file_path,))
 
                 # we supply the root item of the tree for parenting of items
-                # that are collected.
-                self._collector_instance.run_process_file(
-                    self.tree.root_item, file_path
-                )
-
-            # get a list of all items in the tree after collection
-            items_after = list(self.tree)
-
-            # calculate which items are new
-            new_file_items = list(set(items_after) - set(items_before))
+                # that are collected. the tree keeps track of the items created
+                # by the collector.
+                with self.tree._record_created_items() as new_file_items:
+                    with self._timings.measure(
+                        "collect", "process_file", self._collector_instance
+                    ) as record:
+                        record["file_path"] = file_path
+                        self._collector_instance.run_process_file(
+                            self.tree.root_item, file_path
+                        )
+
+                if not new_file_items:
+                    logger.debug("No items collected for path: %s" % (file_path,))
+                    continue
 
-            if not new_file_items:
-                logger.debug("No items collected for path: %s" % (file_path,))
-                continue
+                # Mark new items as persistent and include the file path that was
+                # used for collection as part of the item properties
+                for file_item in new_file_items:
+                    if file_item.parent == self.tree.root_item:
+                        # only top-level items can be marked as persistent
+                        file_item.persistent = True
+                    self.tree._set_collected_file_path(file_item, file_path)
 
-            # Mark new items as persistent and include the file path that was
-            # used for collection as part of the item properties
-            for file_item in new_file_items:
-                if file_item.parent == self.tree.root_item:
-                    # only top-level items can be marked as persistent
-                    file_item.persistent = True
-                file_item.properties[self.PROPERTY_KEY_COLLECTED_FILE_PATH] = file_path
+                # attach the appropriate plugins to the new items
+                self._attach_plugins(new_file_items)
 
-            # attach the appropriate plugins to the new items
-            self._attach_plugins(new_file_items)
-
-            new_items.extend(new_file_items)
+                new_items.extend(new_file_items)
 
         return new_items
 
@@ -168,44 +215,195 @@ class PublishManager(object):
         :returns: A list of the created :ref:`publish-api-item` instances.
         """
 
-        # this will clear the tree of all non-persistent items.
-        self.tree.clear(clear_persistent=False)
-
-        # get a list of all items in the tree prior to collection (this should
-        # be only the persistent items)
-        items_before = list(self.tree)
+        with self._timings.phase("collect"):
+            # this will clear the tree of all non-persistent items.
+            self.tree.clear(clear_persistent=False)
+
+            # we supply the root item of the tree for parenting of items that
+            # are collected. the tree keeps track of the items created by the
+            # collector.
+            with self.tree._record_created_items() as new_items:
+                with self._timings.measure(
+                    "collect", "process_current_session", self._collector_instance
+                ):
+                    self._collector_instance.run_process_current_session(
+                        self.tree.root_item
+                    )
 
-        # we supply the root item of the tree for parenting of items that
-        # are collected.
-        self._collector_instance.run_process_current_session(self.tree.root_item)
-
-        # get a list of all items in the tree after collection
-        items_after = list(self.tree)
-
-        # calculate which items are new
-        new_items = list(set(items_after) - set(items_before))
-
-        # attach the appropriate plugins to the new items
-        if new_items:
-            self._attach_plugins(new_items)
+            # attach the appropriate plugins to the new items
+            if new_items:
+                self._attach_plugins(new_items)
 
         return new_items
 
-    def load(self, path):
+    def load(self, path, lazy=False):
         """
         Load a publish tree that was serialized and saved to disk.
 
         This is a convenience method that replaces the manager's underlying
         :ref:`publish-api-tree` with the deserialized contents stored in the
         supplied file.
+
+        :param str path: The path to the serialized tree.
+        :param bool lazy: If ``True``, the items of the tree are only fully
+            created when first accessed. See :meth:`PublishTree.load_file`.
         """
-        self._tree = PublishTree.load_file(path)
+        self._tree = PublishTree.load_file(path, lazy=lazy)
 
-    def save(self, path):
+    def save(self, path, compact=False, compress=False):
         """
         Saves a publish tree to disk.
+
+        :param str path: The path to save the tree to.
+        :param bool compact: If ``True``, the tree is saved in the compact
+            format, better suited to large trees. See
+            :meth:`PublishTree.save`.
+        :param bool compress: If ``True``, the file is compressed with gzip.
+        """
+        self._tree.save_file(path, compact=compact, compress=compress)
+
+    def start_journal(self, path):
+        """
+        Starts recording the tasks completed by each publish phase in a
+        journal on disk, so that the publish can be resumed with
+        :meth:`~resume` if it is interrupted, by a crash for example.
+
+        The tree is saved next to the journal, with a ``.tree`` suffix, when
+        the journal is started. The journal should therefore be started once
+        the tree is ready to be published, right before validation:
+
+        .. code-block:: python
+
+            manager.start_journal("/path/to/publish.journal")
+            manager.validate()
+            manager.publish()
+            manager.finalize()
+            manager.stop_journal(remove=True)
+
+        Each completed task is recorded, along with the properties of its
+        item, before the next task is started. Tasks published in batches are
+        recorded once their publishes have been registered.
+
+        :param str path: The path to the journal.
+        """
+        self._journal = PublishJournal.create(path, self._tree)
+
+    def stop_journal(self, remove=False):
+        """
+        Stops recording the completed tasks in the journal.
+
+        :param bool remove: If ``True``, the journal and the tree saved with it
+            are removed from disk. Default is ``False``.
         """
-        self._tree.save_file(path)
+        if self._journal and remove:
+            self._journal.remove()
+        self._journal = None
+
+    def resume(self, path):
+        """
+        Resumes an interrupted publish from its journal.
+
+        The tree saved when the journal was started replaces the manager's
+        tree, and the properties of its items are restored to the state they
+        were in once the last recorded task completed. Running the publish
+        phases then skips the tasks recorded as completed, and records the
+        newly completed ones in the same journal:
+
+        .. code-block:: python
+
+            manager.resume("/path/to/publish.journal")
+            manager.validate()
+            manager.publish()
+            manager.finalize()
+
+        :param str path: The path to the journal, as supplied to
+            :meth:`~start_journal`.
+        :raises: :class:`sgtk.TankError` if the journal can't be read.
+        """
+        journal, tree_path, records = PublishJournal.load(path)
+        tree = PublishTree.load_file(tree_path)
+
+        items_by_id = dict((item.id, item) for item in tree)
+        for record in records:
+            item = items_by_id.get(record["item"])
+            if item is None:
+                logger.debug(
+                    "Ignoring the journal record of an unknown item: %s"
+                    % (record["item"],)
+                )
+                continue
+            item._merge_properties(
+                record["global_properties"], record["local_properties"]
+            )
+
+        logger.debug(
+            "Resuming publish from %s, with %s completed tasks." % (path, len(records))
+        )
+        self._tree = tree
+        self._journal = journal
+
+    def get_timing_report(self, phase=None):
+        """
+        Returns a report of the time spent in the collector and publish
+        plugins during the last run of each publish phase.
+
+        The phases are ``collect``, which covers :meth:`~collect_session` or
+        :meth:`~collect_files` along with the plugins' acceptance of the
+        collected items, ``validate``, ``publish`` and ``finalize``. The report
+        of a phase is replaced each time the phase is run.
+
+        The report of a phase is a json serializable dictionary of the form:
+
+        .. code-block:: python
+
+            {
+                "phase": "validate",
+                # the time spent in the phase, including the post phase hook
+                "wall_time": 12.5,
+                # the time spent in, and the CPU time used by, plugin calls
+                "plugin_wall_time": 11.9,
+                "plugin_cpu_time": 2.1,
+                # the totals for each plugin, keyed by plugin path
+                "plugins": {
+                    "/path/to/plugin.py": {
+                        "plugin": "Publish to Flow Production Tracking",
+                        "calls": 150,
+                        "wall_time": 11.9,
+                        "cpu_time": 2.1,
+                        "outcomes": {"valid": 149, "invalid": 1},
+                    },
+                },
+                # every plugin call, in completion order
+                "records": [
+                    {
+                        "method": "validate",
+                        "plugin": "Publish to Flow Production Tracking",
+                        "plugin_path": "/path/to/plugin.py",
+                        "item": "shot_010.mov",
+                        "item_id": "5b5f1e5c2f0e4c7b9d3a6f1e2d4c8b7a",
+                        "item_type": "file.video",
+                        "item_count": 1,
+                        "outcome": "valid",
+                        "wall_time": 0.08,
+                        "cpu_time": 0.01,
+                    },
+                    ...
+                ],
+            }
+
+        The outcome of a call is ``error`` if the plugin raised, ``valid`` or
+        ``invalid`` for validation calls and ``success`` otherwise. Calls made
+        for several items at once, such as acceptance or batched validation,
+        have no ``item`` and the number of items in ``item_count``. The CPU
+        time is measured for the thread making the call only. It is ``None``
+        for tasks published in worker processes.
+
+        :param str phase: The name of the phase to report on. If not supplied,
+            a dictionary of the report of each phase run so far, keyed by
+            phase name, is returned.
+        :returns: A dictionary.
+        """
+        return self._timings.get_report(phase)
 
     def _process_tasks(self, task_generator, task_cb):
         """
@@ -244,7 +442,94 @@ class PublishManager(object):
             except StopIteration:
                 break
 
-    def validate(self, task_generator=None):
+    async def _aprocess_tasks(self, task_generator, task_cb, executor):
+        """
+        Coroutine version of :meth:`_process_tasks`.
+
+        The callback is invoked in the supplied executor for each task and its
+        result is forwarded back to the generator, which can either be a regular
+        generator or an asynchronous generator.
+
+        :param task_generator: Iterator or asynchronous iterator on the tasks to
+            process.
+        :param task_cb: Callable that will process a task. It will be called
+            from the executor.
+        :param executor: The executor to run the callback in. ``None`` to use
+            the event loop's default executor.
+        """
+        if not task_generator:
+            task_generator = self._task_generator()
+
+        is_async_generator = hasattr(task_generator, "asend")
+
+        async def send(value):
+            # returns the next task from the generator, None once exhausted.
+            try:
+                if is_async_generator:
+                    return await task_generator.asend(value)
+                else:
+                    return task_generator.send(value)
+            except (StopIteration, StopAsyncIteration):
+                return None
+
+        # get the first task. sending None is the same as calling next()
+        task = await send(None)
+
+        while task:
+            return_value = await self._arun_in_executor(executor, task_cb, task)
+            task = await send(return_value)
+
+    async def _arun_in_executor(self, executor, func, *args):
+        """
+        Runs the supplied callable in an executor without blocking the running
+        event loop.
+
+        :param executor: The executor to run the callable in. ``None`` to use
+            the event loop's default executor.
+        :param func: The callable to run.
+        :param args: The arguments to pass to the callable.
+
+        :returns: The result of the callable.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, func, *args)
+
+    def _process_tasks_concurrently(
+        self, task_generator, task_cb, max_workers, honor_dependencies=False
+    ):
+        """
+        Processes tasks returned by the generator on a pool of worker threads,
+        invoking the passed in callback on each.
+
+        Since tasks are executed concurrently, the generator is exhausted
+        before any of the tasks are processed. As a consequence, the generator
+        will be sent ``None`` instead of the result of each task.
+
+        :param task_generator: Iterator on task to process.
+        :param task_cb: Callable that will process a task. It will be called
+            from worker threads.
+        :param int max_workers: The maximum number of tasks to process at once.
+        :param bool honor_dependencies: If ``True``, the tasks of an item are
+            processed in order and only once the tasks of the item's parents
+            have completed. See :class:`_TaskScheduler` for details.
+
+        :returns: A list of tuples of (task, task_cb result), in the order the
+            tasks were returned by the generator.
+        """
+        if not task_generator:
+            task_generator = self._task_generator()
+
+        tasks = list(task_generator)
+
+        logger.debug(
+            "Processing %s tasks using %s worker threads..." % (len(tasks), max_workers)
+        )
+        scheduler = _TaskScheduler(tasks, honor_dependencies=honor_dependencies)
+        results = scheduler.run(task_cb, max_workers)
+
+        return list(zip(tasks, results))
+
+    def validate(self, task_generator=None, max_workers=None, batched=False):
         """
         Validate items to be published.
 
@@ -273,7 +558,34 @@ class PublishManager(object):
 
             publish_manager.validate(task_generator=all_tasks_generator)
 
+        Validation of large trees can be sped up by validating several tasks at
+        once, on a pool of worker threads, by supplying ``max_workers``. This is
+        useful when the validation logic is mostly waiting on the network, as is
+        the case when querying Flow Production Tracking for conflicting
+        publishes. In this mode, the ``task_generator`` is exhausted before
+        validation begins and it will be sent ``None`` rather than the
+        validation status of each task. The returned list of failures is
+        unaffected and :meth:`~.base_hooks.PostPhaseHook.post_validate` is still
+        executed once all tasks have been validated.
+
+        .. note:: Concurrent validation requires the ``validate`` method of the
+            configured publish plugins to be thread safe. It is not used by the
+            Publisher UI.
+
+        Setting ``batched`` to ``True`` validates all the tasks driven by the
+        same plugin, and sharing the same settings, with a single call to the
+        plugin's :meth:`~.base_hooks.PublishPlugin.validate_batch` method. This
+        allows plugins to gather the information they need to validate many
+        items with a handful of database queries. As with concurrent
+        validation, the ``task_generator`` is exhausted before validation
+        begins and will be sent ``None`` for each task. When combined with
+        ``max_workers``, the batches are validated concurrently.
+
         :param task_generator: A generator of :class:`~PublishTask` instances.
+        :param int max_workers: The maximum number of tasks to validate at
+            once. If not supplied or lower than ``2``, tasks are validated one
+            after the other.
+        :param bool batched: If ``True``, tasks are validated in batches.
 
         :returns: A list of tuples of (:class:`~PublishTask`,
             optional :class:`Exception`) that failed to validate.
@@ -282,35 +594,43 @@ class PublishManager(object):
         # we'll use this to build a list of tasks that failed to validate
         failed_to_validate = []
 
-        def task_cb(task):
-            error = None
-            # do the actual validation and send the status back to the generator
-            # so that it can react to the results. This is used, for example, by
-            # the UI's generator to update the display of the task as it is
-            # being processed.
-            try:
-                is_valid = task.validate()
-            except Exception as e:
-                is_valid = False
-                error = e
+        with self._timings.phase("validate"), self._recording_journal():
+            if batched:
+                results = self._validate_tasks_batched(task_generator, max_workers)
+                for task, (is_valid, error) in results:
+                    if not is_valid:
+                        failed_to_validate.append((task, error))
+            elif max_workers and max_workers > 1:
+                results = self._process_tasks_concurrently(
+                    task_generator, self._validate_task, max_workers
+                )
+                for task, (is_valid, error) in results:
+                    if not is_valid:
+                        failed_to_validate.append((task, error))
+            else:
 
-            # if the task didn't validate, add it to the list of tasks that
-            # failed.
-            if not is_valid:
-                failed_to_validate.append((task, error))
+                def serial_task_cb(task):
+                    is_valid, error = self._validate_task(task)
 
-            return (is_valid, error)
+                    # if the task didn't validate, add it to the list of tasks that
+                    # failed.
+                    if not is_valid:
+                        failed_to_validate.append((task, error))
 
-        self._process_tasks(task_generator, task_cb)
+                    return (is_valid, error)
 
-        # execute the post validate method of the phase phase hook
-        self._post_phase_hook.post_validate(
-            self.tree,
-        )
+                self._process_tasks(task_generator, serial_task_cb)
+
+            # execute the post validate method of the phase phase hook
+            self._post_phase_hook.post_validate(
+                self.tree,
+            )
 
         return failed_to_validate
 
-    def publish(self, task_generator=None):
+    def publish(
+        self, task_generator=None, max_workers=None, use_processes=False, batched=False
+    ):
         """
         Publish items in the tree.
 
@@ -340,12 +660,98 @@ class PublishManager(object):
         If an exception is raised by one of the published task, the publishing
         is aborted and the exception is raised back to the caller.
 
+        Large trees with many independent items can be published faster by
+        supplying ``max_workers``. Tasks are then run on a pool of worker
+        threads while honoring the structure of the tree: the tasks of an item
+        are executed one after the other, in plugin order, and only once all the
+        tasks of the item's parent have completed. Independent items and their
+        children are published concurrently. As with concurrent validation, the
+        ``task_generator`` is exhausted before publishing begins and will be
+        sent ``None`` for each task. If a task raises, no new tasks are started
+        and the exception is raised back to the caller once the tasks already
+        running have completed.
+
+        .. note:: Concurrent publishing requires the ``publish`` method of the
+            configured publish plugins to be thread safe. It is not used by the
+            Publisher UI.
+
+        Plugins doing CPU intensive work in their ``publish`` method will not
+        benefit from worker threads. Setting ``use_processes`` to ``True`` runs
+        each task in a pool of worker processes instead. The subtree of the
+        task's item, along with the item's chain of parents, is serialized and
+        sent to a worker process where the task is executed. The worker
+        processes are forked before any task is started. Once the task
+        completes, the properties of the item (``sg_publish_data`` for
+        example) are merged back into the manager's tree. Only the properties
+        of the task's own item are brought back: changes made to the
+        properties of other items, or to the tree itself, are lost. Log
+        messages emitted by the plugins in the worker processes are not
+        forwarded to the manager's logger.
+
+        .. note:: Worker processes are forked from the current process in order
+            to inherit the running engine, so ``use_processes`` is only
+            available on platforms supporting the ``fork`` start method.
+
+        Setting ``batched`` to ``True`` allows publish plugins to queue the
+        registration of their publishes and versions on the tree's
+        :attr:`~PublishTree.publish_batch` rather than registering them one at a
+        time. Once all the tasks have been published, the queued publishes and
+        versions are created with a handful of ``batch()`` calls and stored in
+        the ``sg_publish_data`` and ``sg_version_data`` properties of their
+        item, and the versions' media is uploaded concurrently, before the
+        ``post_publish`` method of the :class:`~.base_hooks.PostPhaseHook` is
+        called. This means these properties are not available to the other
+        plugins during the publish phase. If a task raises, the queued publishes
+        and versions are discarded. Batching is not available when
+        ``use_processes`` is set.
+
         :param task_generator: A generator of :class:`~PublishTask` instances.
+        :param int max_workers: The maximum number of tasks to publish at once.
+            If not supplied or lower than ``2``, tasks are published one after
+            the other.
+        :param bool use_processes: If ``True``, the tasks are executed in a pool
+            of ``max_workers`` worker processes rather than worker threads.
+            Ignored unless ``max_workers`` is also supplied.
+        :param bool batched: If ``True``, publish registrations are batched.
+
+        :raises: :class:`sgtk.TankError` if ``use_processes`` is requested on a
+            platform that does not support it.
         """
-        self._process_tasks(task_generator, lambda task: task.publish())
-
-        # execute the post publish method of the phase phase hook
-        self._post_phase_hook.post_publish(self.tree)
+        with self._timings.phase("publish"), self._recording_journal():
+            if max_workers and max_workers > 1 and use_processes:
+                self._publish_in_processes(task_generator, max_workers)
+            else:
+                if batched:
+                    self.tree._publish_batch = PublishBatch(self.logger)
+                    self._deferred_journal_tasks = []
+                try:
+                    if max_workers and max_workers > 1:
+                        self._process_tasks_concurrently(
+                            task_generator,
+                            self._publish_task,
+                            max_workers,
+                            honor_dependencies=True,
+                        )
+                    else:
+                        self._process_tasks(task_generator, self._publish_task)
+                finally:
+                    publish_batch = self.tree._publish_batch
+                    deferred_journal_tasks = self._deferred_journal_tasks
+                    self.tree._publish_batch = None
+                    self._deferred_journal_tasks = None
+
+                # the batch is only registered once all the tasks have been
+                # published, so that nothing is registered for a failed publish
+                if publish_batch:
+                    publish_batch.flush()
+
+                    # the tasks are only complete once their publishes have
+                    # been registered
+                    for task in deferred_journal_tasks:
+                        self._task_completed("publish", task)
+
+            # execute the post publish method of the phase phase hook
+            self._post_phase_hook.post_publish(self.tree)
 
     def finalize(self, task_generator=None):
         """
@@ -379,10 +785,101 @@ class PublishManager(object):
 
         :param task_generator: A generator of :class:`~PublishTask` instances.
         """
-        self._process_tasks(task_generator, lambda task: task.finalize())
+        with self._timings.phase("finalize"), self._recording_journal():
+            self._process_tasks(task_generator, self._finalize_task)
 
-        # execute the post finalize method of the phase phase hook
-        self._post_phase_hook.post_finalize(self.tree)
+            # execute the post finalize method of the phase phase hook
+            self._post_phase_hook.post_finalize(self.tree)
+
+    async def avalidate(self, task_generator=None, executor=None):
+        """
+        Coroutine version of :meth:`validate`, for use within an
+        :mod:`asyncio` event loop.
+
+        Each task is validated in the supplied ``executor`` so that the event
+        loop is never blocked by the publish plugins. Control is given back to
+        the event loop between tasks, which makes it possible for a single
+        process to drive many publish trees, each with its own manager, at the
+        same time. The number of plugin calls executed at once across all of
+        these is bounded by the size of the executor.
+
+        The ``task_generator`` can be a regular generator or an asynchronous
+        generator. In both cases, the validation status of each task is sent
+        back to it, as is the case with :meth:`validate`.
+
+        :param task_generator: A generator or asynchronous generator of
+            :class:`~PublishTask` instances.
+        :param executor: A :class:`concurrent.futures.Executor` in which to
+            run the plugin calls. If not supplied, the event loop's default
+            executor is used.
+
+        :returns: A list of tuples of (:class:`~PublishTask`,
+            optional :class:`Exception`) that failed to validate.
+        """
+
+        # we'll use this to build a list of tasks that failed to validate
+        failed_to_validate = []
+
+        def task_cb(task):
+            is_valid, error = self._validate_task(task)
+            if not is_valid:
+                failed_to_validate.append((task, error))
+            return (is_valid, error)
+
+        with self._timings.phase("validate"), self._recording_journal():
+            await self._aprocess_tasks(task_generator, task_cb, executor)
+
+            await self._arun_in_executor(
+                executor, self._post_phase_hook.post_validate, self.tree
+            )
+
+        return failed_to_validate
+
+    async def apublish(self, task_generator=None, executor=None):
+        """
+        Coroutine version of :meth:`publish`, for use within an :mod:`asyncio`
+        event loop.
+
+        See :meth:`avalidate` for details about how tasks are executed.
+
+        If an exception is raised by one of the published task, the publishing
+        is aborted and the exception is raised back to the caller.
+
+        :param task_generator: A generator or asynchronous generator of
+            :class:`~PublishTask` instances.
+        :param executor: A :class:`concurrent.futures.Executor` in which to
+            run the plugin calls. If not supplied, the event loop's default
+            executor is used.
+        """
+        with self._timings.phase("publish"), self._recording_journal():
+            await self._aprocess_tasks(task_generator, self._publish_task, executor)
+
+            await self._arun_in_executor(
+                executor, self._post_phase_hook.post_publish, self.tree
+            )
+
+    async def afinalize(self, task_generator=None, executor=None):
+        """
+        Coroutine version of :meth:`finalize`, for use within an :mod:`asyncio`
+        event loop.
+
+        See :meth:`avalidate` for details about how tasks are executed.
+
+        If an exception is raised by one of the finalized task, the finalization
+        is aborted and the exception is raised back to the caller.
+
+        :param task_generator: A generator or asynchronous generator of
+            :class:`~PublishTask` instances.
+        :param executor: A :class:`concurrent.futures.Executor` in which to
+            run the plugin calls. If not supplied, the event loop's default
+            executor is used.
+        """
+        with self._timings.phase("finalize"), self._recording_journal():
+            await self._aprocess_tasks(task_generator, self._finalize_task, executor)
+
+            await self._arun_in_executor(
+                executor, self._post_phase_hook.post_finalize, self.tree
+            )
 
     @property
     def context(self):
@@ -427,42 +924,300 @@ class PublishManager(object):
         For each item supplied, given it's context, load the appropriate plugins
         and add any matching tasks. If any tasks exist on the supplied items,
         they will be removed.
+
+        Items are grouped by context so that each plugin is asked to accept all
+        the matching items of a context in a single call.
         """
+
+        # group the items by context, preserving their order
+        items_by_context = {}
         for item in items:
 
             # clear existing tasks for this item
             item.clear_tasks()
 
             logger.debug("Processing item: %s" % (item,))
+            items_by_context.setdefault(item.context, []).append(item)
 
-            item_context = item.context
+        for item_context, context_items in items_by_context.items():
 
             context_plugins = self._load_publish_plugins(item_context)
             logger.debug(
-                "Offering %s plugins for context: %s"
-                % (len(context_plugins), item_context)
+                "Offering %s plugins to %s items for context: %s"
+                % (len(context_plugins), len(context_items), item_context)
             )
 
             for context_plugin in context_plugins:
 
                 logger.debug("Checking plugin: %s" % (context_plugin,))
 
-                if not self._item_filters_match(item, context_plugin):
+                matching_items = [
+                    item
+                    for item in context_items
+                    if self._item_filters_match(item, context_plugin)
+                ]
+                logger.debug(
+                    "%s of %s items match plugin filters: '%s'"
+                    % (
+                        len(matching_items),
+                        len(context_items),
+                        context_plugin.item_filters,
+                    )
+                )
+                if not matching_items:
                     continue
 
-                logger.debug("Running plugin acceptance method...")
+                logger.debug(
+                    "Running plugin acceptance method for %s items..."
+                    % (len(matching_items),)
+                )
 
-                # item/filters matched. now see if the plugin accepts
-                accept_data = context_plugin.run_accept(item)
+                # item/filters matched. now see if the plugin accepts them
+                with self._timings.measure(
+                    "collect", "accept", context_plugin, items=matching_items
+                ) as record:
+                    accept_results = context_plugin.run_accept_batch(matching_items)
+                    record["accepted"] = len(
+                        [data for data in accept_results if data.get("accepted")]
+                    )
+
+                for item, accept_data in zip(matching_items, accept_results):
+                    if accept_data.get("accepted"):
+                        logger.debug("Plugin accepted the item: %s" % (item,))
+                        task = item.add_task(context_plugin)
+                        task.visible = accept_data.get("visible", True)
+                        task.active = accept_data.get("checked", True)
+                        task.enabled = accept_data.get("enabled", True)
+                    else:
+                        logger.debug("Plugin did not accept the item: %s" % (item,))
+
+    def _publish_in_processes(self, task_generator, max_workers):
+        """
+        Publishes the tasks returned by the generator in a pool of worker
+        processes, honoring the dependencies between items.
+
+        :param task_generator: Iterator on task to process.
+        :param int max_workers: The maximum number of worker processes.
+        """
 
-                if accept_data.get("accepted"):
-                    logger.debug("Plugin accepted the item.")
-                    task = item.add_task(context_plugin)
-                    task.visible = accept_data.get("visible", True)
-                    task.active = accept_data.get("checked", True)
-                    task.enabled = accept_data.get("enabled", True)
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise sgtk.TankError(
+                "Publishing in worker processes requires the 'fork' start "
+                "method, which is not available on this platform."
+            )
+
+        process_pool = ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=multiprocessing.get_context("fork")
+        )
+
+        def task_cb(task):
+            if self._is_task_completed("publish", task):
+                return
+
+            # ship the task and its item to a worker process, then bring the
+            # resulting item properties back into the tree before the tasks of
+            # the children are started.
+            logger.debug("Publishing task %s in a worker process..." % (task,))
+            with self._timings.measure(
+                "publish", "publish", task.plugin, task.item, cpu=False
+            ):
+                result = process_pool.submit(
+                    _publish_in_worker_process, _serialize_task_payload(task)
+                ).result()
+            result = json.loads(result, object_hook=_json_to_objects)
+            task.item._merge_properties(
+                result["global_properties"], result["local_properties"]
+            )
+            self._task_completed("publish", task)
+
+        with process_pool:
+            # the pool forks all of its worker processes on the first
+            # submission. submit from this thread, before the pool of worker
+            # threads is started, so that no thread is forked in the middle of
+            # holding a lock.
+            process_pool.submit(os.getpid).result()
+
+            self._process_tasks_concurrently(
+                task_generator, task_cb, max_workers, honor_dependencies=True
+            )
+
+    def _validate_tasks_batched(self, task_generator, max_workers):
+        """
+        Validates the tasks returned by the generator in batches.
+
+        Tasks are grouped by plugin and settings values, and each group is
+        validated with a single call to the plugin.
+
+        :param task_generator: Iterator on task to process.
+        :param int max_workers: The maximum number of batches to validate at
+            once. If not supplied or lower than ``2``, batches are validated one
+            after the other.
+
+        :returns: A list of tuples of (task, (bool, optional exception)), in the
+            order the tasks were returned by the generator.
+        """
+        if not task_generator:
+            task_generator = self._task_generator()
+
+        tasks = list(task_generator)
+
+        # tasks validated before the publish was resumed are not validated
+        # again
+        results_by_task = {}
+        for task in tasks:
+            if self._is_task_completed("validate", task):
+                results_by_task[id(task)] = (True, None)
+
+        # group the tasks by plugin, then by settings since each task can have
+        # its own values for the plugin's settings.
+        batches = []
+        batches_by_plugin = {}
+        for task in tasks:
+            if id(task) in results_by_task:
+                continue
+            settings_values = dict(
+                (name, setting.value) for (name, setting) in task.settings.items()
+            )
+            plugin_batches = batches_by_plugin.setdefault(task.plugin, [])
+            for batch_settings_values, batch in plugin_batches:
+                if batch_settings_values == settings_values:
+                    batch.append(task)
+                    break
+            else:
+                batch = [task]
+                plugin_batches.append((settings_values, batch))
+                batches.append(batch)
+
+        logger.debug(
+            "Validating %s tasks in %s batches..." % (len(tasks), len(batches))
+        )
+
+        def validate_batch(batch):
+            items = [task.item for task in batch]
+            with self._timings.measure(
+                "validate", "validate_batch", batch[0].plugin, items=items
+            ) as record:
+                results = batch[0].plugin.run_validate_batch(batch[0].settings, items)
+                if all(is_valid for (is_valid, _) in results):
+                    record["outcome"] = "valid"
                 else:
-                    logger.debug("Plugin did not accept the item.")
+                    record["outcome"] = "invalid"
+            return results
+
+        if max_workers and max_workers > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                batch_results = list(executor.map(validate_batch, batches))
+        else:
+            batch_results = [validate_batch(batch) for batch in batches]
+
+        for batch, results in zip(batches, batch_results):
+            for task, result in zip(batch, results):
+                results_by_task[id(task)] = result
+                if result[0]:
+                    self._task_completed("validate", task)
+
+        return [(task, results_by_task[id(task)]) for task in tasks]
+
+    def _validate_task(self, task):
+        """
+        Validates a single task.
+
+        :param task: The :class:`~PublishTask` to validate.
+
+        :returns: A tuple of (bool, optional :class:`Exception`) indicating if
+            the task is valid and the error raised while validating, if any.
+        """
+        if self._is_task_completed("validate", task):
+            return (True, None)
+
+        error = None
+        # do the actual validation and send the status back to the generator
+        # so that it can react to the results. This is used, for example, by
+        # the UI's generator to update the display of the task as it is
+        # being processed.
+        try:
+            with self._timings.measure(
+                "validate", "validate", task.plugin, task.item
+            ) as record:
+                is_valid = task.validate()
+                record["outcome"] = "valid" if is_valid else "invalid"
+        except Exception as e:
+            is_valid = False
+            error = e
+
+        if is_valid:
+            self._task_completed("validate", task)
+
+        return (is_valid, error)
+
+    def _publish_task(self, task):
+        """
+        Publishes a single task.
+
+        :param task: The :class:`~PublishTask` to publish.
+        """
+        if self._is_task_completed("publish", task):
+            return
+
+        with self._timings.measure("publish", "publish", task.plugin, task.item):
+            task.publish()
+
+        if self._deferred_journal_tasks is not None:
+            # recorded once the batch has been flushed. see publish.
+            self._deferred_journal_tasks.append(task)
+        else:
+            self._task_completed("publish", task)
+
+    def _finalize_task(self, task):
+        """
+        Finalizes a single task.
+
+        :param task: The :class:`~PublishTask` to finalize.
+        """
+        if self._is_task_completed("finalize", task):
+            return
+
+        with self._timings.measure("finalize", "finalize", task.plugin, task.item):
+            task.finalize()
+        self._task_completed("finalize", task)
+
+    def _is_task_completed(self, phase, task):
+        """
+        Returns ``True`` if the journal records the supplied task as completed
+        for the supplied phase, in which case the task should be skipped.
+
+        :param str phase: The name of the phase.
+        :param task: A :class:`~PublishTask`.
+        """
+        if self._journal is not None and self._journal.is_complete(phase, task):
+            logger.debug(
+                "Skipping task %s, already completed in the %s phase of the "
+                "resumed publish." % (task, phase)
+            )
+            return True
+        return False
+
+    @contextmanager
+    def _recording_journal(self):
+        """
+        A context manager keeping the journal, if any, open while the tasks of
+        a phase are recorded.
+        """
+        if self._journal is None:
+            yield
+        else:
+            with self._journal.recording():
+                yield
+
+    def _task_completed(self, phase, task):
+        """
+        Records the completion of a task in the journal, if any.
+
+        :param str phase: The name of the phase.
+        :param task: The completed :class:`~PublishTask`.
+        """
+        if self._journal is not None:
+            self._journal.record(phase, task)
 
     def _item_filters_match(self, item, publish_plugin):
         """
@@ -473,21 +1228,10 @@ class PublishManager(object):
         :param publish_plugin: The publish plugin instance to compare
         """
 
-        for item_filter in publish_plugin.item_filters:
-            if fnmatch.fnmatch(item.type_spec, item_filter):
-                # there is a match!
-                logger.debug(
-                    "Item %s with spec '%s' matches plugin filters: '%s'"
-                    % (item, item.type_spec, item_filter)
-                )
-                return True
-
-        # no filters match the item's type
-        logger.debug(
-            "Item %s with spec '%s' does not match any plugin filters: '%s'"
-            % (item, item.type_spec, publish_plugin.item_filters)
-        )
-        return False
+        # the plugin compiles its filters and remembers the result for each
+        # type spec. the matches are logged for all the items offered to a
+        # plugin at once, see _attach_plugins.
+        return publish_plugin.item_type_matches(item.type_spec)
 
     def _load_collector(self):
         """
@@ -511,8 +1255,6 @@ class PublishManager(object):
         if context in self._processed_contexts:
             return self._processed_contexts[context]
 
-        engine = self._bundle.engine
-
         if context == self._bundle.context:
             # if the context matches the bundle, we don't need to do any extra
             # work since the settings are already accessible
@@ -521,39 +1263,16 @@ class PublishManager(object):
         else:
             # load the plugins from the supplied context. this means executing
             # the pick environment hook and reading from disk. this is why we
-            # cache the plugins.
-            logger.debug(
-                "Finding publish plugin settings via pick_environment for context: %s"
-                % (context,)
-            )
-            context_settings = sgtk.platform.engine.find_app_settings(
-                engine.name,
-                self._bundle.name,
-                self._bundle.sgtk,
-                context,
-                engine_instance_name=engine.instance_name,
+            # cache the plugins, in memory and on disk. the picked environment
+            # is part of the cache key since it can depend on more than the
+            # context.
+            environment = self._bundle.sgtk.execute_core_hook(
+                "pick_environment", context=context
             )
-
-            app_settings = None
-            if len(context_settings) > 1:
-                # There's more than one instance of that app for the engine
-                # instance, so we'll need to deterministically pick one. We'll
-                # pick the one with the same application instance name as the
-                # current app instance.
-                for settings in context_settings:
-                    if settings.get("app_instance") == self._bundle.instance_name:
-                        app_settings = settings.get("settings")
-            elif len(context_settings) == 1:
-                app_settings = context_settings[0].get("settings")
-
-            if app_settings:
-                plugin_settings = app_settings[self.CONFIG_PLUGIN_DEFINITIONS]
-            else:
-                logger.debug(
-                    "Could not find publish plugin settings for context: %s"
-                    % (context,)
-                )
-                plugin_settings = []
+            plugin_settings = self._plugin_settings_cache.get(context, environment)
+            if plugin_settings is None:
+                plugin_settings = self._find_plugin_settings(context, environment)
+                self._plugin_settings_cache.set(context, environment, plugin_settings)
 
         # build up a list of all configured publish plugins here
         plugins = []
@@ -581,19 +1300,99 @@ class PublishManager(object):
 
         return plugins
 
+    def _find_plugin_settings(self, context, environment):
+        """
+        Finds the publish plugin definitions configured for the supplied
+        context, by reading the environment picked for it from disk.
+
+        :param context: The :class:`sgtk.Context` to find the definitions for.
+        :param str environment: The name of the environment picked for the
+            context.
+        :returns: A list of plugin definitions.
+        """
+        engine = self._bundle.engine
+
+        logger.debug(
+            "Finding publish plugin settings in environment %s for context: %s"
+            % (environment, context)
+        )
+
+        # this is what sgtk.platform.engine.find_app_settings does, without
+        # running the pick environment hook again.
+        context_settings = []
+        if environment:
+            env = self._bundle.sgtk.pipeline_configuration.get_environment(
+                environment, context
+            )
+            if (
+                engine.instance_name in env.get_engines()
+                and env.get_engine_descriptor(engine.instance_name).system_name
+                == engine.name
+            ):
+                app_instance_names = env.get_apps(engine.instance_name)
+            else:
+                app_instance_names = []
+
+            for app_instance_name in app_instance_names:
+                descriptor = env.get_app_descriptor(
+                    engine.instance_name, app_instance_name
+                )
+                if descriptor.system_name != self._bundle.name:
+                    continue
+                settings = env.get_app_settings(engine.instance_name, app_instance_name)
+                try:
+                    sgtk.platform.validation.validate_context(descriptor, context)
+                    sgtk.platform.validation.validate_settings(
+                        app_instance_name,
+                        self._bundle.sgtk,
+                        context,
+                        descriptor.configuration_schema,
+                        settings,
+                    )
+                except sgtk.TankError as e:
+                    # this app doesn't work with the given context
+                    logger.debug(
+                        "Skipping app %s for context %s: %s"
+                        % (app_instance_name, context, e)
+                    )
+                    continue
+                context_settings.append(
+                    {"app_instance": app_instance_name, "settings": settings}
+                )
+
+        app_settings = None
+        if len(context_settings) > 1:
+            # There's more than one instance of that app for the engine
+            # instance, so we'll need to deterministically pick one. We'll
+            # pick the one with the same application instance name as the
+            # current app instance.
+            for settings in context_settings:
+                if settings.get("app_instance") == self._bundle.instance_name:
+                    app_settings = settings.get("settings")
+        elif len(context_settings) == 1:
+            app_settings = context_settings[0].get("settings")
+
+        if app_settings:
+            plugin_settings = app_settings[self.CONFIG_PLUGIN_DEFINITIONS]
+        else:
+            logger.debug(
+                "Could not find publish plugin settings for context: %s" % (context,)
+            )
+            plugin_settings = []
+
+        return plugin_settings
+
     def _path_already_collected(self, file_path):
         """
         Returns ``True`` if the supplied file path has been collected into the
         tree already. ``False`` otherwise.
         """
 
-        # check each persistent item for a collected file path. if it matches
-        # the supplied path, then the path has already been collected.
-        for item in self.tree.persistent_items:
-            if self.PROPERTY_KEY_COLLECTED_FILE_PATH in item.properties:
-                collected_path = item.properties[self.PROPERTY_KEY_COLLECTED_FILE_PATH]
-                if collected_path == file_path:
-                    return True
+        # look up the items collected for this path. if one of them is still a
+        # persistent item of the tree, then the path has already been collected.
+        for item in self.tree.items_for_collected_path(file_path):
+            if item.persistent:
+                return True
 
         # no existing, persistent item was collected with this path
         return False
@@ -629,3 +1428,192 @@ class PublishManager(object):
 
                 status = yield task
                 logger.debug("Task %s status: %s" % (task, status))
+
+
+def _serialize_task_payload(task):
+    """
+    Serializes a task along with the subtree of its item and the chain of
+    parents of the item, so that the task can be executed in a worker process.
+
+    The tasks of the other items aren't serialized, since only the supplied
+    task is executed.
+
+    :param task: The :class:`~PublishTask` to serialize.
+
+    :returns: A json string.
+    """
+
+    item_dicts = []
+
+    item = task.item.parent
+    while item:
+        item_dict = item.to_dict(include_children=False)
+        item_dict["tasks"] = []
+        item_dicts.insert(0, item_dict)
+        item = item.parent
+
+    # the task's item is sent with its subtree
+    item_dict = task.item.to_dict()
+    item_dicts.append(item_dict)
+
+    # only the task to execute needs to be sent over
+    child_dicts = list(item_dict["children"])
+    while child_dicts:
+        child_dict = child_dicts.pop()
+        child_dict["tasks"] = []
+        child_dicts.extend(child_dict["children"])
+    item_dict["tasks"] = [task.to_dict()]
+
+    return json.dumps(
+        {
+            "items": item_dicts,
+            "serialization_version": PublishTree.SERIALIZATION_VERSION,
+        },
+        cls=_PublishTreeEncoder,
+    )
+
+
+def _publish_in_worker_process(payload):
+    """
+    Executes a serialized task in a worker process.
+
+    :param str payload: The serialized task, as returned by
+        :func:`_serialize_task_payload`.
+
+    :returns: A json string of the global and local properties of the task's
+        item once the task has been executed.
+    """
+
+    payload = json.loads(payload, object_hook=_json_to_objects)
+    serialization_version = payload["serialization_version"]
+
+    # rebuild the chain of items, from the root down to the task's item and
+    # its subtree
+    item = None
+    for item_dict in payload["items"]:
+        item = PublishItem.from_dict(item_dict, serialization_version, parent=item)
+
+    item.tasks[0].publish()
+
+    item_dict = item.to_dict(include_children=False)
+    return json.dumps(
+        {
+            "global_properties": item_dict["global_properties"],
+            "local_properties": item_dict["local_properties"],
+        },
+        cls=_PublishTreeEncoder,
+    )
+
+
+class _TaskScheduler(object):
+    """
+    Runs tasks on a pool of worker threads.
+
+    When dependencies are honored, the tasks are grouped by item. The tasks of
+    an item are run one after the other, in the order they were supplied, and
+    only once all the tasks of the closest ancestor item with tasks to run have
+    completed. This mirrors the way publish plugins share data down the tree,
+    for example via the ``sg_publish_data`` property of the parent item.
+    Independent subtrees are processed concurrently.
+
+    When dependencies are not honored, every task is run as soon as a worker is
+    available.
+    """
+
+    def __init__(self, tasks, honor_dependencies=False):
+        """
+        :param list tasks: The tasks to schedule.
+        :param bool honor_dependencies: ``True`` if tasks should wait for the
+            tasks of their parent items, ``False`` otherwise.
+        """
+
+        self._num_tasks = len(tasks)
+
+        # each node of the graph is a list of (index, task) to be processed in
+        # order. the index is the position of the task in the supplied list.
+        self._nodes = []
+
+        # lookup of node index to the indices of the nodes waiting on it
+        self._dependents = {}
+
+        # the indices of the nodes without any dependency
+        self._roots = []
+
+        if not honor_dependencies:
+            self._nodes = [[(index, task)] for (index, task) in enumerate(tasks)]
+            self._roots = list(range(len(self._nodes)))
+            return
+
+        # group the tasks by item, preserving the order they were supplied in
+        node_by_item = {}
+        for index, task in enumerate(tasks):
+            if task.item not in node_by_item:
+                node_by_item[task.item] = len(self._nodes)
+                self._nodes.append([])
+            self._nodes[node_by_item[task.item]].append((index, task))
+
+        # each item depends on its closest ancestor that has tasks to run
+        for item, node_index in node_by_item.items():
+            ancestor = item.parent
+            while ancestor is not None and ancestor not in node_by_item:
+                ancestor = ancestor.parent
+
+            if ancestor is None:
+                self._roots.append(node_index)
+            else:
+                self._dependents.setdefault(node_by_item[ancestor], []).append(
+                    node_index
+                )
+
+    def run(self, task_cb, max_workers):
+        """
+        Runs all the tasks.
+
+        If a task raises an exception, no new tasks are started, the tasks
+        already running are allowed to complete and the first exception raised
+        is re-raised.
+
+        :param task_cb: The callable that processes a task.
+        :param int max_workers: The maximum number of tasks to run at once.
+
+        :returns: A list of the task_cb results, in the order the tasks were
+            supplied.
+        """
+
+        results = [None] * self._num_tasks
+        first_error = None
+
+        def process_node(node_index):
+            for index, task in self._nodes[node_index]:
+                results[index] = task_cb(task)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+            running = {}
+            for node_index in self._roots:
+                running[executor.submit(process_node, node_index)] = node_index
+
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node_index = running.pop(future)
+                    error = future.exception()
+                    if error:
+                        logger.debug("Task processing failed: %s" % (error,))
+                        first_error = first_error or error
+                        continue
+
+                    if first_error:
+                        # don't start anything new once a task has failed
+                        continue
+
+                    for dependent_index in self._dependents.get(node_index, []):
+                        dependent_future = executor.submit(
+                            process_node, dependent_index
+                        )
+                        running[dependent_future] = dependent_index
+
+        if first_error:
+            raise first_error
+
+        return results
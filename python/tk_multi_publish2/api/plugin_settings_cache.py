@@ -0,0 +1,158 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import hashlib
+import json
+import os
+import shutil
+
+import sgtk
+
+logger = sgtk.platform.get_logger(__name__)
+
+
+class PluginSettingsCache(object):
+    """
+    An on-disk cache of the publish plugin definitions configured for a
+    context, shared across publisher sessions.
+
+    Entries are keyed on the context, the environment picked for it and a
+    fingerprint of the pipeline configuration's files, so editing the
+    configuration invalidates the cached definitions. The fingerprint is
+    computed again for each lookup, so a long running session picks up the
+    configuration changes too.
+    """
+
+    __slots__ = ["_cache_dir", "_config_dir", "_config_fingerprint", "_key_prefix"]
+
+    # bump this to invalidate all existing caches if the format changes
+    CACHE_VERSION = 1
+
+    def __init__(self, bundle):
+        """
+        Initialize the cache.
+
+        :param bundle: The publisher bundle the plugin definitions are cached
+            for.
+        """
+        self._cache_dir = os.path.join(
+            bundle.cache_location, "publish_plugin_definitions"
+        )
+        self._config_dir = bundle.sgtk.pipeline_configuration.get_config_location()
+
+        # the fingerprint computed by the last lookup, reused to cache the
+        # definitions found on a cache miss.
+        self._config_fingerprint = None
+        self._key_prefix = [
+            self.CACHE_VERSION,
+            bundle.engine.name,
+            bundle.engine.instance_name,
+            bundle.instance_name,
+        ]
+
+    def get(self, context, environment):
+        """
+        Returns the cached plugin definitions for the supplied context.
+
+        :param context: The :class:`sgtk.Context` to get the definitions for.
+        :param str environment: The name of the environment picked for the
+            context.
+        :returns: The list of plugin definitions, or ``None`` if they are not
+            cached.
+        """
+        self._config_fingerprint = None
+        cache_path = self._get_cache_path(context, environment)
+        if not os.path.exists(cache_path):
+            return None
+
+        try:
+            with open(cache_path, "r") as cache_file:
+                plugin_settings = json.load(cache_file)
+        except Exception as e:
+            logger.debug(
+                "Ignoring unreadable plugin definitions cache %s: %s" % (cache_path, e)
+            )
+            return None
+
+        logger.debug("Loaded cached publish plugin settings from %s" % (cache_path,))
+        return plugin_settings
+
+    def set(self, context, environment, plugin_settings):
+        """
+        Caches the plugin definitions for the supplied context.
+
+        :param context: The :class:`sgtk.Context` the definitions are for.
+        :param str environment: The name of the environment picked for the
+            context.
+        :param list plugin_settings: The plugin definitions to cache.
+        """
+        cache_path = self._get_cache_path(context, environment)
+        tmp_path = "%s.%s.tmp" % (cache_path, os.getpid())
+        try:
+            sgtk.util.filesystem.ensure_folder_exists(self._cache_dir)
+            with open(tmp_path, "w") as cache_file:
+                json.dump(plugin_settings, cache_file)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            # caching is an optimization, it should never prevent publishing
+            logger.debug(
+                "Unable to cache publish plugin settings to %s: %s" % (cache_path, e)
+            )
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def clear(self):
+        """Removes all the cached plugin definitions."""
+        self._config_fingerprint = None
+        if os.path.exists(self._cache_dir):
+            shutil.rmtree(self._cache_dir, ignore_errors=True)
+
+    ############################################################################
+    # protected methods
+
+    def _get_cache_path(self, context, environment):
+        """
+        Returns the path to the cache file for the supplied context.
+
+        :param context: A :class:`sgtk.Context`.
+        :param str environment: The name of the environment picked for the
+            context.
+        """
+        key = json.dumps(
+            self._key_prefix
+            + [environment, self._get_config_fingerprint(), context.to_dict()],
+            sort_keys=True,
+            default=str,
+        )
+        key_hash = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self._cache_dir, "%s.json" % (key_hash,))
+
+    def _get_config_fingerprint(self):
+        """
+        Returns a fingerprint of the files of the current pipeline
+        configuration, based on their path, size and modification time.
+
+        All the files of the configuration are fingerprinted, since the plugin
+        definitions can come from includes outside of its ``env`` folder, and
+        depend on its core templates and hooks. Hidden folders, like version
+        control folders, are skipped.
+        """
+        if self._config_fingerprint is None:
+            files = []
+            for root, dir_names, file_names in os.walk(self._config_dir):
+                dir_names[:] = [name for name in dir_names if not name.startswith(".")]
+                for file_name in file_names:
+                    path = os.path.join(root, file_name)
+                    stat = os.stat(path)
+                    files.append((path, stat.st_size, stat.st_mtime_ns))
+            self._config_fingerprint = hashlib.sha1(
+                json.dumps(sorted(files)).encode("utf-8")
+            ).hexdigest()
+        return self._config_fingerprint
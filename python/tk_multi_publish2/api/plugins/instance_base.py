@@ -8,6 +8,8 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
+import threading
+
 import sgtk
 from .setting import PluginSetting
 
@@ -42,13 +44,33 @@ class PluginInstanceBase(object):
         self._path = path
         self._configured_settings = settings
 
-        self._settings = {}
+        # the hook instance and the resolved settings are only created once
+        # needed, since many configured plugins are never used in a session.
+        # see _hook_instance and _get_settings.
+        self._hook = None
+        self._settings = None
+        self._lazy_init_lock = threading.RLock()
 
-        # create an instance of the hook
-        self._hook_instance = self._create_hook_instance(self._path)
+    @property
+    def _hook_instance(self):
+        """
+        The plugin's hook instance, created on first access.
+        """
+        if self._hook is None:
+            with self._lazy_init_lock:
+                if self._hook is None:
+                    self._hook = self._create_hook_instance(self._path)
+        return self._hook
 
-        # kick things off
-        self._validate_and_resolve_config()
+    def _get_settings(self):
+        """
+        Returns the plugin's resolved settings, resolving them on first access.
+        """
+        if self._settings is None:
+            with self._lazy_init_lock:
+                if self._settings is None:
+                    self._settings = self._validate_and_resolve_config()
+        return self._settings
 
     def _create_hook_instance(self, path):
         """
@@ -69,11 +91,13 @@ class PluginInstanceBase(object):
 
     def _validate_and_resolve_config(self):
         """
-        Init helper method.
-
         Validates plugin settings and creates PluginSetting objects
         that can be accessed from the settings property.
+
+        :returns: A dictionary of setting name to PluginSetting instance.
         """
+        settings = {}
+
         try:
             hook_settings_schema = self._hook_instance.settings
         except AttributeError:
@@ -109,7 +133,9 @@ class PluginInstanceBase(object):
             )
             setting.value = value
 
-            self._settings[setting_name] = setting
+            settings[setting_name] = setting
+
+        return settings
 
     @property
     def configured_settings(self):
@@ -141,4 +167,4 @@ class PluginInstanceBase(object):
         """
         A dict of resolved raw settings given the current state
         """
-        return self._settings
+        return self._get_settings()
@@ -8,6 +8,11 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
+import contextvars
+import fnmatch
+import os
+import re
+import threading
 import traceback
 from contextlib import contextmanager
 from inspect import getfullargspec
@@ -18,6 +23,11 @@ from .instance_base import PluginInstanceBase
 
 logger = sgtk.platform.get_logger(__name__)
 
+# the id of the publish plugin whose hook is currently executing. This is used
+# to look up the local properties of items without inspecting the call stack.
+# see PublishItem._get_local_properties
+executing_plugin_id = contextvars.ContextVar("executing_plugin_id", default=None)
+
 
 class PublishPluginInstance(PluginInstanceBase):
     """
@@ -38,6 +48,12 @@ class PublishPluginInstance(PluginInstanceBase):
 
         self._icon_pixmap = None
 
+        # the item filters compiled into a single regular expression and a
+        # lookup of type spec to whether it matches the filters.
+        # see item_type_matches
+        self._item_filters_regex = None
+        self._item_type_matches = {}
+
         super().__init__(path, settings, publish_logger)
 
     def _create_hook_instance(self, path):
@@ -118,6 +134,43 @@ class PublishPluginInstance(PluginInstanceBase):
         except AttributeError:
             return []
 
+    def item_type_matches(self, type_spec):
+        """
+        Returns ``True`` if the supplied item type specification matches the
+        item filters defined by this plugin, ``False`` otherwise.
+
+        Filters are compiled into a single regular expression the first time
+        this method is called and the result is remembered for each type
+        specification, so the filters of a plugin are expected not to change
+        during the lifetime of the plugin instance.
+
+        :param str type_spec: The item type specification to test.
+        """
+
+        try:
+            return self._item_type_matches[type_spec]
+        except KeyError:
+            pass
+
+        if self._item_filters_regex is None:
+            # filters are compared the same way fnmatch.fnmatch does
+            patterns = [
+                fnmatch.translate(os.path.normcase(item_filter))
+                for item_filter in self.item_filters
+            ]
+            # an empty pattern would match everything
+            self._item_filters_regex = (
+                re.compile("|".join(patterns)) if patterns else False
+            )
+
+        matches = bool(
+            self._item_filters_regex
+            and self._item_filters_regex.match(os.path.normcase(type_spec))
+        )
+        self._item_type_matches[type_spec] = matches
+
+        return matches
+
     @property
     def has_custom_ui(self):
         """
@@ -136,7 +189,7 @@ class PublishPluginInstance(PluginInstanceBase):
         """
         returns a dict of resolved raw settings given the current state
         """
-        return self._settings
+        return self._get_settings()
 
     def run_accept(self, item):
         """
@@ -147,7 +200,53 @@ class PublishPluginInstance(PluginInstanceBase):
         """
 
         try:
-            return self._hook_instance.accept(self.settings, item)
+            return self._accept(item)
+        finally:
+            _process_ui_events()
+
+    def run_accept_batch(self, items):
+        """
+        Executes the hook accept_batch method for the given items.
+
+        If the hook raises, or does not return one result per item, the items
+        are accepted one at a time instead.
+
+        :param list items: Items to analyze
+        :returns: A list of dictionaries with boolean keys
+            accepted/visible/enabled/checked, one per item.
+        """
+
+        try:
+            with self._executing_hook():
+                accept_results = self._hook_instance.accept_batch(self.settings, items)
+                accept_results = list(accept_results)
+            if len(accept_results) != len(items):
+                raise ValueError(
+                    "Expected %s results from accept_batch, got %s."
+                    % (len(items), len(accept_results))
+                )
+            return accept_results
+        except Exception:
+            error_msg = traceback.format_exc()
+            self._logger.debug(
+                "Error running accept_batch for %s, accepting items one at a "
+                "time: %s" % (self, error_msg)
+            )
+            return [self._accept(item) for item in items]
+        finally:
+            # a single event pump for the whole batch
+            _process_ui_events()
+
+    def _accept(self, item):
+        """
+        Executes the hook accept method for the given item, logging any error.
+
+        :param item: Item to analyze
+        :returns: dictionary with boolean keys accepted/visible/enabled/checked
+        """
+        try:
+            with self._executing_hook():
+                return self._hook_instance.accept(self.settings, item)
         except Exception:
             error_msg = traceback.format_exc()
             self._logger.error(
@@ -155,11 +254,6 @@ class PublishPluginInstance(PluginInstanceBase):
                 extra=_get_error_extra_info(error_msg),
             )
             return {"accepted": False}
-        finally:
-            if sgtk.platform.current_engine().has_ui:
-                from sgtk.platform.qt import QtCore
-
-                QtCore.QCoreApplication.processEvents()
 
     def run_validate(self, settings, item):
         """
@@ -173,6 +267,60 @@ class PublishPluginInstance(PluginInstanceBase):
         with self._handle_plugin_error(None, "Error Validating: %s"):
             status = self._hook_instance.validate(settings, item)
 
+        return self._check_validation_status(status, item)
+
+    def run_validate_batch(self, settings, items):
+        """
+        Executes the validation logic for this plugin instance on several items
+        at once.
+
+        :param settings: Dictionary of settings
+        :param list items: Items to analyze
+        :return: A list of tuples of (bool, optional :class:`Exception`), one
+            per item, indicating if the item is valid and the error raised while
+            validating it, if any.
+        """
+
+        try:
+            with self._handle_plugin_error(None, "Error Validating: %s"):
+                statuses = list(self._hook_instance.validate_batch(settings, items))
+                if len(statuses) != len(items):
+                    raise ValueError(
+                        "Expected %s results from validate_batch, got %s."
+                        % (len(items), len(statuses))
+                    )
+        except Exception as e:
+            # the whole batch failed to validate
+            return [(False, e) for _ in items]
+
+        results = []
+        for item, status in zip(items, statuses):
+            error = None
+            if isinstance(status, Exception):
+                error = status
+                status = False
+                exception_msg = "".join(
+                    traceback.format_exception(type(error), error, error.__traceback__)
+                )
+                self._logger.error(
+                    "Error Validating: %s" % (error,),
+                    extra=_get_error_extra_info(exception_msg),
+                )
+
+            results.append((self._check_validation_status(status, item), error))
+
+        return results
+
+    def _check_validation_status(self, status, item):
+        """
+        Checks and logs the validation status returned by the plugin for an
+        item.
+
+        :param bool status: The status returned by the plugin.
+        :param item: The validated item.
+        :return: True if validation passed, False otherwise.
+        """
+
         # check that we are not trying to publish to a site level context
         if item.context.project is None:
             status = False
@@ -287,6 +435,19 @@ class PublishPluginInstance(PluginInstanceBase):
                 # might not implement, so fallback to passing just the parent and settings.
                 self._hook_instance.set_ui_settings(parent, settings)
 
+    @contextmanager
+    def _executing_hook(self):
+        """
+        Creates a scope in which this plugin is known to be the executing
+        plugin, so items can look up its local properties.
+        """
+        # the hook's id is its path. see _create_hook_instance
+        token = executing_plugin_id.set(self._path)
+        try:
+            yield
+        finally:
+            executing_plugin_id.reset(token)
+
     @contextmanager
     def _handle_plugin_error(self, success_msg, error_msg):
         """
@@ -303,7 +464,8 @@ class PublishPluginInstance(PluginInstanceBase):
         try:
             # Execute's the code inside the with statement. Any errors will be
             # caught and logged and the events will be processed
-            yield
+            with self._executing_hook():
+                yield
         except Exception as e:
             exception_msg = traceback.format_exc()
             self._logger.error(
@@ -314,11 +476,8 @@ class PublishPluginInstance(PluginInstanceBase):
             if success_msg:
                 self._logger.debug(success_msg)
         finally:
-            if sgtk.platform.current_engine().has_ui:
-                # If we have a UI process the events so that the UI can update mid operation.
-                from sgtk.platform.qt import QtCore
-
-                QtCore.QCoreApplication.processEvents()
+            # If we have a UI process the events so that the UI can update mid operation.
+            _process_ui_events()
 
     def _load_plugin_icon(self):
         """
@@ -352,6 +511,25 @@ class PublishPluginInstance(PluginInstanceBase):
         return pixmap
 
 
+def _process_ui_events():
+    """
+    Process pending Qt events so that the UI can update mid operation.
+
+    This is a no-op when running without a UI or when called from a thread
+    other than the main thread, which is the case when tasks are processed
+    concurrently by the publish manager.
+    """
+    if not sgtk.platform.current_engine().has_ui:
+        return
+
+    if threading.current_thread() is not threading.main_thread():
+        return
+
+    from sgtk.platform.qt import QtCore
+
+    QtCore.QCoreApplication.processEvents()
+
+
 def _get_error_extra_info(error_msg):
     """
     A little wrapper to return a dictionary of data to show a button in the
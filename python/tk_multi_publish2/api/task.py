@@ -9,12 +9,18 @@
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
 import copy
+import json
+import threading
+import uuid
 
 import sgtk
 from .plugins import PluginSetting, PublishPluginInstance
 
 logger = sgtk.platform.get_logger(__name__)
 
+# guards the creation of task ids. see PublishTask.id
+_id_lock = threading.Lock()
+
 
 class PublishTask(object):
     """
@@ -36,10 +42,13 @@ class PublishTask(object):
         "_active",
         "_visible",
         "_enabled",
+        "_id",
     ]
 
     @classmethod
-    def from_dict(cls, task_dict, serialization_version, item=None):
+    def from_dict(
+        cls, task_dict, serialization_version, item=None, plugin_registry=None
+    ):
         """
         Returns an instance of a PublishTask from serialized data.
 
@@ -47,14 +56,34 @@ class PublishTask(object):
         :param int serialization_version: The version of serialization logic used to
             serialize this data.
         :param item: Optional item to associate with this task
-        """
-
-        # create the plugin instance
-        plugin = PublishPluginInstance(
-            task_dict["plugin_name"],
-            task_dict["plugin_path"],
-            task_dict["plugin_settings"],
-        )
+        :param dict plugin_registry: An optional registry of plugin instances,
+            keyed by plugin name, hook path and configured settings. Tasks
+            deserialized with the same registry share their plugin instance
+            when the plugin is configured the same way, rather than each
+            loading the plugin's hook.
+        """
+
+        # create the plugin instance, or reuse the matching one.
+        if plugin_registry is None:
+            plugin = PublishPluginInstance(
+                task_dict["plugin_name"],
+                task_dict["plugin_path"],
+                task_dict["plugin_settings"],
+            )
+        else:
+            plugin_key = (
+                task_dict["plugin_name"],
+                task_dict["plugin_path"],
+                json.dumps(task_dict["plugin_settings"], sort_keys=True, default=str),
+            )
+            plugin = plugin_registry.get(plugin_key)
+            if plugin is None:
+                plugin = PublishPluginInstance(
+                    task_dict["plugin_name"],
+                    task_dict["plugin_path"],
+                    task_dict["plugin_settings"],
+                )
+                plugin_registry[plugin_key] = plugin
 
         # create the instance and assign all the internal members
         new_task = PublishTask(plugin, item)
@@ -63,6 +92,7 @@ class PublishTask(object):
         new_task._active = task_dict["active"]
         new_task._visible = task_dict["visible"]
         new_task._enabled = task_dict["enabled"]
+        new_task._id = task_dict.get("id")
 
         # create all the setting instances from the data
         for k, setting in task_dict["settings"].items():
@@ -95,6 +125,7 @@ class PublishTask(object):
         self._active = checked
         self._visible = visible
         self._enabled = enabled
+        self._id = None  # see id
 
         logger.debug("Created publish tree task: %s" % (self,))
 
@@ -120,6 +151,7 @@ class PublishTask(object):
             "active": self._active,
             "visible": self._visible,
             "enabled": self._enabled,
+            "id": self.id,
         }
 
     def __repr__(self):
@@ -255,6 +287,17 @@ class PublishTask(object):
         """The :ref:`publish-api-item` this task is associated with"""
         return self._item
 
+    @property
+    def id(self):
+        """
+        A unique identifier of the task, preserved when the tree is serialized.
+        """
+        if self._id is None:
+            with _id_lock:
+                if self._id is None:
+                    self._id = uuid.uuid4().hex
+        return self._id
+
     @property
     def name(self):
         """The display name of the task."""
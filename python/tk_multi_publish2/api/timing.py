@@ -0,0 +1,160 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import threading
+import time
+from contextlib import contextmanager
+
+import sgtk
+
+logger = sgtk.platform.get_logger(__name__)
+
+
+class TimingRecorder(object):
+    """
+    Records the wall and CPU time spent in each call made by the publish
+    manager to the collector and publish plugins, grouped by phase.
+
+    CPU time is measured with :func:`time.thread_time`, so it only accounts for
+    the thread making the call. This makes it meaningful when tasks are
+    processed concurrently on worker threads.
+    """
+
+    __slots__ = ["_lock", "_phases"]
+
+    def __init__(self):
+        """Initialize the recorder."""
+        self._lock = threading.Lock()
+
+        # a dictionary of phase name to (start time, end time, list of records).
+        # the end time is None while the phase is running.
+        self._phases = {}
+
+    @contextmanager
+    def phase(self, phase):
+        """
+        A context manager recording a phase, discarding what was recorded for
+        a previous run of the same phase. A summary of the time spent in the
+        phase is logged once it completes.
+
+        :param str phase: The name of the phase.
+        """
+        with self._lock:
+            self._phases[phase] = (time.perf_counter(), None, [])
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                start_time, _, records = self._phases[phase]
+                self._phases[phase] = (start_time, time.perf_counter(), records)
+
+            report = self.get_report(phase)
+            logger.debug(
+                "Publish phase '%s' took %.3fs, including %.3fs in %s plugin "
+                "calls."
+                % (
+                    phase,
+                    report["wall_time"],
+                    report["plugin_wall_time"],
+                    len(report["records"]),
+                )
+            )
+
+    @contextmanager
+    def measure(self, phase, method, plugin, item=None, items=None, cpu=True):
+        """
+        A context manager measuring a call to a collector or publish plugin.
+
+        The context manager returns the record of the call, whose ``outcome``
+        can be set by the caller. It defaults to ``"success"``, or ``"error"``
+        if an exception is raised.
+
+        :param str phase: The name of the phase the call is made in.
+        :param str method: The name of the plugin method called.
+        :param plugin: The plugin instance called.
+        :param item: The :ref:`publish-api-item` the call is made for, if any.
+        :param list items: The items the call is made for, when the plugin
+            processes several items at once.
+        :param bool cpu: If ``False``, the CPU time isn't measured and is
+            reported as ``None``. This is used when the call is made in another
+            process, since the calling thread is then idle.
+        """
+        record = {
+            "method": method,
+            "plugin": getattr(plugin, "name", None),
+            "plugin_path": plugin.path,
+            "item": item.name if item is not None else None,
+            "item_id": item.id if item is not None else None,
+            "item_type": item.type_spec if item is not None else None,
+            "item_count": len(items) if items is not None else int(item is not None),
+            "outcome": "success",
+        }
+
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield record
+        except Exception:
+            record["outcome"] = "error"
+            raise
+        finally:
+            record["wall_time"] = time.perf_counter() - wall_start
+            record["cpu_time"] = (time.thread_time() - cpu_start) if cpu else None
+            with self._lock:
+                if phase not in self._phases:
+                    self._phases[phase] = (wall_start, None, [])
+                self._phases[phase][2].append(record)
+
+    def get_report(self, phase=None):
+        """
+        Returns a report of the recorded calls.
+
+        :param str phase: The name of the phase to report on. If not supplied,
+            the returned dictionary holds the report of each recorded phase,
+            keyed by phase name.
+        :returns: A json serializable dictionary. See
+            :meth:`PublishManager.get_timing_report`.
+        """
+        if phase is None:
+            with self._lock:
+                phases = list(self._phases)
+            return dict((name, self.get_report(name)) for name in phases)
+
+        with self._lock:
+            start_time, end_time, records = self._phases.get(phase, (0, 0, []))
+            records = [dict(record) for record in records]
+
+        by_plugin = {}
+        for record in records:
+            plugin_report = by_plugin.setdefault(
+                record["plugin_path"],
+                {
+                    "plugin": record["plugin"],
+                    "calls": 0,
+                    "wall_time": 0.0,
+                    "cpu_time": 0.0,
+                    "outcomes": {},
+                },
+            )
+            plugin_report["calls"] += 1
+            plugin_report["wall_time"] += record["wall_time"]
+            plugin_report["cpu_time"] += record["cpu_time"] or 0.0
+            outcomes = plugin_report["outcomes"]
+            outcomes[record["outcome"]] = outcomes.get(record["outcome"], 0) + 1
+
+        return {
+            "phase": phase,
+            "wall_time": (end_time or time.perf_counter()) - start_time,
+            "plugin_wall_time": sum(record["wall_time"] for record in records),
+            "plugin_cpu_time": sum(record["cpu_time"] or 0.0 for record in records),
+            "plugins": by_plugin,
+            "records": records,
+        }
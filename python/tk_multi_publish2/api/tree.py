@@ -8,7 +8,15 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
+import copy
+import fnmatch
+import functools
+import gzip
+import io
+import itertools
+import re
 import traceback
+from contextlib import contextmanager
 
 import datetime
 import json
@@ -89,18 +97,78 @@ class PublishTree(object):
     :meth:`~load_file` methods.
     """
 
-    __slots__ = ["_root_item"]
+    __slots__ = [
+        "_root_item",
+        "_created_items",
+        "_publish_batch",
+        "_snapshot",
+        "_items_by_type",
+        "_items_by_context",
+        "_items_by_collected_path",
+        "_lazy_items",
+    ]
 
     # define a serialization version to allow backward compatibility if the
     # serialization method changes
     SERIALIZATION_VERSION = 1
 
+    # the version of the compact, line based, serialization format. see
+    # _save_compact.
+    COMPACT_SERIALIZATION_VERSION = 2
+
+    # the fields of the items and tasks written by the compact format, in
+    # order, and the ones whose values are interned.
+    _COMPACT_ITEM_FIELDS = [
+        "active",
+        "allows_context_change",
+        "context",
+        "description",
+        "enabled",
+        "expanded",
+        "global_properties",
+        "icon_path",
+        "id",
+        "local_properties",
+        "name",
+        "persistent",
+        "tasks",
+        "thumbnail_enabled",
+        "thumbnail_explicit",
+        "thumbnail_path",
+        "type_display",
+        "type_spec",
+    ]
+    _COMPACT_TASK_FIELDS = [
+        "plugin",
+        "name",
+        "description",
+        "settings",
+        "active",
+        "visible",
+        "enabled",
+        "id",
+    ]
+    _COMPACT_INTERNED_ITEM_FIELDS = frozenset(
+        ["context", "icon_path", "type_display", "type_spec"]
+    )
+    _COMPACT_INTERNED_TASK_FIELDS = frozenset(
+        ["plugin", "name", "description", "settings"]
+    )
+
+    # the property storing the file path an item was collected for. see
+    # PublishManager.collect_files.
+    PROPERTY_KEY_COLLECTED_FILE_PATH = "__collected_file_path__"
+
     @classmethod
-    def from_dict(cls, tree_dict):
+    def from_dict(cls, tree_dict, lazy=False):
         """
         Create a publish tree instance given the supplied dictionary. The
         supplied dictionary is typically the result of calling ``to_dict`` on
         a publish tree instance during serialization.
+
+        :param dict tree_dict: The dictionary representation of the tree.
+        :param bool lazy: If ``True``, the children, context and tasks of each
+            item are only created when first accessed. See :meth:`~load_file`.
         """
         # This check is valid until we need to alter the way serialization is
         # handled after initial release. Once that happens, this should be
@@ -117,26 +185,61 @@ class PublishTree(object):
                 "TD/developer/admin." % serialization_version
             )
 
+        # tasks driven by the same plugin, with the same configuration, share
+        # a single plugin instance.
+        plugin_registry = {}
+
+        # items with equal contexts share a single context instance
+        context_cache = {}
+
         new_tree = cls()
-        new_tree._root_item = PublishItem.from_dict(
-            tree_dict["root_item"], serialization_version
+        new_tree._set_root_item(
+            PublishItem.from_dict(
+                tree_dict["root_item"],
+                serialization_version,
+                plugin_registry=plugin_registry,
+                context_cache=context_cache,
+                lazy=lazy,
+            )
         )
+        new_tree._lazy_items = lazy
 
         return new_tree
 
     @staticmethod
-    def load_file(file_path):
+    def load_file(file_path, lazy=False):
         """
         This method returns a new :class:`~.PublishTree` instance by reading
         a serialized tree file from disk._sgtk_custom_type
 
+        When loading lazily, the items of the tree are only fully created when
+        they are first accessed: the children, the context and the tasks of an
+        item are created the first time they are used. This makes loading a
+        large tree to only process some of its items much faster, especially
+        for trees saved in the compact format, where the descendants of
+        a top-level item aren't even parsed until its children are accessed.
+
+        .. code-block:: python
+
+            tree = PublishTree.load_file(path, lazy=True)
+            for item in tree.root_item.children:
+                if item.name == item_to_publish:
+                    # only this item's tasks are created
+                    ...
+
         :param str file_path: The path to a serialized publish tree.
+        :param bool lazy: If ``True``, the items are created lazily. Default is
+            ``False``.
         :return: A :class:`~.PublishTree` instance
         """
 
         with open(file_path, "rb") as tree_file_obj:
             try:
-                return PublishTree.load(tree_file_obj)
+                # trees saved with compression are transparently decompressed
+                if tree_file_obj.peek(2)[:2] == b"\x1f\x8b":
+                    with gzip.GzipFile(fileobj=tree_file_obj) as gzip_file_obj:
+                        return PublishTree.load(gzip_file_obj, lazy=lazy)
+                return PublishTree.load(tree_file_obj, lazy=lazy)
             except Exception as e:
                 logger.error(
                     "Error trying to load publish tree from file '%s': %s"
@@ -145,19 +248,43 @@ class PublishTree(object):
                 raise
 
     @staticmethod
-    def load(file_obj):
+    def load(file_obj, lazy=False):
         """
         Load a publish tree from a supplied file-like object.
 
+        Both the default and the compact serialization formats are supported.
+
         :param file file_obj: A file-like object
+        :param bool lazy: If ``True``, the items are created lazily. See
+            :meth:`~load_file`.
         :return: A :class:`~.PublishTree` instance
         """
 
         try:
+            # the compact format starts with a header on its own line, which
+            # holds the serialization version. the default format is a single
+            # json document.
+            first_line = file_obj.readline()
+            try:
+                header = json.loads(first_line)
+            except ValueError:
+                header = None
+
+            if (
+                isinstance(header, dict)
+                and header.get("serialization_version")
+                == PublishTree.COMPACT_SERIALIZATION_VERSION
+            ):
+                return PublishTree._load_compact(header, file_obj, lazy=lazy)
+
             # Pass in a object hook so that certain Toolkit objects are restored back
             # from their serialized representation.
             return PublishTree.from_dict(
-                sgtk.util.json.load(file_obj, object_hook=_json_to_objects)
+                sgtk.util.json.loads(
+                    first_line + file_obj.read(),
+                    object_hook=functools.partial(_json_to_objects, templates={}),
+                ),
+                lazy=lazy,
             )
         except Exception as e:
             logger.error(
@@ -168,18 +295,48 @@ class PublishTree(object):
     def __init__(self):
         """Initialize the publish tree instance."""
 
+        # When recording, this is the list of items created in the tree. See
+        # _record_created_items.
+        self._created_items = None
+
+        # The batch publishes are queued on during a batched publish. See
+        # PublishManager.publish.
+        self._publish_batch = None
+
+        # The cached result of snapshot, cleared whenever items are created or
+        # removed.
+        self._snapshot = None
+
+        # Lookups of type spec, explicitly set context and collected file path
+        # to the items in the tree. Each lookup maps to a dictionary of items,
+        # used as an insertion ordered set. See _index_item.
+        self._items_by_type = {}
+        self._items_by_context = {}
+        self._items_by_collected_path = {}
+
+        # Whether the children or context of some items of the tree may not be
+        # loaded yet. See load_file.
+        self._lazy_items = False
+
         # The root item is the sole parent of all top level publish items. It
         # has no use other than organization and provides an easy interface for
         # beginning iteration and accessing all top level items.
-        self._root_item = PublishItem("__root__", "__root__", "__root__", parent=None)
+        self._set_root_item(
+            PublishItem("__root__", "__root__", "__root__", parent=None)
+        )
+
+    def __contains__(self, item):
+        """
+        Returns ``True`` if the supplied item is part of the tree, ``False``
+        otherwise.
+        """
+        return isinstance(item, PublishItem) and item._tree is self
 
     def __iter__(self):
         """Iterates over the tree, depth first."""
 
-        # item's are recursively iterable. this will yield all items under the
-        # root.
-        for item in self._root_item.descendants:
-            yield item
+        # this will yield all items under the root.
+        return self._root_item._visit_items()
 
     def clear(self, clear_persistent=False):
         """
@@ -233,6 +390,104 @@ class PublishTree(object):
 
         print(self.pformat())
 
+    def snapshot(self):
+        """
+        Returns all the items in the tree, in the order they are iterated over.
+
+        Unlike iterating over the tree, the items are gathered once and the same
+        tuple is returned until items are created in or removed from the tree.
+        This makes repeated passes over a large tree, within a publish phase
+        for example, cheap:
+
+        .. code-block:: python
+
+            items = publish_tree.snapshot()
+            images = [item for item in items if item.type_spec == "file.image"]
+            movies = [item for item in items if item.type_spec == "file.movie"]
+
+        :returns: A tuple of :ref:`publish-api-item` instances.
+        """
+        if self._snapshot is None:
+            self._snapshot = tuple(self._root_item._visit_items())
+        return self._snapshot
+
+    def items_by_type(self, type_spec):
+        """
+        Returns the items in the tree with a matching type spec.
+
+        The supplied type spec can use the same wildcards as the item filters
+        of publish plugins:
+
+        .. code-block:: python
+
+            images = publish_tree.items_by_type("file.image*")
+
+        The lookup doesn't iterate over the tree, so it is cheap even for large
+        trees.
+
+        :param str type_spec: The type spec, or type spec pattern, to match.
+        :returns: A list of :ref:`publish-api-item` instances, grouped by type
+            spec in the order the items were added to the tree.
+        """
+        self._load_lazy_items()
+        if type_spec in self._items_by_type:
+            return list(self._items_by_type[type_spec])
+
+        items = []
+        for matching_type_spec in fnmatch.filter(self._items_by_type, type_spec):
+            items.extend(self._items_by_type[matching_type_spec])
+        return items
+
+    def items_for_context(self, context):
+        """
+        Returns the items in the tree whose :py:attr:`~.api.PublishItem.context`
+        is the supplied context, whether it was set explicitly or inherited.
+
+        Only the branches of the tree inheriting the supplied context are
+        visited.
+
+        :param context: A :class:`sgtk.Context`.
+        :returns: A list of :ref:`publish-api-item` instances.
+        """
+        self._load_lazy_items()
+        sources = list(self._items_by_context.get(context, []))
+
+        # items with no explicit context in their hierarchy fall back to the
+        # launch context
+        if not self._root_item._context and (
+            context == sgtk.platform.current_bundle().context
+        ):
+            sources.append(self._root_item)
+
+        items = []
+        for source in sources:
+            if source is not self._root_item:
+                items.append(source)
+            stack = [source]
+            while stack:
+                for child in stack.pop()._children:
+                    # children with their own context don't inherit this one
+                    if not child._context:
+                        items.append(child)
+                        stack.append(child)
+        return items
+
+    def items_for_collected_path(self, file_path):
+        """
+        Returns the items in the tree collected for the supplied file path by
+        :meth:`~.api.PublishManager.collect_files`.
+
+        :param str file_path: The collected file path.
+        :returns: A list of :ref:`publish-api-item` instances.
+        """
+        self._load_lazy_items()
+        return [
+            item
+            for item in self._items_by_collected_path.get(file_path, [])
+            if item._tree is self
+            and item.properties.get(self.PROPERTY_KEY_COLLECTED_FILE_PATH) == file_path
+        ]
+
     def remove_item(self, item):
         """
         Remove the supplied item from the tree.
@@ -247,23 +502,53 @@ class PublishTree(object):
         # all other items should have a parent
         item.parent.remove_item(item)
 
-    def save_file(self, file_path):
+    def save_file(self, file_path, compact=False, compress=False):
         """
         Save the serialized tree instance to disk at the supplied path.
+
+        :param str file_path: The path to save the tree to.
+        :param bool compact: If ``True``, the tree is saved in the compact
+            format. See :meth:`~save`.
+        :param bool compress: If ``True``, the file is compressed with gzip.
+            Compressed files are decompressed transparently by
+            :meth:`~load_file`.
         """
 
-        with open(file_path, "w") as file_obj:
+        with open(file_path, "wb") as tree_file_obj:
             try:
-                self.save(file_obj)
+                if compress:
+                    tree_file_obj = gzip.GzipFile(fileobj=tree_file_obj, mode="wb")
+                with io.TextIOWrapper(tree_file_obj, encoding="utf-8") as file_obj:
+                    self.save(file_obj, compact=compact)
             except Exception as e:
                 logger.error("Error saving the publish tree to disk: %s" % (e,))
                 raise
 
-    def save(self, file_obj):
+    def save(self, file_obj, compact=False):
         """
         Writes a json-serialized representation of the publish tree to the
         supplied file-like object.
+
+        The compact format is meant for large trees. Rather than a single,
+        indented, json document, it writes one line per item, so the tree is
+        never held in memory as a whole while saving or loading. Values
+        repeated across items, such as type specs, contexts and task settings,
+        are written only once.
+
+        :param file_obj: A file-like object opened in text mode.
+        :param bool compact: If ``True``, the tree is written in the compact
+            format. Default is ``False``.
         """
+        if compact:
+            try:
+                self._save_compact(file_obj)
+            except Exception as e:
+                logger.error(
+                    "Error saving publish tree: %s\n%s" % (e, traceback.format_exc())
+                )
+                raise
+            return
+
         try:
             json.dump(
                 self,
@@ -298,6 +583,14 @@ class PublishTree(object):
             if item.persistent:
                 yield item
 
+    @property
+    def publish_batch(self):
+        """
+        The :class:`~.PublishBatch` publish registrations are queued on during
+        a batched publish, ``None`` otherwise.
+        """
+        return self._publish_batch
+
     @property
     def root_item(self):
         """Returns the root item of this tree."""
@@ -306,6 +599,423 @@ class PublishTree(object):
     ############################################################################
     # protected methods
 
+    @contextmanager
+    def _record_created_items(self):
+        """
+        Creates a scope in which all the items created in the tree are recorded.
+
+        The context manager returns a list which will contain, once the scope
+        exits, the items created within the scope that are still in the tree,
+        in creation order. This allows callers to know which items were created
+        by a collector without having to compare snapshots of the whole tree.
+        """
+
+        previous_created_items = self._created_items
+        created_items = []
+        self._created_items = created_items
+        try:
+            yield created_items
+        finally:
+            self._created_items = previous_created_items
+
+            # items may have been removed after being created
+            created_items[:] = [item for item in created_items if item in self]
+
+            # keep any outer recording scope up to date
+            if previous_created_items is not None:
+                previous_created_items.extend(created_items)
+
+    def _save_compact(self, file_obj):
+        """
+        Writes the tree to the supplied file-like object in the compact format.
+
+        The first line is a json header holding the serialization version, the
+        fields written for items and tasks and which of them are interned. Each
+        following line is a json
+        array, which is either:
+
+        - ``["value", value]``, appending a value to the interned values.
+          Interned fields hold the index of their value.
+        - ``["item", depth, fields]``, an item of the tree, in depth first
+          order. The root item has a depth of 0 and each item is the child of
+          the last item written with a lower depth.
+
+        :param file_obj: A file-like object opened in text mode.
+        """
+        encoder = _PublishTreeEncoder(separators=(",", ":"), ensure_ascii=False)
+        interned = {}
+
+        def write(record):
+            file_obj.write(encoder.encode(record))
+            file_obj.write("\n")
+
+        def intern(value):
+            # containers are compared through their json representation
+            if isinstance(value, (dict, list)):
+                key = (True, encoder.encode(value))
+            else:
+                key = (False, value)
+            try:
+                return interned[key]
+            except KeyError:
+                write(["value", value])
+                interned[key] = len(interned)
+                return interned[key]
+
+        write(
+            {
+                "serialization_version": self.COMPACT_SERIALIZATION_VERSION,
+                "item_fields": self._COMPACT_ITEM_FIELDS,
+                "task_fields": self._COMPACT_TASK_FIELDS,
+                "interned_item_fields": sorted(self._COMPACT_INTERNED_ITEM_FIELDS),
+                "interned_task_fields": sorted(self._COMPACT_INTERNED_TASK_FIELDS),
+            }
+        )
+
+        stack = [(self._root_item, 0)]
+        while stack:
+            item, depth = stack.pop()
+            item_dict = item.to_dict(include_children=False)
+            item_dict["tasks"] = [
+                [
+                    (
+                        intern(task_dict[field])
+                        if field in self._COMPACT_INTERNED_TASK_FIELDS
+                        else task_dict[field]
+                    )
+                    for field in self._COMPACT_TASK_FIELDS
+                ]
+                for task_dict in self._compact_task_dicts(item_dict["tasks"])
+            ]
+            write(
+                [
+                    "item",
+                    depth,
+                    [
+                        (
+                            intern(item_dict[field])
+                            if field in self._COMPACT_INTERNED_ITEM_FIELDS
+                            else item_dict[field]
+                        )
+                        for field in self._COMPACT_ITEM_FIELDS
+                    ],
+                ]
+            )
+            stack.extend((child, depth + 1) for child in reversed(item._children))
+
+    @staticmethod
+    def _compact_task_dicts(task_dicts):
+        """
+        Yields the supplied serialized tasks with their plugin name, path and
+        settings combined into a single ``plugin`` field, which is interned.
+
+        :param list task_dicts: Serialized tasks, as returned by
+            :meth:`PublishTask.to_dict`.
+        """
+        for task_dict in task_dicts:
+            task_dict["plugin"] = [
+                task_dict.pop("plugin_name"),
+                task_dict.pop("plugin_path"),
+                task_dict.pop("plugin_settings"),
+            ]
+            yield task_dict
+
+    @classmethod
+    def _load_compact(cls, header, file_obj, lazy=False):
+        """
+        Reads a tree written in the compact format, one line at a time.
+
+        :param dict header: The header of the serialized tree.
+        :param file_obj: The file-like object to read the items from,
+            positioned after the header.
+        :param bool lazy: If ``True``, the lines of the descendants of each
+            top-level item are only parsed when the item's children are first
+            accessed, and the items' contexts and tasks are only created when
+            first accessed.
+        :returns: A :class:`~.PublishTree` instance.
+        """
+        serialization_version = header["serialization_version"]
+        item_fields = header["item_fields"]
+        task_fields = header["task_fields"]
+        interned_item_fields = [
+            field in header["interned_item_fields"] for field in item_fields
+        ]
+        interned_task_fields = [
+            field in header["interned_task_fields"] for field in task_fields
+        ]
+
+        values = []
+        plugin_registry = {}
+        context_cache = {}
+        object_hook = functools.partial(_json_to_objects, templates={})
+
+        def create_item(item_values, parent):
+            item_dict = {
+                field: values[value] if interned else value
+                for (field, interned, value) in zip(
+                    item_fields, interned_item_fields, item_values
+                )
+            }
+            item_dict["children"] = []
+
+            tasks = []
+            for task_values in item_dict["tasks"]:
+                task_dict = {
+                    field: values[value] if interned else value
+                    for (field, interned, value) in zip(
+                        task_fields, interned_task_fields, task_values
+                    )
+                }
+                (
+                    task_dict["plugin_name"],
+                    task_dict["plugin_path"],
+                    task_dict["plugin_settings"],
+                ) = task_dict.pop("plugin")
+                # interned settings are shared between tasks, while the values
+                # of the deserialized settings must not be.
+                task_dict["settings"] = copy.deepcopy(task_dict["settings"])
+                tasks.append(task_dict)
+            item_dict["tasks"] = tasks
+
+            return PublishItem.from_dict(
+                item_dict,
+                serialization_version,
+                parent=parent,
+                plugin_registry=plugin_registry,
+                context_cache=context_cache,
+                lazy=lazy,
+            )
+
+        def create_items(lines, parents):
+            # parents holds the last item created at each depth, the supplied
+            # lines being the descendants of the last of them. returns the
+            # items created directly under it.
+            children = []
+            base_depth = len(parents)
+            for line in lines:
+                _, depth, item_values = json.loads(line, object_hook=object_hook)
+                del parents[depth:]
+                item = create_item(item_values, parents[-1] if parents else None)
+                if depth == base_depth:
+                    children.append(item)
+                else:
+                    parents[-1]._children.append(item)
+                parents.append(item)
+            return children
+
+        def read_item_lines():
+            # yields the item records as they are read, along with the index of
+            # their depth. the values they reference are read before them.
+            for line in file_obj:
+                if isinstance(line, bytes):
+                    line = line.decode("utf-8")
+                if not line.strip():
+                    continue
+
+                record_type, index = _decode_record_prefix(line)
+                if record_type == "value":
+                    values.append(json.loads(line, object_hook=object_hook)[1])
+                elif record_type == "item":
+                    yield line, index
+                else:
+                    raise sgtk.TankError(
+                        "Unrecognized publish tree record: %s" % (record_type,)
+                    )
+
+        top_level_items = []
+        if lazy:
+            root_lines = []
+            for line, index in read_item_lines():
+                # only the depth is decoded, the rest of the line is decoded
+                # when the item is created
+                depth = _record_decoder.raw_decode(line, index)[0]
+                if depth == 0:
+                    root_lines.append(line)
+                elif depth == 1:
+                    top_level_items.append((line, []))
+                else:
+                    # kept aside until the children of their top-level item
+                    # are accessed
+                    top_level_items[-1][1].append(line)
+            root_items = create_items(root_lines, [])
+        else:
+            # the items are created as their line is read
+            root_items = create_items((line for (line, _) in read_item_lines()), [])
+        if not root_items:
+            raise sgtk.TankError("The serialized publish tree has no root item.")
+        root_item = root_items[0]
+
+        # with lazy loading, the top-level items are created right away and
+        # their descendants when first accessed.
+        for line, descendant_lines in top_level_items:
+            (item,) = create_items([line], [root_item])
+            root_item._children.append(item)
+            item._defer_loading(
+                _children=functools.partial(
+                    create_items, descendant_lines, [root_item, item]
+                )
+            )
+
+        new_tree = cls()
+        new_tree._set_root_item(root_item)
+        new_tree._lazy_items = lazy
+        return new_tree
+
+    def _item_created(self, item):
+        """
+        Called when an item is created in the tree.
+
+        :param item: The newly created :ref:`publish-api-item`.
+        """
+        self._snapshot = None
+        self._index_item(item)
+        if self._created_items is not None:
+            self._created_items.append(item)
+
+    def _item_removed(self, item):
+        """
+        Called when an item is removed from the tree.
+
+        :param item: The :ref:`publish-api-item` that was removed. Its children
+            were removed along with it.
+        """
+        self._snapshot = None
+        item._tree = None
+        self._unindex_item(item)
+        # the deferred children are loaded outside of the tree
+        for descendant in item._visit_loaded_items():
+            descendant._tree = None
+            self._unindex_item(descendant)
+
+    def _item_loaded(self, item, name, value):
+        """
+        Called when a deferred attribute of a lazily loaded item of the tree is
+        loaded.
+
+        :param item: The :ref:`publish-api-item` that was loaded.
+        :param str name: The name of the loaded attribute.
+        :param value: The loaded value.
+        """
+        if name == "_children":
+            for child in value:
+                for loaded_item in itertools.chain(
+                    [child], child._visit_loaded_items()
+                ):
+                    loaded_item._tree = self
+                    self._index_item(loaded_item)
+        elif name == "_context" and value:
+            self._items_by_context.setdefault(value, {})[item] = None
+
+    def _load_lazy_items(self):
+        """
+        Loads the deferred children and contexts of all the items of a lazily
+        loaded tree, so the lookups of items are complete. The tasks are left
+        deferred.
+        """
+        if self._lazy_items:
+            self._root_item._load_deferred_attributes("_context")
+            for item in self._root_item._visit_items():
+                item._load_deferred_attributes("_context")
+            self._lazy_items = False
+
+    def _item_type_changed(self, item, old_type_spec):
+        """
+        Called when the type spec of an item of the tree changes.
+
+        :param item: The :ref:`publish-api-item` whose type spec changed.
+        :param str old_type_spec: The previous type spec of the item.
+        """
+        self._remove_from_index(self._items_by_type, old_type_spec, item)
+        if item is not self._root_item:
+            self._items_by_type.setdefault(item.type_spec, {})[item] = None
+
+    def _item_context_changed(self, item, old_context):
+        """
+        Called when the context of an item of the tree is set.
+
+        :param item: The :ref:`publish-api-item` whose context was set.
+        :param old_context: The context previously set on the item, if any.
+        """
+        if old_context:
+            self._remove_from_index(self._items_by_context, old_context, item)
+        if item._context:
+            self._items_by_context.setdefault(item._context, {})[item] = None
+
+    def _set_collected_file_path(self, item, file_path):
+        """
+        Records the file path an item of the tree was collected for.
+
+        :param item: The collected :ref:`publish-api-item`.
+        :param str file_path: The collected file path.
+        """
+        item.properties[self.PROPERTY_KEY_COLLECTED_FILE_PATH] = file_path
+        self._items_by_collected_path.setdefault(file_path, {})[item] = None
+
+    def _index_item(self, item):
+        """
+        Adds an item of the tree to the lookups.
+
+        :param item: The :ref:`publish-api-item` to add.
+        """
+        if item is not self._root_item:
+            self._items_by_type.setdefault(item.type_spec, {})[item] = None
+        context = item._get_loaded_attribute("_context")
+        if context:
+            self._items_by_context.setdefault(context, {})[item] = None
+        file_path = item.properties.get(self.PROPERTY_KEY_COLLECTED_FILE_PATH)
+        if file_path:
+            self._items_by_collected_path.setdefault(file_path, {})[item] = None
+
+    def _unindex_item(self, item):
+        """
+        Removes an item, no longer in the tree, from the lookups.
+
+        :param item: The :ref:`publish-api-item` to remove.
+        """
+        self._remove_from_index(self._items_by_type, item.type_spec, item)
+        context = item._get_loaded_attribute("_context")
+        if context:
+            self._remove_from_index(self._items_by_context, context, item)
+        file_path = item.properties.get(self.PROPERTY_KEY_COLLECTED_FILE_PATH)
+        if file_path:
+            self._remove_from_index(self._items_by_collected_path, file_path, item)
+
+    @staticmethod
+    def _remove_from_index(index, key, item):
+        """
+        Removes an item from the entry of a lookup, dropping the entry once
+        empty.
+
+        :param dict index: The lookup to update.
+        :param key: The key of the entry to remove the item from.
+        :param item: The :ref:`publish-api-item` to remove.
+        """
+        items = index.get(key)
+        if items is None:
+            return
+        items.pop(item, None)
+        if not items:
+            del index[key]
+
+    def _set_root_item(self, root_item):
+        """
+        Sets the root item of the tree, making all of its descendants part of
+        this tree.
+
+        :param root_item: The :ref:`publish-api-item` to use as root.
+        """
+        self._snapshot = None
+        self._items_by_type = {}
+        self._items_by_context = {}
+        self._items_by_collected_path = {}
+        self._root_item = root_item
+        root_item._tree = self
+        self._index_item(root_item)
+        # the deferred children are added when loaded. see _item_loaded.
+        for item in root_item._visit_loaded_items():
+            item._tree = self
+            self._index_item(item)
+
     def _format_tree(self, parent_item, depth=0):
         """
         Depth first traversal and string formatting of the tree given a root
@@ -332,6 +1042,38 @@ class PublishTree(object):
         return tree_str
 
 
+# decodes the start of the records of the compact format. see
+# _decode_record_prefix.
+_record_decoder = json.JSONDecoder()
+_record_whitespace = re.compile(r"[ \t\n\r]*")
+
+
+def _decode_record_prefix(line):
+    """
+    Decodes the type of a record of the compact format without decoding the
+    rest of the record.
+
+    :param str line: A record, as written by :meth:`PublishTree._save_compact`.
+    :returns: A tuple of the record type and the index of the record's first
+        value in the line.
+    :raises: :class:`sgtk.TankError` if the line isn't a valid record.
+    """
+    index = _record_whitespace.match(line).end()
+    if line[index : index + 1] == "[":
+        try:
+            record_type, index = _record_decoder.raw_decode(
+                line, _record_whitespace.match(line, index + 1).end()
+            )
+        except ValueError:
+            pass
+        else:
+            index = _record_whitespace.match(line, index).end()
+            if line[index : index + 1] == ",":
+                return (record_type, _record_whitespace.match(line, index + 1).end())
+
+    raise sgtk.TankError("Invalid publish tree record: %s" % (line[:80],))
+
+
 class _PublishTreeEncoder(json.JSONEncoder):
     """
     Implements the json encoder interface for custom publish tree serialization.
@@ -350,23 +1092,30 @@ class _PublishTreeEncoder(json.JSONEncoder):
             return super().default(data)
 
 
-def _json_to_objects(data):
+def _json_to_objects(data, templates=None):
     """
     Check if an dictionary is actually representing a Toolkit object and
     unserializes it.
 
     :param dict data: Data to parse.
+    :param dict templates: An optional cache of the templates looked up by
+        name, shared by the calls made while loading a document.
 
     :returns: The original data passed in or the Toolkit object if one was found.
     :rtype: object
     """
     if data.get("_sgtk_custom_type") == "sgtk.Template":
-        templates = sgtk.platform.current_engine().sgtk.templates
-        if data["name"] not in templates:
+        if templates is not None and data["name"] in templates:
+            return templates[data["name"]]
+
+        engine_templates = sgtk.platform.current_engine().sgtk.templates
+        if data["name"] not in engine_templates:
             raise sgtk.TankError(
                 "Template '{0}' was not found in templates.yml.".format(data["name"])
             )
-        return templates[data["name"]]
+        if templates is not None:
+            templates[data["name"]] = engine_templates[data["name"]]
+        return engine_templates[data["name"]]
     elif data.get("_sgtk_custom_type") == "datetime.date":
         return datetime.date.fromisoformat(data.get("value"))
     elif data.get("_sgtk_custom_type") == "datetime.datetime":
@@ -0,0 +1,402 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+import urllib.request
+
+import sgtk
+
+logger = sgtk.platform.get_logger(__name__)
+
+
+class ResumableUpload(object):
+    """
+    Uploads a file in chunks, recording the acknowledged chunks in a journal
+    on disk so an interrupted upload can resume from the last acknowledged
+    chunk, either after a transient failure or after a restart.
+
+    The journal is written next to the uploaded file by default, or in the temp
+    directory if the file's directory isn't writable, and is removed once the
+    upload completes. If the file is modified after an upload started,
+    the journal is discarded and the upload starts over. If it is modified
+    during an upload, the upload fails.
+
+    .. code-block:: python
+
+        upload = ResumableUpload(
+            "/path/to/review.mov", HttpChunkTransport("https://ingest/uploads")
+        )
+        result = upload.run()
+    """
+
+    __slots__ = [
+        "_chunk_size",
+        "_journal_path",
+        "_logger",
+        "_max_retries",
+        "_path",
+        "_retry_delay",
+        "_transport",
+    ]
+
+    # the default size of the uploaded chunks, in bytes
+    DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+
+    # the suffix of the journal written next to the uploaded file
+    JOURNAL_SUFFIX = ".upload_journal.json"
+
+    def __init__(
+        self,
+        path,
+        transport,
+        journal_path=None,
+        journal_dir=None,
+        chunk_size=None,
+        max_retries=5,
+        retry_delay=1.0,
+        publish_logger=None,
+    ):
+        """
+        Initialize the upload.
+
+        :param str path: The path to the file to upload.
+        :param transport: The :class:`HttpChunkTransport` (or compatible
+            object) used to send the chunks.
+        :param str journal_path: The path to the journal. Defaults to the
+            uploaded file's path with a ``.upload_journal.json`` suffix.
+        :param str journal_dir: The directory to write the journal to, if
+            ``journal_path`` isn't supplied. Defaults to the directory of the
+            uploaded file, or to the temp directory if it isn't writable, as is
+            often the case for media on shared storage.
+        :param int chunk_size: The size of the uploaded chunks, in bytes.
+        :param int max_retries: The number of consecutive failures to retry
+            before giving up.
+        :param float retry_delay: The delay, in seconds, before the first retry.
+            The delay doubles with each consecutive failure.
+        :param publish_logger: The logger to report the upload progress to.
+        """
+        self._path = path
+        self._transport = transport
+        self._journal_path = journal_path or self._get_journal_path(journal_dir)
+        self._chunk_size = chunk_size or self.DEFAULT_CHUNK_SIZE
+        self._max_retries = max_retries
+        self._retry_delay = retry_delay
+        self._logger = publish_logger or logger
+
+    @property
+    def journal_path(self):
+        """The path to the journal recording the upload progress."""
+        return self._journal_path
+
+    def run(self):
+        """
+        Uploads the file, resuming a previously interrupted upload if possible.
+
+        :returns: The value returned by the transport once the upload completes.
+        :raises: :class:`sgtk.TankError` if the upload failed more than the
+            allowed number of consecutive times. The journal is kept so the
+            upload can be resumed later.
+        """
+        stat = os.stat(self._path)
+        journal = self._read_journal(stat)
+
+        if journal:
+            self._logger.info(
+                "Resuming upload of %s from %s of %s bytes..."
+                % (self._path, journal["offset"], stat.st_size)
+            )
+        else:
+            journal = {
+                "path": self._path,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "chunk_size": self._chunk_size,
+                "upload_id": None,
+                "offset": 0,
+            }
+
+        failures = 0
+        failed_offset = journal["offset"]
+        while True:
+            try:
+                if journal["upload_id"] is None:
+                    journal["upload_id"] = self._transport.start(
+                        os.path.basename(self._path), stat.st_size
+                    )
+                else:
+                    # the server knows best which chunks it acknowledged
+                    journal["offset"] = self._transport.status(journal["upload_id"])
+                self._write_journal(journal)
+
+                self._send_chunks(journal)
+                result = self._transport.complete(journal["upload_id"])
+                break
+            except Exception as e:
+                # retrying won't help if the file changed while it was uploaded
+                if self._file_changed(stat):
+                    self._remove_journal()
+                    raise sgtk.TankError(
+                        "Failed to upload %s, the file changed during the upload: %s"
+                        % (self._path, e)
+                    )
+
+                # only consecutive failures without progress are counted
+                if journal["offset"] > failed_offset:
+                    failures = 0
+                failed_offset = journal["offset"]
+                failures += 1
+                if failures > self._max_retries:
+                    raise sgtk.TankError(
+                        "Failed to upload %s after %s attempts: %s"
+                        % (self._path, failures, e)
+                    )
+                delay = self._retry_delay * 2 ** (failures - 1)
+                self._logger.warning(
+                    "Upload of %s interrupted at %s of %s bytes (%s). Retrying "
+                    "in %.1f seconds..."
+                    % (self._path, journal["offset"], stat.st_size, e, delay)
+                )
+                time.sleep(delay)
+
+        self._remove_journal()
+        self._logger.info("Uploaded %s." % (self._path,))
+        return result
+
+    ############################################################################
+    # protected methods
+
+    def _get_journal_path(self, journal_dir):
+        """
+        Returns the default path to the journal of the upload.
+
+        :param str journal_dir: The directory to write the journal to, if any.
+        """
+        file_dir = os.path.dirname(os.path.abspath(self._path))
+        if journal_dir is None and os.access(file_dir, os.W_OK):
+            return self._path + self.JOURNAL_SUFFIX
+
+        if journal_dir is None:
+            journal_dir = tempfile.gettempdir()
+
+        # the journals of files with the same name in different directories
+        # must not clash
+        path_hash = hashlib.sha1(
+            os.path.abspath(self._path).encode("utf-8")
+        ).hexdigest()
+        return os.path.join(
+            journal_dir,
+            "%s.%s%s" % (os.path.basename(self._path), path_hash, self.JOURNAL_SUFFIX),
+        )
+
+    def _send_chunks(self, journal):
+        """
+        Sends the chunks of the file following the acknowledged offset,
+        recording each acknowledged chunk in the journal.
+
+        :param dict journal: The journal of the upload.
+        """
+        size = journal["size"]
+        with open(self._path, "rb") as file_obj:
+            file_obj.seek(journal["offset"])
+            while journal["offset"] < size:
+                data = file_obj.read(journal["chunk_size"])
+                if not data:
+                    raise sgtk.TankError(
+                        "%s is shorter than the %s bytes being uploaded."
+                        % (self._path, size)
+                    )
+                offset = self._transport.send_chunk(
+                    journal["upload_id"], journal["offset"], data, size
+                )
+                if offset != journal["offset"] + len(data):
+                    if offset <= journal["offset"]:
+                        raise sgtk.TankError(
+                            "Chunk at offset %s was not acknowledged."
+                            % (journal["offset"],)
+                        )
+                    # the server didn't acknowledge all we sent. Resume from
+                    # what it did acknowledge.
+                    journal["offset"] = offset
+                    self._write_journal(journal)
+                    file_obj.seek(offset)
+                    continue
+
+                journal["offset"] = offset
+                self._write_journal(journal)
+                self._logger.debug(
+                    "Uploaded %s of %s bytes of %s" % (offset, size, self._path)
+                )
+
+    def _file_changed(self, stat):
+        """
+        Returns whether the uploaded file changed since it was stat'ed.
+
+        :param stat: The result of ``os.stat`` on the uploaded file when the
+            upload started.
+        """
+        try:
+            current_stat = os.stat(self._path)
+        except OSError:
+            return True
+        return (current_stat.st_size, current_stat.st_mtime) != (
+            stat.st_size,
+            stat.st_mtime,
+        )
+
+    def _read_journal(self, stat):
+        """
+        Reads the journal of a previous upload of the file.
+
+        :param stat: The result of ``os.stat`` on the uploaded file.
+        :returns: The journal, or ``None`` if there is no usable journal.
+        """
+        if not os.path.exists(self._journal_path):
+            return None
+
+        try:
+            with open(self._journal_path, "r") as journal_file:
+                journal = json.load(journal_file)
+        except Exception as e:
+            self._logger.debug(
+                "Ignoring unreadable upload journal %s: %s" % (self._journal_path, e)
+            )
+            return None
+
+        if (
+            journal.get("size") != stat.st_size
+            or journal.get("mtime") != stat.st_mtime
+            or journal.get("upload_id") is None
+        ):
+            self._logger.debug(
+                "Ignoring upload journal %s, %s changed since it was written."
+                % (self._journal_path, self._path)
+            )
+            return None
+
+        return journal
+
+    def _write_journal(self, journal):
+        """
+        Atomically writes the journal to disk.
+
+        :param dict journal: The journal of the upload.
+        """
+        tmp_path = self._journal_path + ".tmp"
+        with open(tmp_path, "w") as journal_file:
+            json.dump(journal, journal_file)
+        os.replace(tmp_path, self._journal_path)
+
+    def _remove_journal(self):
+        """Removes the journal once the upload completed."""
+        try:
+            os.remove(self._journal_path)
+        except OSError:
+            pass
+
+
+class HttpChunkTransport(object):
+    """
+    Sends the chunks of a :class:`ResumableUpload` to an HTTP endpoint.
+
+    The endpoint is expected to implement the following protocol, all
+    responses being JSON documents:
+
+    - ``POST <url>`` with a JSON body of ``{"filename": ..., "size": ...}``
+      starts an upload and returns ``{"upload_id": ...}``.
+    - ``PUT <url>/<upload_id>`` with a ``Content-Range: bytes
+      <first>-<last>/<size>`` header sends a chunk and returns the number of
+      bytes acknowledged so far as ``{"offset": ...}``.
+    - ``GET <url>/<upload_id>`` returns the number of bytes acknowledged so
+      far as ``{"offset": ...}``.
+    - ``POST <url>/<upload_id>/complete`` completes the upload. The returned
+      document is the result of the upload. The url the uploaded file can be
+      accessed from is expected as its ``url`` key.
+    """
+
+    __slots__ = ["_headers", "_timeout", "_url"]
+
+    def __init__(self, url, headers=None, timeout=60):
+        """
+        Initialize the transport.
+
+        :param str url: The url of the upload endpoint.
+        :param dict headers: Additional headers sent with each request, for
+            authentication for example.
+        :param float timeout: The timeout of each request, in seconds.
+        """
+        self._url = url.rstrip("/")
+        self._headers = headers or {}
+        self._timeout = timeout
+
+    def start(self, file_name, size):
+        """
+        Starts an upload.
+
+        :param str file_name: The name of the uploaded file.
+        :param int size: The size of the uploaded file, in bytes.
+        :returns: The id of the upload.
+        """
+        body = json.dumps({"filename": file_name, "size": size}).encode("utf-8")
+        return self._request(
+            "POST", self._url, body, {"Content-Type": "application/json"}
+        )["upload_id"]
+
+    def status(self, upload_id):
+        """
+        Returns the number of bytes acknowledged for an upload.
+
+        :param upload_id: The id of the upload.
+        """
+        return self._request("GET", "%s/%s" % (self._url, upload_id))["offset"]
+
+    def send_chunk(self, upload_id, offset, data, size):
+        """
+        Sends a chunk of the uploaded file.
+
+        :param upload_id: The id of the upload.
+        :param int offset: The offset of the chunk in the file.
+        :param bytes data: The content of the chunk.
+        :param int size: The size of the uploaded file, in bytes.
+        :returns: The number of bytes acknowledged so far.
+        """
+        headers = {
+            "Content-Type": "application/octet-stream",
+            "Content-Range": "bytes %s-%s/%s" % (offset, offset + len(data) - 1, size),
+        }
+        return self._request("PUT", "%s/%s" % (self._url, upload_id), data, headers)[
+            "offset"
+        ]
+
+    def complete(self, upload_id):
+        """
+        Completes an upload.
+
+        :param upload_id: The id of the upload.
+        :returns: The document returned by the endpoint.
+        """
+        return self._request("POST", "%s/%s/complete" % (self._url, upload_id), b"")
+
+    def _request(self, method, url, data=None, headers=None):
+        """
+        Sends a request to the endpoint.
+
+        :returns: The decoded JSON response.
+        """
+        request_headers = dict(self._headers)
+        request_headers.update(headers or {})
+        request = urllib.request.Request(
+            url, data=data, headers=request_headers, method=method
+        )
+        with urllib.request.urlopen(request, timeout=self._timeout) as response:
+            return json.loads(response.read().decode("utf-8"))
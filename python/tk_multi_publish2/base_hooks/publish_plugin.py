@@ -292,6 +292,39 @@ class PublishPlugin(HookBaseClass):
         """
         raise NotImplementedError
 
+    def accept_batch(self, settings, items):
+        """
+        This method is called by the publisher to see if the plugin accepts the
+        supplied items for processing.
+
+        Only items matching the filters defined via the :data:`item_filters`
+        property will be presented to this method. The publisher calls this
+        method once for all the items sharing the same context, instead of
+        calling :meth:`accept` for each item.
+
+        The default implementation calls :meth:`accept` for each item. Plugins
+        that need to query Flow Production Tracking or the file system to decide
+        whether to accept an item can override this method in order to do so
+        once for all the supplied items.
+
+        This method returns a :class:`list` with one :class:`dict` per supplied
+        item, in the same order. Each :class:`dict` takes the form documented in
+        :meth:`accept`.
+
+        If an exception is raised, the publisher falls back to calling
+        :meth:`accept` for each item.
+
+        :param dict settings: The keys are strings, matching the keys returned
+            in the :data:`settings` property. The values are
+            :ref:`publish-api-setting` instances.
+        :param list items: The :ref:`publish-api-item` instances to process for
+            acceptance.
+
+        :returns: A list of dictionaries with boolean keys accepted, required
+            and enabled.
+        """
+        return [self.accept(settings, item) for item in items]
+
     def validate(self, settings, item):
         """
         Validates the given item, ensuring it is ok to publish.
@@ -328,6 +361,41 @@ class PublishPlugin(HookBaseClass):
         """
         raise NotImplementedError
 
+    def validate_batch(self, settings, items):
+        """
+        Validates the given items, ensuring they are ok to publish.
+
+        This method is only called when the publish manager is asked to validate
+        tasks in batches (see :meth:`~.api.PublishManager.validate`). All the
+        tasks driven by this plugin that share the same settings are then
+        validated with a single call to this method.
+
+        The default implementation calls :meth:`validate` for each item.
+        Plugins that query Flow Production Tracking during validation can
+        override this method in order to gather the information for all the
+        items with a handful of queries before validating each item.
+
+        Returns a :class:`list` with one entry per supplied item, in the same
+        order. Each entry is ``True`` if the item is ready to publish, ``False``
+        otherwise. To report why a specific item failed validation, the entry
+        can be the :class:`Exception` describing the failure instead. If an
+        exception is raised, validation fails for all the supplied items.
+
+        :param dict settings: The keys are strings, matching the keys returned
+            in the :data:`settings` property. The values are
+            :ref:`publish-api-setting` instances.
+        :param list items: The :ref:`publish-api-item` instances to validate.
+
+        :returns: A list of booleans or exceptions, one per item.
+        """
+        results = []
+        for item in items:
+            try:
+                results.append(self.validate(settings, item))
+            except Exception as e:
+                results.append(e)
+        return results
+
     def publish(self, settings, item):
         """
         Executes the publish logic for the given item and settings.
@@ -13,6 +13,8 @@ import pprint
 
 import sgtk
 
+from .api import HttpChunkTransport, ResumableUpload
+
 # create a logger to use throughout
 logger = sgtk.platform.get_logger(__name__)
 
@@ -286,48 +288,105 @@ def get_conflicting_publishes(context, path, publish_name, filters=None):
     warning appropriately.
     """
 
-    publisher = sgtk.platform.current_bundle()
-
     logger.debug(
         "Getting conflicting publishes for context: %s, path: %s, name: %s"
         % (context, path, publish_name)
     )
 
+    return get_conflicting_publishes_bulk(
+        [(context, path, publish_name)], filters=filters
+    )[0]
+
+
+def get_conflicting_publishes_bulk(requests, filters=None):
+    """
+    Returns the PTR published file dicts for any existing publishes matching
+    each of the supplied (context, path, publish_name) requests.
+
+    This is the bulk version of :func:`get_conflicting_publishes`. Requests
+    sharing the same project, entity and task are resolved with a single
+    ``find()`` call.
+
+    :param requests: A list of (context, path, publish_name) tuples.
+    :param filters: A list of additional PTR find() filters to apply to the
+        publish search.
+
+    :return: A list with one list of publish ``dict``s per request, in the
+        order of the requests. The fields returned are the standard "id", and
+        "type" as well as the "path", "code" and "name" fields.
+    """
+
+    publisher = sgtk.platform.current_bundle()
+
     # ask core to do a dry_run of a publish with the supplied criteria. this is
     # a workaround for our inability to filter publishes by path. so for now,
     # get a dictionary of data that would be used to create a matching publish
     # and use that to get publishes via a call to find(). Then we'll filter
     # those by their path field. Once we have the ability in PTR to filter by
     # path, we can replace this whole method with a simple call to find().
-    publish_data = sgtk.util.register_publish(
-        publisher.sgtk, context, path, publish_name, version_number=None, dry_run=True
-    )
-    logger.debug("Publish dry run data: %s" % (publish_data,))
+    groups = {}
+    for index, (context, path, publish_name) in enumerate(requests):
+        publish_data = sgtk.util.register_publish(
+            publisher.sgtk,
+            context,
+            path,
+            publish_name,
+            version_number=None,
+            dry_run=True,
+        )
+        logger.debug("Publish dry run data: %s" % (publish_data,))
+
+        # publishes are looked up per project, entity and task. ids are only
+        # unique per entity type.
+        group_key = tuple(
+            (
+                (publish_data[field] or {}).get("type"),
+                (publish_data[field] or {}).get("id"),
+            )
+            for field in ["project", "entity", "task"]
+        )
+        _, group = groups.setdefault(group_key, (publish_data, {}))
+
+        # ensure the path is normalized for comparison
+        request_key = (
+            publish_data["code"],
+            publish_data["name"],
+            sgtk.util.ShotgunPath.normalize(path),
+        )
+        group.setdefault(request_key, []).append(index)
 
-    # now build up the filters to match against
-    publish_filters = [filters] if filters else []
-    for field in ["code", "entity", "name", "project", "task"]:
-        publish_filters.append([field, "is", publish_data[field]])
-    logger.debug("Build publish filters: %s" % (publish_filters,))
+    matching_publishes = [[] for _ in requests]
+    for group_data, group in groups.values():
 
-    # run the
-    publishes = publisher.shotgun.find("PublishedFile", publish_filters, ["path"])
+        # now build up the filters to match against
+        publish_filters = [filters] if filters else []
+        for field in ["entity", "project", "task"]:
+            publish_filters.append([field, "is", group_data[field]])
+        publish_filters.append(["code", "in", sorted(set(k[0] for k in group))])
+        publish_filters.append(["name", "in", sorted(set(k[1] for k in group))])
+        logger.debug("Build publish filters: %s" % (publish_filters,))
 
-    # ensure the path is normalized for comparison
-    normalized_path = sgtk.util.ShotgunPath.normalize(path)
+        publishes = publisher.shotgun.find(
+            "PublishedFile", publish_filters, ["path", "code", "name"]
+        )
+
+        # next, extract the publish path from each of the returned publishes and
+        # compare it against the requested paths. if the paths match, we add
+        # the publish to the list of publishes to return for the request.
+        logger.debug("Comparing publish paths...")
+        for publish in publishes:
+            publish_path = sgtk.util.resolve_publish_path(publisher.sgtk, publish)
+            if not publish_path:
+                continue
 
-    # next, extract the publish path from each of the returned publishes and
-    # compare it against the supplied path. if the paths match, we add the
-    # publish to the list of publishes to return.
-    logger.debug("Comparing publish paths...")
-    matching_publishes = []
-    for publish in publishes:
-        publish_path = sgtk.util.resolve_publish_path(publisher.sgtk, publish)
-        if publish_path:
             # ensure the published path is normalized for comparison
-            normalized_publish_path = sgtk.util.ShotgunPath.normalize(publish_path)
-            if normalized_path == normalized_publish_path:
-                matching_publishes.append(publish)
+            request_key = (
+                publish["code"],
+                publish["name"],
+                sgtk.util.ShotgunPath.normalize(publish_path),
+            )
+            for index in group.get(request_key, []):
+                matching_publishes[index].append(publish)
 
     return matching_publishes
 
@@ -394,6 +453,47 @@ def clear_status_for_conflicting_publishes(context, publish_data):
         publisher.shotgun.batch(batch_data)
 
 
+def get_publish_batch(item):
+    """
+    Returns the batch to queue the publish registration of the supplied item
+    on, if the item is being published as part of a batched publish.
+
+    :param item: The :ref:`publish-api-item` being published.
+
+    :return: A :class:`~.api.PublishBatch` instance, or ``None`` if publishes
+        should be registered right away.
+    """
+
+    tree = item.tree
+    if tree is None:
+        return None
+    return tree.publish_batch
+
+
+def upload_file_resumable(path, url, headers=None, publish_logger=None):
+    """
+    Uploads a file in chunks to an HTTP endpoint, resuming a previously
+    interrupted upload of the file if possible.
+
+    The upload progress is recorded in a journal written next to the file, or
+    in the temp directory if the file's directory isn't writable. See
+    :class:`~.api.ResumableUpload` and :class:`~.api.HttpChunkTransport` for
+    details.
+
+    :param str path: The path to the file to upload.
+    :param str url: The url of the upload endpoint.
+    :param dict headers: Additional headers sent with each request, for
+        authentication for example.
+    :param publish_logger: The logger to report the upload progress to.
+
+    :return: The document returned by the endpoint once the upload completes.
+    """
+    upload = ResumableUpload(
+        path, HttpChunkTransport(url, headers=headers), publish_logger=publish_logger
+    )
+    return upload.run()
+
+
 def get_thumbnail(path, context):
     """
     Given a path and context, attempt to automatically generate a thumbnail.
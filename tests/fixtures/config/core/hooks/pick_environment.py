@@ -20,7 +20,10 @@ class PickEnvironment(Hook):
         and asset, and switches to these based on entity type.
         """
 
-        if "PUBLISH2_API_TEST" in os.environ:
+        # checked first, since the benchmarks also set PUBLISH2_API_TEST
+        if "PUBLISH2_BENCHMARK_TEST" in os.environ:
+            return "benchmark"
+        elif "PUBLISH2_API_TEST" in os.environ:
             return "api_test"
         elif "PUBLISH2_EXTRA_FIELDS_TEST" in os.environ:
             return "extra_fields_test"
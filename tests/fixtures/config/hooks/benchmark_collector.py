@@ -0,0 +1,40 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import sgtk
+
+HookBaseClass = sgtk.get_hook_baseclass()
+
+
+class BenchmarkCollector(HookBaseClass):
+    """
+    A collector building a synthetic tree of items to benchmark the publish API.
+    """
+
+    def process_current_session(self, settings, parent_item):
+        """
+        Creates the number of items stored in the ``benchmark_item_count``
+        property of the parent item. The items are created in groups of ten: a
+        top level item with nine children.
+
+        :param parent_item: Root item instance
+        """
+        item_count = parent_item.properties.get("benchmark_item_count", 0)
+
+        group_item = None
+        for index in range(item_count):
+            if index % 10 == 0:
+                group_item = parent_item.create_item(
+                    "benchmark.group", "Benchmark Group", "Group %s" % (index,)
+                )
+            else:
+                group_item.create_item(
+                    "benchmark.file", "Benchmark File", "File %s" % (index,)
+                )
@@ -0,0 +1,48 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import sgtk
+
+HookBaseClass = sgtk.get_hook_baseclass()
+
+
+class BenchmarkPlugin(HookBaseClass):
+    """
+    A publish plugin accepting every benchmark item and doing nothing, so that
+    benchmarks only measure the publish API itself.
+    """
+
+    @property
+    def name(self):
+        return "Benchmark Publish"
+
+    @property
+    def description(self):
+        return "This plugin accepts all benchmark items and does nothing."
+
+    @property
+    def settings(self):
+        return {}
+
+    @property
+    def item_filters(self):
+        return ["benchmark.*"]
+
+    def accept(self, settings, item):
+        return {"accepted": True}
+
+    def validate(self, settings, item):
+        return True
+
+    def publish(self, settings, item):
+        pass
+
+    def finalize(self, settings, item):
+        pass
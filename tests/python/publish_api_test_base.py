@@ -30,8 +30,13 @@ class PublishApiTestBase(TankTestBase):
 
         self.shotgun_model = self.framework.import_module("shotgun_model")
 
+    Tests setting ``headless`` to ``True`` don't require Qt. The Qt modules,
+    the QApplication and the widget fixtures are then not available.
     """
 
+    # set to True in tests that must run without Qt
+    headless = False
+
     def setUp(self):
         """
         Fixtures setup
@@ -74,6 +79,10 @@ class PublishApiTestBase(TankTestBase):
         self.PublishManager = self.api.PublishManager
         self.PublishPluginInstance = self.api.plugins.PublishPluginInstance
 
+        # the rest of the fixtures require Qt
+        if self.headless:
+            return
+
         publish_tree_widget = self.app.import_module(
             "tk_multi_publish2"
         ).publish_tree_widget
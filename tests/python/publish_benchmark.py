@@ -0,0 +1,202 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+
+"""
+Benchmarks of the publish API on synthetic trees, run by ``test_benchmark.py``.
+
+The trees are built by the collector of the ``benchmark`` environment of the
+fixture config, and each item is accepted by two publish plugins doing nothing,
+so that only the time spent in the publish API is measured.
+"""
+
+import json
+import os
+import time
+
+# bump this if the operations or the synthetic trees change, since results of
+# different versions can't be compared
+BENCHMARK_VERSION = 2
+
+# the operations timed for each tree, in order. collect only runs the
+# collector, the plugins are attached to the collected items by attach_plugins.
+OPERATIONS = [
+    "collect",
+    "attach_plugins",
+    "iterate",
+    "iterate_tasks",
+    "validate",
+    "publish",
+    "finalize",
+    "save",
+    "load",
+    "save_compact",
+    "load_compact",
+    "load_lazy",
+]
+
+
+def run_benchmark(manager, item_count, temp_dir):
+    """
+    Times the publish API operations on a synthetic tree.
+
+    :param manager: The :class:`PublishManager` to benchmark. Its tree is
+        replaced by the synthetic tree.
+    :param int item_count: The number of items of the synthetic tree.
+    :param str temp_dir: A directory to save the tree to.
+
+    :returns: A dictionary of operation name to the wall time it took, in
+        seconds.
+    """
+    timings = {}
+
+    def timed(operation, func, *args):
+        start_time = time.perf_counter()
+        result = func(*args)
+        timings[operation] = time.perf_counter() - start_time
+        return result
+
+    # read by the benchmark collector
+    manager.tree.root_item.properties["benchmark_item_count"] = item_count
+
+    def collect():
+        # what collect_session does, without attaching the plugins
+        manager.tree.clear(clear_persistent=False)
+        with manager.tree._record_created_items() as items:
+            manager._collector_instance.run_process_current_session(
+                manager.tree.root_item
+            )
+        return items
+
+    items = timed("collect", collect)
+    timed("attach_plugins", manager._attach_plugins, items)
+    timed("iterate", lambda: sum(1 for _ in manager.tree))
+    timed("iterate_tasks", lambda: sum(1 for _ in manager._task_generator()))
+    timed("validate", manager.validate)
+    timed("publish", manager.publish)
+    timed("finalize", manager.finalize)
+
+    path = os.path.join(temp_dir, "benchmark_%s.json" % (item_count,))
+    timed("save", manager.save, path)
+    timed("load", manager.load, path)
+
+    path = os.path.join(temp_dir, "benchmark_%s.compact" % (item_count,))
+    timed("save_compact", manager.save, path, True)
+    timed("load_compact", manager.load, path)
+    timed("load_lazy", manager.load, path, True)
+
+    return timings
+
+
+def load_baseline(path):
+    """
+    Reads the benchmark results stored in a baseline file.
+
+    :param str path: The path to the baseline file.
+
+    :returns: A dictionary of item count to the timings of
+        :func:`run_benchmark`. Empty if the file doesn't exist or was written
+        by another version of the benchmarks.
+    """
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, "r") as baseline_file:
+        baseline = json.load(baseline_file)
+
+    if baseline.get("benchmark_version") != BENCHMARK_VERSION:
+        return {}
+
+    return dict(
+        (int(item_count), timings)
+        for (item_count, timings) in baseline["results"].items()
+    )
+
+
+def save_baseline(path, results):
+    """
+    Writes benchmark results to a baseline file, replacing the results of the
+    same tree sizes already stored in it.
+
+    :param str path: The path to the baseline file.
+    :param dict results: A dictionary of item count to the timings of
+        :func:`run_benchmark`.
+    """
+    baseline = load_baseline(path)
+    baseline.update(results)
+
+    with open(path, "w") as baseline_file:
+        json.dump(
+            {
+                "benchmark_version": BENCHMARK_VERSION,
+                "results": dict(
+                    (str(item_count), timings)
+                    for (item_count, timings) in sorted(baseline.items())
+                ),
+            },
+            baseline_file,
+            indent=4,
+            sort_keys=True,
+        )
+        baseline_file.write("\n")
+
+
+def find_regressions(results, baseline, tolerance, min_duration=0.05):
+    """
+    Compares benchmark results to a baseline.
+
+    An operation regressed if it took more than ``tolerance`` times its
+    baseline duration. Differences under ``min_duration`` are ignored, since
+    the duration of the fastest operations is mostly noise. Tree sizes and
+    operations missing from the baseline are ignored.
+
+    :param dict results: A dictionary of item count to the timings of
+        :func:`run_benchmark`.
+    :param dict baseline: The baseline, as returned by :func:`load_baseline`.
+    :param float tolerance: The slowdown factor allowed.
+    :param float min_duration: The slowdown allowed regardless of the
+        tolerance, in seconds.
+
+    :returns: A list of (item count, operation, duration, baseline duration)
+        tuples for each operation which regressed.
+    """
+    regressions = []
+    for item_count, timings in sorted(results.items()):
+        baseline_timings = baseline.get(item_count, {})
+        for operation in OPERATIONS:
+            if operation not in timings or operation not in baseline_timings:
+                continue
+            duration = timings[operation]
+            baseline_duration = baseline_timings[operation]
+            if duration > max(
+                baseline_duration * tolerance, baseline_duration + min_duration
+            ):
+                regressions.append((item_count, operation, duration, baseline_duration))
+    return regressions
+
+
+def find_missing_sizes(results, baseline):
+    """
+    Lists the tree sizes benchmarked which can't be compared to the baseline.
+
+    :param dict results: A dictionary of item count to the timings of
+        :func:`run_benchmark`.
+    :param dict baseline: The baseline, as returned by :func:`load_baseline`.
+
+    :returns: A sorted list of the item counts missing from the baseline, or
+        for which an operation is missing from the baseline.
+    """
+    return sorted(
+        item_count
+        for item_count in results
+        if any(
+            operation not in baseline.get(item_count, {}) for operation in OPERATIONS
+        )
+    )
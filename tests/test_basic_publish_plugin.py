@@ -128,3 +128,90 @@ class TestBasicPublishPlugin(PublishApiTestBase):
             }
             expected_kwargs.update(global_props_dict["publish_kwargs"])
             register_publish_mock.assert_called_once_with(**expected_kwargs)
+
+    def test_get_conflicting_publishes_bulk(self):
+        """
+        Ensure conflicting publishes sharing a context are looked up with a
+        single query and matched to their request.
+        """
+        context = self.engine.context
+
+        def register_publish(tk, context, path, name, **kwargs):
+            return {
+                "code": os.path.basename(path),
+                "name": name,
+                "project": self.project,
+                "entity": None,
+                "task": None,
+            }
+
+        publishes = [
+            {"type": "PublishedFile", "id": 1, "code": "a.ma", "name": "a"},
+            {"type": "PublishedFile", "id": 2, "code": "b.ma", "name": "b"},
+            {"type": "PublishedFile", "id": 3, "code": "b.ma", "name": "b"},
+        ]
+        paths = {1: "/path/a.ma", 2: "/path/b.ma", 3: "/other/path/b.ma"}
+
+        with mock.patch(
+            "sgtk.util.register_publish", side_effect=register_publish
+        ), mock.patch(
+            "sgtk.util.resolve_publish_path",
+            side_effect=lambda tk, publish: paths[publish["id"]],
+        ), mock.patch.object(
+            self.app.shotgun, "find", return_value=publishes
+        ) as find_mock:
+            results = self.app.util.get_conflicting_publishes_bulk(
+                [
+                    (context, "/path/a.ma", "a"),
+                    (context, "/path/b.ma", "b"),
+                    (context, "/path/c.ma", "c"),
+                ]
+            )
+
+        find_mock.assert_called_once()
+        self.assertEqual(results, [[publishes[0]], [publishes[1]], []])
+
+    def test_get_conflicting_publishes_bulk_entity_types(self):
+        """
+        Ensure requests for entities of different types sharing an id are
+        looked up separately.
+        """
+        context = self.engine.context
+        entities = {
+            "/shot/a.ma": {"type": "Shot", "id": 12},
+            "/asset/a.ma": {"type": "Asset", "id": 12},
+        }
+
+        def register_publish(tk, context, path, name, **kwargs):
+            return {
+                "code": os.path.basename(path),
+                "name": name,
+                "project": self.project,
+                "entity": entities[path],
+                "task": None,
+            }
+
+        publishes = {
+            "Shot": {"type": "PublishedFile", "id": 1, "code": "a.ma", "name": "a"},
+            "Asset": {"type": "PublishedFile", "id": 2, "code": "a.ma", "name": "a"},
+        }
+        paths = {1: "/shot/a.ma", 2: "/asset/a.ma"}
+
+        def find(entity_type, filters, fields):
+            entity = [f[2] for f in filters if f[0] == "entity"][0]
+            return [publishes[entity["type"]]]
+
+        with mock.patch(
+            "sgtk.util.register_publish", side_effect=register_publish
+        ), mock.patch(
+            "sgtk.util.resolve_publish_path",
+            side_effect=lambda tk, publish: paths[publish["id"]],
+        ), mock.patch.object(
+            self.app.shotgun, "find", side_effect=find
+        ) as find_mock:
+            results = self.app.util.get_conflicting_publishes_bulk(
+                [(context, "/shot/a.ma", "a"), (context, "/asset/a.ma", "a")]
+            )
+
+        self.assertEqual(find_mock.call_count, 2)
+        self.assertEqual(results, [[publishes["Shot"]], [publishes["Asset"]]])
@@ -0,0 +1,101 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+
+import os
+
+import publish_benchmark
+from publish_api_test_base import PublishApiTestBase
+from tank_test.tank_test_base import setUpModule  # noqa
+
+# the baseline the benchmark results are compared to
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "benchmark_baseline.json")
+
+
+class TestBenchmark(PublishApiTestBase):
+    """
+    Benchmarks the publish API on synthetic trees and compares the results to
+    the baseline.
+
+    The benchmarks are controlled by the following environment variables:
+
+    - ``PUBLISH2_BENCHMARK_SIZES``: A comma separated list of the number of
+      items of the trees to benchmark. Defaults to ``1000``.
+    - ``PUBLISH2_BENCHMARK_TOLERANCE``: The slowdown factor allowed compared
+      to the baseline. Defaults to ``3``.
+    - ``PUBLISH2_BENCHMARK_OUTPUT``: If set, the results are written to this
+      baseline file. Set it to the path of ``benchmark_baseline.json`` to
+      update the baseline.
+
+    The test fails if the baseline has no results for one of the tree sizes
+    benchmarked, unless the results are being recorded.
+    """
+
+    headless = True
+
+    def setUp(self):
+        """
+        Selects the benchmark environment of the fixture config.
+        """
+        os.environ["PUBLISH2_BENCHMARK_TEST"] = "1"
+        self.addCleanup(os.environ.pop, "PUBLISH2_BENCHMARK_TEST", None)
+        super().setUp()
+
+    def test_benchmark(self):
+        """
+        Ensures the publish API operations didn't get slower than the
+        baseline.
+        """
+        item_counts = [
+            int(item_count)
+            for item_count in os.environ.get("PUBLISH2_BENCHMARK_SIZES", "1000").split(
+                ","
+            )
+        ]
+        tolerance = float(os.environ.get("PUBLISH2_BENCHMARK_TOLERANCE", 3))
+
+        results = {}
+        for item_count in item_counts:
+            manager = self.app.create_publish_manager()
+            results[item_count] = publish_benchmark.run_benchmark(
+                manager, item_count, self.tank_temp
+            )
+
+            # make sure the whole tree was published
+            self.assertEqual(len(list(manager.tree)), item_count)
+            self.assertEqual(
+                len(manager.get_timing_report("finalize")["records"]),
+                item_count * 2,
+            )
+
+        output_path = os.environ.get("PUBLISH2_BENCHMARK_OUTPUT")
+        if output_path:
+            publish_benchmark.save_baseline(output_path, results)
+
+        baseline = publish_benchmark.load_baseline(BASELINE_PATH)
+        missing_sizes = publish_benchmark.find_missing_sizes(results, baseline)
+        if missing_sizes and not output_path:
+            self.fail(
+                "No baseline to compare the benchmarks of trees of %s items to. "
+                "Set PUBLISH2_BENCHMARK_OUTPUT to %s to record it. Results: %s"
+                % (
+                    ", ".join(str(item_count) for item_count in missing_sizes),
+                    BASELINE_PATH,
+                    results,
+                )
+            )
+
+        regressions = publish_benchmark.find_regressions(results, baseline, tolerance)
+        self.assertEqual(
+            regressions,
+            [],
+            "Operations slower than the baseline, as (items, operation, "
+            "duration, baseline duration): %s" % (regressions,),
+        )
@@ -10,6 +10,7 @@
 
 import os
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
 from publish_api_test_base import PublishApiTestBase
 from tank_test.tank_test_base import temp_env_var
@@ -144,6 +145,62 @@ class TestPublishItem(PublishApiTestBase):
         # Instantiating the class will run the rest defined above.
         PropertyTesting()
 
+    def test_local_properties_of_executing_plugin(self):
+        """
+        Ensures local properties are looked up for the plugin executed by the
+        publish API without walking the call stack, including from other
+        threads.
+        """
+        item = self.PublishItem("test", "test", "test")
+
+        # hooks are created lazily, so these plugins never load their hook.
+        plugin_1 = self.PublishPluginInstance("plugin 1", "plugin_1.py", {})
+        plugin_2 = self.PublishPluginInstance("plugin 2", "plugin_2.py", {})
+
+        def set_property(plugin, value):
+            with plugin._executing_hook():
+                item.local_properties["test"] = value
+
+        with patch.object(self.PublishItem, "_get_calling_plugin_id") as stack_walk:
+            with plugin_1._executing_hook():
+                item.local_properties["test"] = 1
+
+                # another plugin executing on a worker thread
+                with ThreadPoolExecutor(max_workers=1) as executor:
+                    executor.submit(set_property, plugin_2, 2).result()
+
+                self.assertEqual(item.local_properties["test"], 1)
+
+            with plugin_2._executing_hook():
+                self.assertEqual(item.local_properties["test"], 2)
+
+            stack_walk.assert_not_called()
+
+    def test_context_inheritance(self):
+        """
+        Ensures the inherited context is updated when an ancestor's context is
+        set.
+        """
+        parent = self.PublishItem("parent", "parent", "parent")
+        child = parent.create_item("child", "child", "child")
+        grand_child = child.create_item("grand_child", "grand_child", "grand_child")
+
+        self.assertEqual(grand_child.context, self.app.context)
+
+        context = self.tk.context_empty()
+        parent.context = context
+        self.assertIs(grand_child.context, context)
+
+        child_context = self.tk.context_from_entity(
+            self.project["type"], self.project["id"]
+        )
+        child.context = child_context
+        self.assertIs(parent.context, context)
+        self.assertIs(grand_child.context, child_context)
+
+        child.context = None
+        self.assertIs(grand_child.context, context)
+
     def test_item_lifescope(self):
         """
         Ensures items can be added and removed properly.
@@ -8,12 +8,16 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
+import asyncio
+import json
 import os
 
 from publish_api_test_base import PublishApiTestBase
 from tank_test.tank_test_base import setUpModule  # noqa
 
-from unittest.mock import Mock, MagicMock
+import sgtk
+
+from unittest.mock import Mock, MagicMock, patch
 
 
 class TestManager(PublishApiTestBase):
@@ -139,3 +143,525 @@ class TestManager(PublishApiTestBase):
 
         with self.assertRaisesRegex(Exception, "Test error!"):
             self.manager.publish(test_nodes())
+
+    def test_validate_concurrently(self):
+        """
+        Ensures validating tasks on worker threads reports failures in the
+        order the tasks were generated.
+        """
+        item = self.PublishItem("item", "item", "item")
+        error_to_raise = Exception("Test error!")
+
+        task_1 = MagicMock(item=item, validate=lambda: True)
+        task_2 = MagicMock(item=item, validate=Mock(side_effect=error_to_raise))
+        task_3 = MagicMock(item=item, validate=lambda: False)
+
+        def test_nodes():
+            # tasks are consumed before validation, so no status is sent back.
+            self.assertIsNone((yield task_1))
+            self.assertIsNone((yield task_2))
+            self.assertIsNone((yield task_3))
+
+        failures = self.manager.validate(test_nodes(), max_workers=4)
+
+        self.assertEqual(failures, [(task_2, error_to_raise), (task_3, None)])
+
+    def test_validate_batched(self):
+        """
+        Ensures tasks sharing a plugin and settings are validated in a single
+        batch and failures are reported in the order the tasks were generated.
+        """
+        item_1 = self.PublishItem("item_1", "item", "item")
+        item_2 = self.PublishItem("item_2", "item", "item")
+        item_3 = self.PublishItem("item_3", "item", "item")
+        error_to_raise = Exception("Test error!")
+
+        plugin = MagicMock()
+        plugin.run_validate_batch.side_effect = lambda settings, items: [
+            (True, None) if item is item_1 else (False, error_to_raise)
+            for item in items
+        ]
+        other_settings = {"setting": MagicMock(value="other")}
+
+        task_1 = MagicMock(item=item_1, plugin=plugin, settings={})
+        task_2 = MagicMock(item=item_2, plugin=plugin, settings=other_settings)
+        task_3 = MagicMock(item=item_3, plugin=plugin, settings={})
+
+        failures = self.manager.validate(iter([task_1, task_2, task_3]), batched=True)
+
+        self.assertEqual(failures, [(task_2, error_to_raise), (task_3, error_to_raise)])
+        self.assertEqual(
+            [call[0][1] for call in plugin.run_validate_batch.call_args_list],
+            [[item_1, item_3], [item_2]],
+        )
+
+    def test_validate_batched_failures_leave_items_clean(self):
+        """
+        Ensures the conflicting publishes looked up by the file publish plugin
+        for a batch aren't left on the items when validation raises.
+        """
+        self.manager.collect_session()
+
+        # the local plugin raises before calling the base class validate
+        with patch.dict(os.environ, {"TEST_LOCAL_PROPERTIES": "1"}):
+            failures = self.manager.validate(batched=True)
+
+        self.assertTrue(failures)
+        for item in self.manager.tree:
+            self.assertNotIn(
+                "prefetched_conflicting_publishes",
+                json.dumps(item.to_dict(), default=str),
+            )
+
+    def test_publish_concurrently(self):
+        """
+        Ensures publishing on worker threads runs the tasks of an item in order
+        and only after the tasks of its parent completed.
+        """
+        parent = self.manager.tree.root_item.create_item("parent", "parent", "parent")
+        child = parent.create_item("child", "child", "child")
+        other = self.manager.tree.root_item.create_item("other", "other", "other")
+
+        published = []
+
+        def make_task(item, name):
+            return MagicMock(item=item, publish=lambda: published.append(name))
+
+        tasks = [
+            make_task(parent, "parent_1"),
+            make_task(parent, "parent_2"),
+            make_task(child, "child"),
+            make_task(other, "other"),
+        ]
+
+        self.manager.publish(iter(tasks), max_workers=4)
+
+        self.assertEqual(len(published), 4)
+        self.assertLess(published.index("parent_1"), published.index("parent_2"))
+        self.assertLess(published.index("parent_2"), published.index("child"))
+
+    def test_publish_concurrently_failures(self):
+        """
+        Ensures a failing task aborts the concurrent publish and that the tasks
+        of its children are not executed.
+        """
+        parent = self.manager.tree.root_item.create_item("parent", "parent", "parent")
+        child = parent.create_item("child", "child", "child")
+
+        child_publish = Mock()
+        tasks = [
+            MagicMock(item=parent, publish=Mock(side_effect=Exception("Test error!"))),
+            MagicMock(item=child, publish=child_publish),
+        ]
+
+        with self.assertRaisesRegex(Exception, "Test error!"):
+            self.manager.publish(iter(tasks), max_workers=4)
+
+        child_publish.assert_not_called()
+
+    def test_async_validate(self):
+        """
+        Ensures the coroutine version of validate sends the validation status
+        back to an asynchronous task generator.
+        """
+        item = self.PublishItem("item", "item", "item")
+        error_to_raise = Exception("Test error!")
+
+        task_1 = MagicMock(item=item, validate=lambda: True)
+        task_2 = MagicMock(item=item, validate=Mock(side_effect=error_to_raise))
+
+        async def test_nodes():
+            is_valid, error = yield task_1
+            self.assertTrue(is_valid)
+            self.assertIsNone(error)
+
+            is_valid, error = yield task_2
+            self.assertFalse(is_valid)
+            self.assertEqual(error, error_to_raise)
+
+        failures = asyncio.run(self.manager.avalidate(test_nodes()))
+
+        self.assertEqual(failures, [(task_2, error_to_raise)])
+
+    def test_async_publish_failures(self):
+        """
+        Ensures the coroutine version of publish raises plugin errors.
+        """
+
+        def test_nodes():
+            task = MagicMock(publish=Mock(side_effect=Exception("Test error!")))
+            yield task
+
+        with self.assertRaisesRegex(Exception, "Test error!"):
+            asyncio.run(self.manager.apublish(test_nodes()))
+
+    def test_publish_batched(self):
+        """
+        Ensures publishes queued during a batched publish are created once all
+        tasks are published, along with the dependencies between them.
+        """
+        parent = self.manager.tree.root_item.create_item("parent", "parent", "parent")
+        child = parent.create_item("child", "child", "child")
+
+        def make_task(item):
+            def publish():
+                self.manager.tree.publish_batch.queue_publish(
+                    item,
+                    {"tk": self.tk, "name": item.name},
+                    dependency_items=[item.parent],
+                )
+
+            return MagicMock(item=item, publish=publish)
+
+        def register_publish(dry_run, **publish_data):
+            self.assertTrue(dry_run)
+            return {"type": "PublishedFile", "code": publish_data["name"]}
+
+        created = [
+            [{"type": "PublishedFile", "id": 1}, {"type": "PublishedFile", "id": 2}],
+            [{"type": "PublishedFileDependency", "id": 3}],
+        ]
+
+        with patch(
+            "sgtk.util.register_publish", side_effect=register_publish
+        ), patch.object(self.tk.shotgun, "batch", side_effect=created) as batch:
+            self.manager.publish(
+                iter([make_task(parent), make_task(child)]), batched=True
+            )
+
+        self.assertIsNone(self.manager.tree.publish_batch)
+        self.assertEqual(parent.properties.sg_publish_data["id"], 1)
+        self.assertEqual(child.properties.sg_publish_data["id"], 2)
+
+        publish_requests, dependency_requests = [
+            call[0][0] for call in batch.call_args_list
+        ]
+        self.assertEqual(
+            [request["data"]["code"] for request in publish_requests],
+            ["parent", "child"],
+        )
+        self.assertEqual(
+            [request["data"] for request in dependency_requests],
+            [
+                {
+                    "published_file": {"type": "PublishedFile", "id": 2},
+                    "dependent_published_file": {"type": "PublishedFile", "id": 1},
+                }
+            ],
+        )
+
+    def test_publish_batched_shotgun_calls(self):
+        """
+        Ensures the number of Flow Production Tracking calls made to register
+        batched publishes doesn't depend on the number of publishes.
+        """
+        items = [
+            self.manager.tree.root_item.create_item("item", "item %s" % i, "item")
+            for i in range(20)
+        ]
+
+        def make_task(item, index):
+            def publish():
+                self.manager.tree.publish_batch.queue_publish(
+                    item,
+                    {
+                        "tk": self.tk,
+                        "name": item.name,
+                        "published_file_type": "Type %s" % (index % 2,),
+                    },
+                )
+
+            return MagicMock(item=item, publish=publish)
+
+        types = [{"type": "PublishedFileType", "id": 100, "code": "Type 0"}]
+        created = [
+            [{"type": "PublishedFileType", "id": 101}],
+            [{"type": "PublishedFile", "id": i} for i in range(len(items))],
+        ]
+
+        def register_publish(tk, name, published_file_type=None, dry_run=False):
+            # like core, look the type up even on a dry run
+            self.assertTrue(dry_run)
+            if published_file_type:
+                tk.shotgun.find(
+                    "PublishedFileType", [["code", "is", published_file_type]]
+                )
+            return {
+                "type": "PublishedFile",
+                "code": name,
+                "published_file_type": None,
+            }
+
+        with patch(
+            "sgtk.util.register_publish", side_effect=register_publish
+        ), patch.object(
+            self.tk.shotgun, "find", return_value=types
+        ) as find, patch.object(
+            self.tk.shotgun, "batch", side_effect=created
+        ) as batch, patch.object(
+            self.tk.shotgun, "create"
+        ) as create:
+            self.manager.publish(
+                iter([make_task(item, i) for (i, item) in enumerate(items)]),
+                batched=True,
+            )
+
+        # one lookup of the types, and a batch to create the missing type, then
+        # the publishes
+        find.assert_called_once()
+        self.assertEqual(batch.call_count, 2)
+        create.assert_not_called()
+
+        publish_requests = batch.call_args_list[1][0][0]
+        self.assertEqual(
+            [
+                request["data"]["published_file_type"]["id"]
+                for request in publish_requests
+            ],
+            [100, 101] * 10,
+        )
+
+    def test_publish_batched_failure(self):
+        """
+        Ensures nothing queued during a batched publish is registered when a
+        task raises.
+        """
+        item = self.manager.tree.root_item.create_item("item", "item", "item")
+        self.assertIs(item.tree, self.manager.tree)
+        error_to_raise = Exception("Test error!")
+
+        def publish():
+            self.app.util.get_publish_batch(item).queue_publish(
+                item, {"tk": self.tk, "name": item.name}
+            )
+
+        tasks = [
+            MagicMock(item=item, publish=publish),
+            MagicMock(item=item, publish=Mock(side_effect=error_to_raise)),
+        ]
+
+        with patch.object(self.tk.shotgun, "batch") as batch:
+            with self.assertRaises(Exception) as cm:
+                self.manager.publish(iter(tasks), batched=True)
+
+        self.assertIs(cm.exception, error_to_raise)
+        batch.assert_not_called()
+        self.assertIsNone(self.manager.tree.publish_batch)
+
+    def test_publish_batched_versions(self):
+        """
+        Ensures versions queued during a batched publish are created after the
+        publishes, linked to them, and have their media uploaded.
+        """
+        item = self.manager.tree.root_item.create_item("item", "item", "item")
+        item.properties.sg_publish_data = {"type": "PublishedFile", "id": 1}
+
+        def publish():
+            self.manager.tree.publish_batch.queue_version(
+                item,
+                {"code": "item"},
+                published_file_items=[item],
+                upload_path="/path/to/item.mov",
+            )
+
+        connection = MagicMock()
+        with patch.object(
+            self.tk.shotgun, "batch", return_value=[{"type": "Version", "id": 2}]
+        ) as batch, patch(
+            "sgtk.util.shotgun.create_sg_connection", return_value=connection
+        ):
+            self.manager.publish(
+                iter([MagicMock(item=item, publish=publish)]), batched=True
+            )
+
+        self.assertEqual(
+            batch.call_args[0][0][0]["data"],
+            {"code": "item", "published_files": [item.properties.sg_publish_data]},
+        )
+        self.assertEqual(item.properties.sg_version_data["id"], 2)
+        connection.upload.assert_called_once_with(
+            "Version", 2, "/path/to/item.mov", "sg_uploaded_movie"
+        )
+
+        # failed uploads are reported once all uploads completed
+        connection.upload.side_effect = Exception("Test error!")
+        with patch.object(
+            self.tk.shotgun, "batch", return_value=[{"type": "Version", "id": 2}]
+        ), patch("sgtk.util.shotgun.create_sg_connection", return_value=connection):
+            with self.assertRaises(sgtk.TankError):
+                self.manager.publish(
+                    iter([MagicMock(item=item, publish=publish)]), batched=True
+                )
+
+    def test_plugin_settings_cache(self):
+        """
+        Ensures the plugin definitions of other contexts are cached on disk
+        across managers until the cache is cleared or the configuration
+        changes, and that the environment is only picked once per lookup.
+        """
+        tk = self.app.sgtk
+        context = tk.context_empty()
+        pipeline_configuration = tk.pipeline_configuration
+
+        with patch.object(
+            pipeline_configuration,
+            "get_environment",
+            wraps=pipeline_configuration.get_environment,
+        ) as get_environment, patch.object(
+            tk, "execute_core_hook", wraps=tk.execute_core_hook
+        ) as execute_core_hook:
+            plugins = self.manager._load_publish_plugins(context)
+            self.assertEqual(get_environment.call_count, 1)
+            self.assertEqual(execute_core_hook.call_count, 1)
+
+            # a new manager reuses the plugin definitions cached on disk
+            manager = self.app.create_publish_manager()
+            self.assertEqual(
+                [plugin.name for plugin in manager._load_publish_plugins(context)],
+                [plugin.name for plugin in plugins],
+            )
+            self.assertEqual(get_environment.call_count, 1)
+
+            manager.clear_plugin_settings_cache()
+            manager._load_publish_plugins(context)
+            self.assertEqual(get_environment.call_count, 2)
+
+            # changing a file outside of the environment folder invalidates the
+            # definitions cached on disk, without creating a new manager
+            config_dir = pipeline_configuration.get_config_location()
+            templates_path = os.path.join(config_dir, "core", "templates.yml")
+            stat = os.stat(templates_path)
+            os.utime(templates_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            manager._processed_contexts.clear()
+            manager._load_publish_plugins(context)
+            self.assertEqual(get_environment.call_count, 3)
+
+    def test_publish_task_payload(self):
+        """
+        Ensures a task can be executed from its serialized payload, as is done
+        when publishing in worker processes, and its item properties merged back.
+        """
+        manager_module = self.api.manager
+
+        self.manager.collect_session()
+        task = next(self.manager._task_generator())
+        self.assertNotIn("sg_publish_data", task.item.properties)
+
+        # the subtree of the item is sent along, without its tasks
+        child = task.item.create_item("generic.child", "Child", "Child Item")
+        child.add_task(task.plugin)
+        payload = manager_module._serialize_task_payload(task)
+        item_dict = json.loads(payload)["items"][-1]
+        self.assertEqual(len(item_dict["tasks"]), 1)
+        self.assertEqual(
+            [child_dict["name"] for child_dict in item_dict["children"]],
+            ["Child Item"],
+        )
+        self.assertEqual(item_dict["children"][0]["tasks"], [])
+
+        # decode the result the way the manager does
+        result = json.loads(
+            manager_module._publish_in_worker_process(payload),
+            object_hook=manager_module._json_to_objects,
+        )
+        task.item._merge_properties(
+            result["global_properties"], result["local_properties"]
+        )
+
+        self.assertIn("sg_publish_data", task.item.properties)
+
+    def test_resume_publish(self):
+        """
+        Ensures an interrupted publish can be resumed from its journal, skipping
+        the tasks that completed before the interruption.
+        """
+        journal_path = os.path.join(self.tank_temp, "publish.journal")
+        self.manager.collect_session()
+        task_ids = set(task.id for task in self.manager._task_generator())
+        self.assertGreaterEqual(len(task_ids), 2)
+
+        published = []
+        crash = [True]
+
+        def publish(task):
+            if crash[0] and len(published) == 1:
+                crash[0] = False
+                raise Exception("Crash!")
+            published.append(task.id)
+            task.item.properties["published_%s" % (task.id,)] = True
+
+        self.manager.start_journal(journal_path)
+        with patch.object(
+            self.api.PublishTask, "validate", autospec=True, return_value=True
+        ), patch.object(
+            self.api.PublishTask, "publish", autospec=True, side_effect=publish
+        ):
+            self.manager.validate()
+            with self.assertRaises(Exception):
+                self.manager.publish()
+
+        # resume in a new manager, as would be done after a crash
+        manager = self.app.create_publish_manager()
+        manager.resume(journal_path)
+        tasks = dict((task.id, task) for task in manager._task_generator())
+        self.assertEqual(set(tasks), task_ids)
+
+        # the properties set by the completed task are restored
+        self.assertTrue(
+            tasks[published[0]].item.properties["published_%s" % (published[0],)]
+        )
+
+        with patch.object(
+            self.api.PublishTask, "validate", autospec=True, return_value=True
+        ) as validate, patch.object(
+            self.api.PublishTask, "publish", autospec=True, side_effect=publish
+        ):
+            manager.validate()
+            manager.publish()
+
+        # nothing was validated again and each task was published once
+        validate.assert_not_called()
+        self.assertEqual(sorted(published), sorted(task_ids))
+
+        manager.stop_journal(remove=True)
+        self.assertFalse(os.path.exists(journal_path))
+
+    def test_timing_report(self):
+        """
+        Ensures the time spent in the plugins by each phase is reported.
+        """
+        self.manager.collect_session()
+        tasks = list(self.manager._task_generator())
+
+        def validate(task):
+            if task is tasks[0]:
+                raise Exception("Validation error!")
+            return True
+
+        with patch.object(
+            self.api.PublishTask, "validate", autospec=True, side_effect=validate
+        ):
+            self.manager.validate()
+
+        collect_report = self.manager.get_timing_report("collect")
+        methods = [record["method"] for record in collect_report["records"]]
+        self.assertEqual(methods[0], "process_current_session")
+        self.assertIn("accept", methods)
+
+        report = self.manager.get_timing_report("validate")
+        self.assertEqual(len(report["records"]), len(tasks))
+        for task, record in zip(tasks, report["records"]):
+            self.assertEqual(record["item_id"], task.item.id)
+            self.assertEqual(record["plugin"], task.plugin.name)
+            self.assertGreaterEqual(record["wall_time"], 0)
+            self.assertGreaterEqual(record["cpu_time"], 0)
+        self.assertEqual(report["records"][0]["outcome"], "error")
+        self.assertGreaterEqual(report["wall_time"], report["plugin_wall_time"])
+        self.assertEqual(
+            sum(plugin["calls"] for plugin in report["plugins"].values()),
+            len(tasks),
+        )
+
+        # the reports are json serializable and keyed by phase
+        reports = json.loads(json.dumps(self.manager.get_timing_report()))
+        self.assertEqual(set(reports), set(["collect", "validate"]))
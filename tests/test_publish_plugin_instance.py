@@ -146,6 +146,107 @@ class TestPublishPluginInstance(PublishApiTestBase):
         self.assertEqual(ppi.run_accept(None), {"accepted": True})
         self.assertFalse(handler.found)
 
+    @mock_publish_plugin_instance_hook_creation
+    def test_accept_batch(self, create_hook_instance):
+        """
+        Ensure items are accepted in a single call to accept_batch.
+        """
+        accept = Mock(return_value={"accepted": True})
+        create_hook_instance.return_value = MagicMock(
+            accept=accept,
+            accept_batch=Mock(return_value=[{"accepted": True}, {"accepted": False}]),
+        )
+        ppi = self.PublishPluginInstance("test hook", None, {}, logger)
+
+        self.assertEqual(
+            ppi.run_accept_batch(["item_1", "item_2"]),
+            [{"accepted": True}, {"accepted": False}],
+        )
+        accept.assert_not_called()
+
+    @mock_publish_plugin_instance_hook_creation
+    def test_accept_batch_with_exception(self, create_hook_instance):
+        """
+        Ensure items are accepted one at a time when accept_batch raises.
+        """
+        create_hook_instance.return_value = MagicMock(
+            accept=Mock(side_effect=[{"accepted": True}, Exception("Test error!")]),
+            accept_batch=Mock(side_effect=Exception("Test batch error!")),
+        )
+        ppi = self.PublishPluginInstance("test hook", None, {}, logger)
+
+        handler.keyword = "Error running accept for"
+        self.assertEqual(
+            ppi.run_accept_batch(["item_1", "item_2"]),
+            [{"accepted": True}, {"accepted": False}],
+        )
+        self.assertTrue(handler.found)
+
+    @mock_publish_plugin_instance_hook_creation
+    def test_validate_batch(self, create_hook_instance):
+        """
+        Ensure the errors returned by validate_batch are reported per item.
+        """
+        error_to_raise = Exception("Test error!")
+        create_hook_instance.return_value = MagicMock(
+            validate_batch=Mock(return_value=[True, error_to_raise, False])
+        )
+        ppi = self.PublishPluginInstance("test hook", None, {}, logger)
+        items = [MagicMock(), MagicMock(), MagicMock()]
+
+        handler.keyword = "Error Validating"
+        self.assertEqual(
+            ppi.run_validate_batch({}, items),
+            [(True, None), (False, error_to_raise), (False, None)],
+        )
+        self.assertTrue(handler.found)
+
+        # a batch that fails as a whole fails every item
+        create_hook_instance.return_value.validate_batch.side_effect = error_to_raise
+        self.assertEqual(
+            ppi.run_validate_batch({}, items),
+            [(False, error_to_raise)] * len(items),
+        )
+
+    @mock_publish_plugin_instance_hook_creation
+    def test_lazy_hook_creation(self, create_hook_instance):
+        """
+        Ensure the hook is only created, and the settings only resolved, once
+        needed.
+        """
+        create_hook_instance.return_value = MagicMock(
+            settings={"setting": {"type": "str", "default": "default"}}
+        )
+        ppi = self.PublishPluginInstance(
+            "test hook", None, {"setting": "configured"}, logger
+        )
+        create_hook_instance.assert_not_called()
+
+        self.assertEqual(ppi.settings["setting"].value, "configured")
+        self.assertEqual(ppi.settings["setting"].default_value, "default")
+        create_hook_instance.assert_called_once()
+
+    @mock_publish_plugin_instance_hook_creation
+    def test_item_type_matches(self, create_hook_instance):
+        """
+        Ensure item types are matched against the plugin's filters like
+        fnmatch does.
+        """
+        create_hook_instance.return_value = MagicMock(
+            item_filters=["file.image*", "maya.session"]
+        )
+        ppi = self.PublishPluginInstance("test hook", None, {}, logger)
+
+        self.assertTrue(ppi.item_type_matches("file.image"))
+        self.assertTrue(ppi.item_type_matches("file.image.sequence"))
+        self.assertTrue(ppi.item_type_matches("maya.session"))
+        self.assertFalse(ppi.item_type_matches("maya.session.geometry"))
+        self.assertFalse(ppi.item_type_matches("file.movie"))
+
+        create_hook_instance.return_value = MagicMock(item_filters=[])
+        ppi = self.PublishPluginInstance("test hook", None, {}, logger)
+        self.assertFalse(ppi.item_type_matches("file.image"))
+
     # The following four methods are mock methods for the three UI customization methods.
     # get_ui_settings
     # set_ui_settings
@@ -9,6 +9,7 @@
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
 import datetime
+import os
 import tempfile
 from io import StringIO
 from unittest.mock import patch
@@ -59,6 +60,130 @@ class TestPublishTree(PublishApiTestBase):
         self.maxDiff = None
         self.assertEqual(before_load, after_load)
 
+    def test_compact_serialization(self):
+        """
+        Ensures trees saved in the compact format, compressed or not, load
+        back identically.
+        """
+        self.manager.collect_session()
+        tree = self.manager.tree
+        item = tree.root_item.create_item("item.a", "Item A", "Item A")
+        child = item.create_item("item.b", "Item B", "Item B")
+        self._set_item(
+            item, True, "Description 1", "/a/b/c.png", "/d/e/f.png", "local", "global"
+        )
+        child.properties.sequence_paths = ["/a/b/c.%04d.png" % i for i in range(100)]
+        child.properties.date = datetime.date.today()
+        child.context = self.tk.context_from_entity(
+            self.project["type"], self.project["id"]
+        )
+
+        self.maxDiff = None
+        before_load = tree.to_dict()
+
+        for compress in (False, True):
+            fd, temp_file_path = tempfile.mkstemp()
+            os.close(fd)
+            self.manager.save(temp_file_path, compact=True, compress=compress)
+            self.manager.load(temp_file_path)
+            self.assertEqual(before_load, self.manager.tree.to_dict())
+            os.remove(temp_file_path)
+
+        # file objects can be used as well
+        file_obj = StringIO()
+        self.manager.tree.save(file_obj, compact=True)
+        file_obj.seek(0)
+        self.assertEqual(before_load, self.api.PublishTree.load(file_obj).to_dict())
+
+    def test_lazy_load(self):
+        """
+        Ensures lazily loaded trees only create their items' children, context
+        and tasks when accessed, and are otherwise identical to the saved tree.
+        """
+        self.manager.collect_session()
+        tree = self.manager.tree
+        item = tree.root_item.create_item("item.a", "Item A", "Item A")
+        item.create_item("item.b", "Item B", "Item B")
+        context = self.tk.context_from_entity(self.project["type"], self.project["id"])
+        item.context = context
+
+        self.maxDiff = None
+        before_load = tree.to_dict()
+        item_names = [i.name for i in tree]
+
+        for compact in (False, True):
+            fd, temp_file_path = tempfile.mkstemp()
+            os.close(fd)
+            self.manager.save(temp_file_path, compact=compact)
+            self.manager.load(temp_file_path, lazy=True)
+            os.remove(temp_file_path)
+
+            loaded_item = list(self.manager.tree.root_item.children)[-1]
+            self.assertIsNone(loaded_item._get_loaded_attribute("_children"))
+            self.assertIsNone(loaded_item._get_loaded_attribute("_context"))
+
+            # accessing the deferred attributes loads them
+            self.assertEqual(loaded_item.context, context)
+            self.assertEqual([i.name for i in loaded_item.children], ["Item B"])
+            self.assertEqual(
+                self.manager.tree.items_for_context(context),
+                [loaded_item, next(loaded_item.children)],
+            )
+            self.assertEqual([i.name for i in self.manager.tree], item_names)
+            self.assertEqual(before_load, self.manager.tree.to_dict())
+
+        # the records of the compact format are decoded as json, so extra
+        # whitespace doesn't matter
+        file_obj = StringIO()
+        tree.save(file_obj, compact=True)
+        lines = file_obj.getvalue().splitlines()
+        lines[1:] = [" " + line.replace(",", " , ", 1) for line in lines[1:]]
+        tree = self.api.PublishTree.load(StringIO("\n".join(lines)), lazy=True)
+        self.assertEqual([i.name for i in tree], item_names)
+
+    def test_deserialized_items_share_contexts(self):
+        """
+        Ensures items with equal contexts share a single context instance once
+        deserialized.
+        """
+        tree = self.manager.tree
+        item_a = tree.root_item.create_item("item.a", "Item A", "Item A")
+        item_b = item_a.create_item("item.b", "Item B", "Item B")
+        item_c = tree.root_item.create_item("item.c", "Item C", "Item C")
+        for item in (item_a, item_b, item_c):
+            item.context = self.tk.context_from_entity(
+                self.project["type"], self.project["id"]
+            )
+        item_b.context = self.tk.context_empty()
+
+        new_tree = self.api.PublishTree.from_dict(tree.to_dict())
+        new_item_a, new_item_b, new_item_c = list(new_tree)
+        self.assertIs(new_item_a.context, new_item_c.context)
+        self.assertIsNot(new_item_a.context, new_item_b.context)
+        self.assertEqual(new_item_a.context, item_a.context)
+        self.assertEqual(new_item_b.context, item_b.context)
+
+    def test_deserialized_tasks_share_plugins(self):
+        """
+        Make sure deserialized tasks driven by the same plugin share a single
+        plugin instance.
+        """
+        tree = self.manager.tree
+        for name in ["Item A", "Item B"]:
+            tree.root_item.create_item("generic.item", "Generic Item", name)
+        self.manager._attach_plugins(list(tree))
+
+        new_tree = self.PublishTree.from_dict(tree.to_dict())
+
+        plugins_by_name = {}
+        for item in new_tree:
+            for task in item.tasks:
+                plugins_by_name.setdefault(task.plugin.name, set()).add(task.plugin)
+
+        self.assertEqual(sorted(plugins_by_name), ["Local Publish", "Remote Publish"])
+        for plugins in plugins_by_name.values():
+            self.assertEqual(len(plugins), 1)
+
     def test_unserializable_tree(self):
         """
         Tests that if you store an unserializable object on an item, it will fail with a
@@ -155,6 +280,83 @@ class TestPublishTree(PublishApiTestBase):
         tree.clear(clear_persistent=True)
         self.assertEqual(len(list(self.manager.tree)), 0)
 
+    def test_iteration(self):
+        """
+        Ensures the tree is iterated depth first, whatever its depth, and that
+        snapshots are refreshed when items are created or removed.
+        """
+        tree = self.manager.tree
+        item_a = tree.root_item.create_item("item.a", "Item A", "Item A")
+        item_b = item_a.create_item("item.b", "Item B", "Item B")
+        item_c = item_a.create_item("item.c", "Item C", "Item C")
+        item_d = tree.root_item.create_item("item.d", "Item D", "Item D")
+
+        self.assertEqual(list(tree), [item_a, item_b, item_c, item_d])
+        self.assertEqual(list(item_a.descendants), [item_b, item_c])
+
+        snapshot = tree.snapshot()
+        self.assertEqual(snapshot, (item_a, item_b, item_c, item_d))
+        self.assertIs(tree.snapshot(), snapshot)
+
+        item_e = item_b.create_item("item.e", "Item E", "Item E")
+        self.assertEqual(tree.snapshot(), (item_a, item_b, item_e, item_c, item_d))
+
+        tree.remove_item(item_a)
+        self.assertEqual(tree.snapshot(), (item_d,))
+
+        # a hierarchy deeper than the recursion limit can be iterated over
+        parent = item_d
+        for _ in range(5000):
+            parent = parent.create_item("item.deep", "Deep", "Deep")
+        self.assertEqual(len(list(tree)), 5001)
+        self.assertEqual(list(tree)[-1], parent)
+
+    def test_indexes(self):
+        """
+        Ensures items can be looked up by type, context and collected path and
+        that the lookups follow the changes made to the tree.
+        """
+        tree = self.manager.tree
+        image = tree.root_item.create_item("file.image", "Image", "Image")
+        sequence = image.create_item("file.image.sequence", "Sequence", "Sequence")
+        movie = tree.root_item.create_item("file.movie", "Movie", "Movie")
+
+        self.assertEqual(tree.items_by_type("file.image"), [image])
+        self.assertEqual(tree.items_by_type("file.image*"), [image, sequence])
+        self.assertEqual(tree.items_by_type("file.*"), [image, sequence, movie])
+        self.assertEqual(tree.items_by_type("maya.*"), [])
+
+        movie.type_spec = "file.image"
+        self.assertEqual(tree.items_by_type("file.image"), [image, movie])
+        self.assertEqual(tree.items_by_type("file.movie"), [])
+
+        # all items inherit the launch context
+        self.assertCountEqual(
+            tree.items_for_context(self.app.context), [image, sequence, movie]
+        )
+
+        context = self.tk.context_from_entity(self.project["type"], self.project["id"])
+        image.context = context
+        self.assertCountEqual(tree.items_for_context(context), [image, sequence])
+        self.assertEqual(tree.items_for_context(self.app.context), [movie])
+
+        tree.remove_item(image)
+        self.assertEqual(tree.items_for_context(context), [])
+        self.assertEqual(tree.items_by_type("file.image*"), [movie])
+
+        # collected paths are indexed, including for loaded trees
+        path = os.path.normpath("/a/b/c.png")
+        items = self.manager.collect_files([path])
+        self.assertTrue(items)
+        self.assertEqual(tree.items_for_collected_path(path), items)
+
+        new_tree = self.api.PublishTree.from_dict(tree.to_dict())
+        self.assertEqual(len(new_tree.items_for_collected_path(path)), len(items))
+        self.assertEqual(
+            len(new_tree.items_by_type("file.image*")),
+            len(tree.items_by_type("file.image*")),
+        )
+
     def test_clear_everything(self):
         """
         Ensures nodes are all properly deleted when calling clear.
@@ -173,6 +375,28 @@ class TestPublishTree(PublishApiTestBase):
         tree.clear(clear_persistent=True)
         self.assertEqual(list(self.manager.tree), [])
 
+    def test_tree_membership(self):
+        """
+        Ensures the tree tracks which items belong to it and which items were
+        created while recording.
+        """
+        tree = self.manager.tree
+        parent = tree.root_item.create_item("parent", "parent", "parent")
+
+        with tree._record_created_items() as created_items:
+            child = parent.create_item("child", "child", "child")
+            removed = parent.create_item("removed", "removed", "removed")
+            parent.remove_item(removed)
+
+        self.assertEqual(created_items, [child])
+        self.assertIn(parent, tree)
+        self.assertIn(child, tree)
+        self.assertNotIn(removed, tree)
+
+        tree.remove_item(parent)
+        self.assertNotIn(parent, tree)
+        self.assertNotIn(child, tree)
+
     def test_root_deletion(self):
         """
         Ensures you can't delete the root.
@@ -0,0 +1,289 @@
+# Copyright (c) 2018 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import Mock, patch
+
+from publish_api_test_base import PublishApiTestBase
+from tank_test.tank_test_base import setUpModule  # noqa
+
+import sgtk
+
+
+class _UploadHandler(BaseHTTPRequestHandler):
+    """
+    A stand-in for an upload endpoint implementing the protocol expected by
+    HttpChunkTransport.
+    """
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        if self.path.endswith("/complete"):
+            upload_id = self.path.split("/")[-2]
+            server.completed[upload_id] = bytes(server.uploads[upload_id])
+            self._reply({"upload_id": upload_id})
+        else:
+            upload_id = str(len(server.uploads) + 1)
+            server.uploads[upload_id] = bytearray()
+            server.starts.append(json.loads(body))
+            self._reply({"upload_id": upload_id})
+
+    def do_PUT(self):
+        server = self.server
+        upload_id = self.path.split("/")[-1]
+        length = int(self.headers["Content-Length"])
+        data = self.rfile.read(length)
+        first = int(self.headers["Content-Range"].split(" ")[1].split("-")[0])
+        server.chunks.append(first)
+        if server.failures:
+            server.failures -= 1
+            self.send_response(500)
+            self.end_headers()
+            return
+        upload = server.uploads[upload_id]
+        if first == len(upload):
+            upload.extend(data)
+        self._reply({"offset": len(upload)})
+
+    def do_GET(self):
+        upload_id = self.path.split("/")[-1]
+        self._reply({"offset": len(self.server.uploads[upload_id])})
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, document):
+        body = json.dumps(document).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestResumableUpload(PublishApiTestBase):
+    def setUp(self):
+        super().setUp()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _UploadHandler)
+        self.server.uploads = {}
+        self.server.completed = {}
+        self.server.starts = []
+        self.server.chunks = []
+        self.server.failures = 0
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.url = "http://127.0.0.1:%s/uploads" % (self.server.server_port,)
+
+        self.content = os.urandom(10 * 1024 + 17)
+        self.path = os.path.join(self.tank_temp, "review.mov")
+        with open(self.path, "wb") as file_obj:
+            file_obj.write(self.content)
+
+    def _create_upload(self, **kwargs):
+        return self.api.ResumableUpload(
+            self.path,
+            self.api.HttpChunkTransport(self.url),
+            chunk_size=1024,
+            retry_delay=0,
+            **kwargs
+        )
+
+    def test_upload(self):
+        """
+        Ensures a file is uploaded in chunks and the journal is removed once
+        the upload completes.
+        """
+        upload = self._create_upload()
+        self.assertEqual(upload.run(), {"upload_id": "1"})
+        self.assertEqual(self.server.completed["1"], self.content)
+        self.assertEqual(len(self.server.chunks), 11)
+        self.assertEqual(
+            self.server.starts, [{"filename": "review.mov", "size": len(self.content)}]
+        )
+        self.assertFalse(os.path.exists(upload.journal_path))
+
+    def test_retry(self):
+        """
+        Ensures a failed chunk is resent without resending the acknowledged
+        chunks.
+        """
+        self.server.failures = 2
+        self._create_upload().run()
+        self.assertEqual(self.server.completed["1"], self.content)
+        self.assertEqual(self.server.chunks[:3], [0, 0, 0])
+        self.assertEqual(len(self.server.chunks), 13)
+
+    def test_resume(self):
+        """
+        Ensures an upload interrupted for good is resumed from the journal by
+        a new upload of the same file.
+        """
+        upload = self._create_upload(max_retries=0)
+
+        # let a few chunks through before failing
+        original_send_chunk = self.api.HttpChunkTransport.send_chunk
+        sent = []
+
+        def send_chunk(transport, upload_id, offset, data, size):
+            if len(sent) == 3:
+                raise IOError("Connection dropped!")
+            sent.append(offset)
+            return original_send_chunk(transport, upload_id, offset, data, size)
+
+        with patch.object(self.api.HttpChunkTransport, "send_chunk", send_chunk):
+            with self.assertRaises(sgtk.TankError):
+                upload.run()
+
+        self.assertTrue(os.path.exists(upload.journal_path))
+
+        # a new upload picks up where the previous one stopped
+        self.server.chunks = []
+        self._create_upload().run()
+        self.assertEqual(len(self.server.starts), 1)
+        self.assertEqual(self.server.chunks[0], 3 * 1024)
+        self.assertEqual(self.server.completed["1"], self.content)
+        self.assertFalse(os.path.exists(upload.journal_path))
+
+        # a modified file is uploaded again from scratch
+        upload = self._create_upload(max_retries=0)
+        with open(upload.journal_path, "w") as journal_file:
+            json.dump(
+                {"upload_id": "1", "size": 1, "mtime": 0, "offset": 1}, journal_file
+            )
+        self._create_upload().run()
+        self.assertEqual(len(self.server.starts), 2)
+
+    def test_truncated_file(self):
+        """
+        Ensures an upload fails, instead of sending empty chunks forever, when
+        the file gets shorter during the upload.
+        """
+        upload = self._create_upload()
+
+        original_send_chunk = self.api.HttpChunkTransport.send_chunk
+
+        def send_chunk(transport, upload_id, offset, data, size):
+            if offset == 3 * 1024:
+                with open(self.path, "r+b") as file_obj:
+                    file_obj.truncate(5 * 1024)
+            return original_send_chunk(transport, upload_id, offset, data, size)
+
+        with patch.object(self.api.HttpChunkTransport, "send_chunk", send_chunk):
+            with self.assertRaisesRegex(sgtk.TankError, "changed during the upload"):
+                upload.run()
+
+        # the chunks up to the end of the truncated file were sent once
+        self.assertEqual(self.server.chunks, [i * 1024 for i in range(5)])
+        self.assertNotIn("1", self.server.completed)
+        self.assertFalse(os.path.exists(upload.journal_path))
+
+    def test_journal_location(self):
+        """
+        Ensures the journal is written to the supplied directory, or to the
+        temp directory when the uploaded file's directory isn't writable.
+        """
+        self.assertEqual(
+            self._create_upload().journal_path, self.path + ".upload_journal.json"
+        )
+
+        journal_dir = os.path.join(self.tank_temp, "journals")
+        os.makedirs(journal_dir)
+        upload = self._create_upload(journal_dir=journal_dir)
+        self.assertEqual(os.path.dirname(upload.journal_path), journal_dir)
+        self.assertEqual(upload.run(), {"upload_id": "1"})
+        self.assertFalse(os.path.exists(upload.journal_path))
+
+        with patch("os.access", return_value=False):
+            upload = self._create_upload()
+        self.assertEqual(os.path.dirname(upload.journal_path), tempfile.gettempdir())
+
+
+class TestUploadVersionPlugin(PublishApiTestBase):
+    def _create_hook(self):
+        # see TestBasicPublishPlugin._create_hook for the relative path
+        rel_repo_root = os.path.join(*("..",) * 4)
+        hook_instance = self.engine.create_hook_instance(
+            os.path.join(rel_repo_root, "hooks", "upload_version"),
+            base_class=self.app.base_hooks.PublishPlugin,
+        )
+        hook_instance.id = __file__
+        return hook_instance
+
+    def _publish(self, upload_data):
+        """
+        Publishes an item with the content uploaded to an upload endpoint
+        returning the supplied document.
+
+        :returns: The data the Version was created with.
+        """
+        hook_instance = self._create_hook()
+        item = self.manager.tree.root_item.create_item("file.movie", "Movie", "a")
+        item.properties["path"] = os.path.join(self.tank_temp, "review.mov")
+        item._thumbnail_path = os.path.join(self.tank_temp, "review.jpg")
+        settings = {
+            "Upload": Mock(value=True),
+            "Upload URL": Mock(value="https://ingest/uploads"),
+            "Link Local File": Mock(value=False),
+        }
+
+        with patch.object(
+            self.app.util, "upload_file_resumable", return_value=upload_data
+        ) as upload_mock, patch.object(
+            self.app.shotgun, "create", return_value={"type": "Version", "id": 7}
+        ) as create_mock, patch.object(
+            self.app.shotgun, "upload"
+        ) as sg_upload_mock, patch.object(
+            self.app.shotgun, "upload_thumbnail"
+        ) as sg_upload_thumbnail_mock:
+            hook_instance.publish(settings, item)
+
+        upload_mock.assert_called_once()
+        sg_upload_mock.assert_not_called()
+        sg_upload_thumbnail_mock.assert_called_once_with(
+            "Version", 7, item._thumbnail_path
+        )
+        create_mock.assert_called_once()
+        return create_mock.call_args[0][1]
+
+    def test_upload_url(self):
+        """
+        Ensures content uploaded to an upload endpoint is linked to the
+        Version.
+        """
+        version_data = self._publish(
+            {"upload_id": "1", "url": "https://ingest/media/1"}
+        )
+        self.assertEqual(
+            version_data["sg_uploaded_movie"],
+            {
+                "url": "https://ingest/media/1",
+                "name": "review.mov",
+                "link_type": "web",
+            },
+        )
+
+    def test_upload_url_missing(self):
+        """
+        Ensures no Version is created without media when the upload endpoint
+        doesn't return the url of the uploaded content.
+        """
+        with self.assertRaises(sgtk.TankError):
+            self._publish({"upload_id": "1"})